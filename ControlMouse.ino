@@ -1,23 +1,405 @@
+// WIDE_HID=1 swaps the stock 8-bit mouse for a 16-bit descriptor; set by the app's
+// "16-bit reports" option as a build property, and needs a reflash either way
+#ifndef WIDE_HID
+#define WIDE_HID 0
+#endif
+
+#if WIDE_HID && defined(TEENSYDUINO)
+#error "WIDE_HID needs the PluggableUSB HID() of the Arduino AVR/SAM/SAMD cores"
+#elif WIDE_HID
+#include <HID.h>
+#elif !defined(TEENSYDUINO)
+// Teensy's core provides Mouse itself once the USB type includes it
 #include <Mouse.h>
+#endif
+#include "motion_core.h"
 
-void setup() {
+// board profiles in constants.BOARDS override these as build properties;
+// LINK is the UART wired to the scripting computer
+#ifndef LINK
+#define LINK Serial
+#endif
+// full-speed USB polls the mouse endpoint once per millisecond, high-speed boards every 125 us
+#ifndef HID_INTERVAL_US
+#define HID_INTERVAL_US 1000UL
+#endif
+
+#define PROTOCOL_VERSION 1
+#define CAP_BAUD 0x01
+#define CAP_COMPACT 0x02
+#define CAP_CREDIT 0x04
+#define CAP_STATS 0x08
+#define CAP_WIDE 0x10
+#define CAP_CLOCK 0x20
+
+#define BOOT_BAUD 1000000UL
+#define PROBE_REVERT_MS 1000UL
+
+// host -> device: ESC op len payload sum8; anything else is a dx,dy pair,
+// or a compact token once OP_ENCODING selected ENC_COMPACT (see serial_codec.py)
+#define ESC 0x80
+// device -> host: SYNC op len payload sum8
+#define SYNC 0xA5
+#define MAX_PAYLOAD 64
+
+#define OP_BAUD 'B'
+#define OP_PROBE 'P'
+#define OP_COMMIT 'C'
+#define OP_REVERT 'R'
+#define OP_ENCODING 'E'
+#define OP_CREDIT 'K'
+#define OP_STATS 'S'
+#define OP_HID 'H'
+#define OP_CAPS 'V'
+#define OP_TIME 'T'
+#define OP_PLAYOUT 'L'
+#define OP_NAK '!'
+
+static uint32_t currentBaud = BOOT_BAUD;
+static uint32_t committedBaud = BOOT_BAUD;
+static uint32_t probeDeadline = 0;
+static bool probing = false;
+
+// credit reports: bytes consumed so far and the receive buffer size
+#if defined(SERIAL_RX_BUFFER_SIZE)
+#define RX_WINDOW SERIAL_RX_BUFFER_SIZE
+#elif defined(SERIAL_BUFFER_SIZE)
+#define RX_WINDOW SERIAL_BUFFER_SIZE
+#else
+#define RX_WINDOW 64
+#endif
+#define CREDIT_INTERVAL_MS 5
+
+#define ENC_LEGACY 0
+#define ENC_COMPACT 1
+#define STAMP_BITS 21
+
+static bool creditOn = false;
+static uint32_t rxConsumed = 0;
+static uint32_t creditSent = 0;
+static uint32_t creditAt = 0;
+
+// motion is summed while the receive buffer drains and leaves as one report per HID interval
+static MotionAcc motion;
+static uint32_t reportAt = 0;
+static bool ledOn = false;
+// UART overruns are invisible here, so count passes that find the receive buffer full
+static uint32_t rxFull = 0;
+static uint32_t discarded = 0;
+
+// host stamps carry the low STAMP_BITS of the source time on this clock (OP_TIME syncs it)
+static Playout playout;
+static uint32_t stamp = 0;
+static bool stamped = false;
+
+#if WIDE_HID
+// report 1 as the stock mouse uses it, so the host sees a single pointer
+#define WIDE_REPORT_ID 1
+#define REPORT_STEP MOTION_STEP_WIDE
+
+static const uint8_t wideDescriptor[] PROGMEM = {
+  0x05, 0x01,                    // Usage Page (Generic Desktop)
+  0x09, 0x02,                    // Usage (Mouse)
+  0xA1, 0x01,                    // Collection (Application)
+  0x85, WIDE_REPORT_ID,          //   Report ID
+  0x09, 0x01,                    //   Usage (Pointer)
+  0xA1, 0x00,                    //   Collection (Physical)
+  0x05, 0x09,                    //     Usage Page (Button)
+  0x19, 0x01, 0x29, 0x05,        //     Usage Minimum (1), Maximum (5)
+  0x15, 0x00, 0x25, 0x01,        //     Logical Minimum (0), Maximum (1)
+  0x95, 0x05, 0x75, 0x01,        //     Report Count (5), Size (1)
+  0x81, 0x02,                    //     Input (Data, Var, Abs)
+  0x95, 0x01, 0x75, 0x03,        //     Report Count (1), Size (3)
+  0x81, 0x03,                    //     Input (Const)
+  0x05, 0x01,                    //     Usage Page (Generic Desktop)
+  0x09, 0x30, 0x09, 0x31,        //     Usage (X), Usage (Y)
+  0x16, 0x01, 0x80,              //     Logical Minimum (-32767)
+  0x26, 0xFF, 0x7F,              //     Logical Maximum (32767)
+  0x75, 0x10, 0x95, 0x02,        //     Report Size (16), Count (2)
+  0x81, 0x06,                    //     Input (Data, Var, Rel)
+  0xA1, 0x02,                    //     Collection (Logical)
+  0x09, 0x48,                    //       Usage (Resolution Multiplier)
+  0x15, 0x00, 0x25, 0x01,        //       Logical Minimum (0), Maximum (1)
+  0x35, 0x01, 0x45, 0x78,        //       Physical Minimum (1), Maximum (120)
+  0x75, 0x02, 0x95, 0x01,        //       Report Size (2), Count (1)
+  0xB1, 0x02,                    //       Feature (Data, Var, Abs)
+  0x35, 0x00, 0x45, 0x00,        //       Physical Minimum (0), Maximum (0)
+  0x09, 0x38,                    //       Usage (Wheel)
+  0x16, 0x01, 0x80,              //       Logical Minimum (-32767)
+  0x26, 0xFF, 0x7F,              //       Logical Maximum (32767)
+  0x75, 0x10, 0x95, 0x01,        //       Report Size (16), Count (1)
+  0x81, 0x06,                    //       Input (Data, Var, Rel)
+  0xC0,                          //     End Collection
+  0x75, 0x06, 0x95, 0x01,        //     Report Size (6), Count (1)
+  0xB1, 0x03,                    //     Feature (Const)
+  0xC0,                          //   End Collection
+  0xC0,                          // End Collection
+};
+
+static HIDSubDescriptor wideNode(wideDescriptor, sizeof(wideDescriptor));
+
+static void hidBegin() {
+  HID().AppendDescriptor(&wideNode);
+}
+
+static void hidMove(int16_t dx, int16_t dy) {
+  // buttons, x, y, wheel; little-endian like every HID field
+  uint8_t r[7] = {0, (uint8_t)dx, (uint8_t)(dx >> 8), (uint8_t)dy, (uint8_t)(dy >> 8), 0, 0};
+  HID().SendReport(WIDE_REPORT_ID, r, sizeof(r));
+}
+#else
+#define REPORT_STEP MOTION_STEP
+
+static void hidBegin() {
   Mouse.begin();
+}
+
+static void hidMove(int16_t dx, int16_t dy) {
+  Mouse.move((int8_t)dx, (int8_t)dy, 0);
+}
+#endif
+
+static uint8_t encoding = ENC_LEGACY;
+static CompactDec compact;
+
+static uint8_t cmd[3 + MAX_PAYLOAD + 1];
+static uint8_t cmdLen = 0;
+static bool inCmd = false;
+
+static uint8_t sum8(uint8_t op, const uint8_t *p, uint8_t n) {
+  uint8_t s = op + n;
+  while (n--) s += *p++;
+  return s;
+}
+
+static void reply(uint8_t op, const uint8_t *payload, uint8_t len) {
+  LINK.write((uint8_t)SYNC);
+  LINK.write(op);
+  LINK.write(len);
+  if (len) LINK.write(payload, len);
+  LINK.write(sum8(op, payload, len));
+}
+
+static void putU32(uint8_t *p, uint32_t v) {
+  p[0] = v; p[1] = v >> 8; p[2] = v >> 16; p[3] = v >> 24;
+}
+
+static uint8_t readByte() {
+  rxConsumed++;
+  return (uint8_t)LINK.read();
+}
+
+static void sendCredit() {
+  uint8_t out[6];
+  putU32(out, rxConsumed);
+  out[4] = RX_WINDOW & 0xFF;
+  out[5] = RX_WINDOW >> 8;
+  creditSent = rxConsumed;
+  creditAt = millis();
+  reply(OP_CREDIT | 0x20, out, 6);
+}
+
+static uint32_t getU32(const uint8_t *p) {
+  return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+static void switchBaud(uint32_t baud) {
+  LINK.flush();
+  LINK.end();
+  LINK.begin(baud);
+  currentBaud = baud;
+}
+
+static void moveBy(int32_t dx, int32_t dy, uint32_t run) {
+  // bytes seen during a probe may be garbage from a mismatched rate
+  if (probing) return;
+  playoutAdd(&playout, &motion, stamped, stamp, micros(), dx, dy, run);
+  stamped = false;
+}
+
+// the full source time nearest to now with the stamp's low bits
+static uint32_t expandStamp(uint32_t low) {
+  const uint32_t span = 1UL << STAMP_BITS;
+  uint32_t now = micros();
+  uint32_t t = (now & ~(span - 1)) | low;
+  if ((int32_t)(t - now) > (int32_t)(span / 2)) t -= span;
+  else if ((int32_t)(now - t) > (int32_t)(span / 2)) t += span;
+  return t;
+}
+
+static void sendReport() {
+  uint32_t now = micros();
+  int16_t sx, sy;
+  if (now - reportAt < HID_INTERVAL_US || !motionTake(&motion, REPORT_STEP, &sx, &sy)) return;
+  reportAt = now;
+  hidMove(sx, sy);
+  ledOn = !ledOn;
+  digitalWrite(LED_BUILTIN, ledOn ? HIGH : LOW);
+}
 
-  Serial.begin(1000000);
+static void readCompactByte(uint8_t b) {
+  CompactToken t;
+  switch (compactFeed(&compact, b, &t)) {
+    case COMPACT_MOVE:
+      moveBy(t.dx, t.dy, t.run);
+      break;
+    case COMPACT_STAMP:
+      stamp = expandStamp(t.stamp);
+      stamped = true;
+      break;
+    case COMPACT_INVALID:
+      discarded++;
+      break;
+  }
+}
+
+static void handleCommand(uint8_t op, const uint8_t *payload, uint8_t len) {
+  uint8_t out[36];
+  switch (op) {
+    case OP_BAUD:
+      if (len != 4) break;
+      reply(op | 0x20, payload, len);
+      switchBaud(getU32(payload));
+      probing = true;
+      probeDeadline = millis() + PROBE_REVERT_MS;
+      return;
+    case OP_PROBE:
+      reply(op | 0x20, payload, len);
+      if (probing) probeDeadline = millis() + PROBE_REVERT_MS;
+      return;
+    case OP_COMMIT:
+      committedBaud = currentBaud;
+      probing = false;
+      putU32(out, currentBaud);
+      reply(op | 0x20, out, 4);
+      return;
+    case OP_REVERT:
+      putU32(out, committedBaud);
+      reply(op | 0x20, out, 4);
+      probing = false;
+      switchBaud(committedBaud);
+      return;
+    case OP_ENCODING:
+      if (len != 1 || payload[0] > ENC_COMPACT) break;
+      encoding = payload[0];
+      compactReset(&compact);
+      reply(op | 0x20, payload, len);
+      return;
+    case OP_CREDIT:
+      if (len != 1) break;
+      creditOn = payload[0] != 0;
+      sendCredit();
+      return;
+    case OP_STATS:
+      if (len != 0) break;
+      putU32(out, rxFull);
+      putU32(out + 4, discarded);
+      putU32(out + 8, motion.moves);
+      putU32(out + 12, motion.reports);
+      putU32(out + 16, motion.clipped);
+      putU32(out + 20, jitterUs(&playout.in));
+      putU32(out + 24, jitterUs(&playout.out));
+      putU32(out + 28, playout.late);
+      putU32(out + 32, playout.overflow);
+      reply(op | 0x20, out, 36);
+      return;
+    case OP_TIME:
+      if (len != 0) break;
+      putU32(out, micros());
+      reply(op | 0x20, out, 4);
+      return;
+    case OP_PLAYOUT:
+      if (len != 2) break;
+      playoutSetDelay(&playout, &motion, (uint32_t)payload[0] | ((uint32_t)payload[1] << 8));
+      reply(op | 0x20, payload, len);
+      return;
+    case OP_CAPS:
+      // any payload is padding that keeps the query motion-neutral for the original sketch
+      out[0] = PROTOCOL_VERSION;
+      out[1] = CAP_BAUD | CAP_COMPACT | CAP_CREDIT | CAP_STATS | CAP_CLOCK | (REPORT_STEP > MOTION_STEP ? CAP_WIDE : 0);
+      out[2] = 0;
+      out[3] = RX_WINDOW & 0xFF;
+      out[4] = RX_WINDOW >> 8;
+      out[5] = HID_INTERVAL_US & 0xFF;
+      out[6] = HID_INTERVAL_US >> 8;
+      out[7] = REPORT_STEP & 0xFF;
+      out[8] = REPORT_STEP >> 8;
+      reply(op | 0x20, out, 9);
+      return;
+    case OP_HID:
+      if (len != 0) break;
+      out[0] = REPORT_STEP & 0xFF;
+      out[1] = REPORT_STEP >> 8;
+      reply(op | 0x20, out, 2);
+      return;
+  }
+  out[0] = op;
+  reply(OP_NAK, out, 1);
+}
+
+static void readCommandByte(uint8_t b) {
+  cmd[cmdLen++] = b;
+  if (cmdLen == 3 && cmd[2] > MAX_PAYLOAD) {
+    inCmd = false;
+    discarded++;
+    return;
+  }
+  if (cmdLen < 3 || cmdLen < 4 + cmd[2]) return;
+  inCmd = false;
+  uint8_t op = cmd[1], len = cmd[2];
+  if (cmd[3 + len] == sum8(op, cmd + 3, len)) {
+    handleCommand(op, cmd + 3, len);
+  } else {
+    discarded++;
+    reply(OP_NAK, &op, 1);
+  }
+}
+
+void setup() {
+  hidBegin();
+  motionInit(&motion);
+  playoutInit(&playout);
+  compactReset(&compact);
+
+  LINK.begin(BOOT_BAUD);
 
   pinMode(LED_BUILTIN, OUTPUT);
   digitalWrite(LED_BUILTIN, LOW);
 }
 
 void loop() {
-  while (Serial.available() >= 2) {
-    int dxRaw = Serial.read();
-    int dyRaw = Serial.read();
-    int8_t dx = (int8_t)(uint8_t)dxRaw;
-    int8_t dy = (int8_t)(uint8_t)dyRaw;
+  if (LINK.available() >= RX_WINDOW - 1) rxFull++;
+  while (LINK.available() > 0) {
+    if (inCmd) {
+      readCommandByte(readByte());
+      continue;
+    }
+    if (encoding == ENC_COMPACT && (compact.flags || LINK.peek() != ESC)) {
+      readCompactByte(readByte());
+      continue;
+    }
+    if (LINK.peek() == ESC) {
+      inCmd = true;
+      cmdLen = 0;
+      readCommandByte(readByte());
+      continue;
+    }
+    if (LINK.available() < 2) break;
+    int8_t dx = (int8_t)readByte();
+    int8_t dy = (int8_t)readByte();
+    moveBy(dx, dy, 1);
+  }
+
+  playoutRelease(&playout, &motion, micros());
+  sendReport();
 
-    Mouse.move(dx, dy, 0);
+  uint32_t pending = rxConsumed - creditSent;
+  if (creditOn && pending && (pending >= RX_WINDOW / 2 || millis() - creditAt >= CREDIT_INTERVAL_MS)) {
+    sendCredit();
+  }
 
-    digitalWrite(LED_BUILTIN, !digitalRead(LED_BUILTIN));
+  if (probing && (int32_t)(millis() - probeDeadline) > 0) {
+    probing = false;
+    switchBaud(committedBaud);
   }
 }
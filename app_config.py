@@ -0,0 +1,27 @@
+import json
+import os
+
+from constants import APP_NAME
+
+def appdata_dir():
+    base = os.getenv("APPDATA") or os.path.expanduser("~")
+    folder = os.path.join(base, APP_NAME)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def config_path():
+    return os.path.join(appdata_dir(), "config.json")
+
+def load_config():
+    try:
+        with open(config_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_config(cfg: dict):
+    try:
+        with open(config_path(), "w", encoding="utf-8") as f:
+            json.dump(cfg, f)
+    except Exception:
+        pass
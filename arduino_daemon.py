@@ -0,0 +1,325 @@
+import re
+import struct
+import subprocess
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# arduino-cli 1.x `daemon` mode. grpcio is optional and the handful of messages used here
+# are hand-encoded, so neither the .proto files nor generated stubs are needed
+SERVICE = "cc.arduino.cli.commands.v1.ArduinoCoreService"
+_ADDRESS_RE = re.compile(r'"Port"\s*:\s*"?(\d+)|listening on [\w.\[\]:]*:(\d+)')
+
+class DaemonError(RuntimeError):
+    pass
+
+# ---- protobuf wire format: varint (0), 32-bit (5) and length-delimited (2) fields only
+
+def _varint(v: int) -> bytes:
+    v &= (1 << 64) - 1
+    out = bytearray()
+    while v >= 0x80:
+        out.append(v & 0x7F | 0x80)
+        v >>= 7
+    out.append(v)
+    return bytes(out)
+
+def _msg(*fields) -> bytes:
+    # (number, value) pairs; None and empty repeated values are left out like proto3 defaults
+    out = bytearray()
+    for num, v in fields:
+        if v is None:
+            continue
+        if isinstance(v, (bool, int)):
+            out += _varint(num << 3) + _varint(int(v))
+        elif isinstance(v, float):
+            out += _varint(num << 3 | 5) + struct.pack("<f", v)
+        else:
+            v = v.encode() if isinstance(v, str) else v
+            out += _varint(num << 3 | 2) + _varint(len(v)) + v
+    return bytes(out)
+
+def _parse(data: bytes) -> Dict[int, list]:
+    fields: Dict[int, list] = {}
+    i = 0
+    n = len(data)
+
+    def varint():
+        nonlocal i
+        v = shift = 0
+        while True:
+            if i >= n:
+                raise DaemonError("truncated message")
+            b = data[i]
+            i += 1
+            v |= (b & 0x7F) << shift
+            shift += 7
+            if not b & 0x80:
+                return v
+    while i < n:
+        key = varint()
+        wire = key & 7
+        if wire == 0:
+            v = varint()
+        elif wire == 2:
+            size = varint()
+            v, i = data[i:i + size], i + size
+        elif wire == 5:
+            v, i = data[i:i + 4], i + 4
+        elif wire == 1:
+            v, i = data[i:i + 8], i + 8
+        else:
+            raise DaemonError(f"unsupported wire type {wire}")
+        fields.setdefault(key >> 3, []).append(v)
+    return fields
+
+def _get(fields: Dict[int, list], num: int, default=None):
+    got = fields.get(num)
+    return got[-1] if got else default
+
+def _text(fields: Dict[int, list], num: int) -> str:
+    return bytes(_get(fields, num, b"")).decode(errors="replace")
+
+def _float(raw) -> float:
+    return struct.unpack("<f", raw)[0] if isinstance(raw, (bytes, bytearray)) and len(raw) == 4 else 0.0
+
+# ---- progress: every streaming call yields plain dicts
+#   {"kind": "out" | "err", "text": str}          tool output, already split into lines
+#   {"kind": "progress", "percent": float, "message": str}
+
+def _task(raw: bytes) -> Optional[dict]:
+    # TaskProgress {name 1, message 2, completed 3, percent 4}
+    f = _parse(raw)
+    msg = _text(f, 2) or _text(f, 1)
+    pct = 100.0 if _get(f, 3) else _float(_get(f, 4))
+    return {"kind": "progress", "percent": pct, "message": msg} if msg or pct else None
+
+def _download(raw: bytes, state: dict) -> Optional[dict]:
+    # DownloadProgress {start 1 {url 1, label 2}, update 2 {downloaded 1, total_size 2}, end 3}
+    f = _parse(raw)
+    if 1 in f:
+        start = _parse(_get(f, 1))
+        state["label"] = _text(start, 2) or _text(start, 1)
+        return {"kind": "progress", "percent": 0.0, "message": state["label"]}
+    if 2 in f:
+        upd = _parse(_get(f, 2))
+        total = _get(upd, 2, 0)
+        pct = 100.0 * _get(upd, 1, 0) / total if total else 0.0
+        return {"kind": "progress", "percent": pct, "message": state.get("label", "")}
+    if 3 in f:
+        return {"kind": "progress", "percent": 100.0, "message": state.get("label", "")}
+    return None
+
+# response field numbers per streaming RPC: "out"/"err" byte streams, TaskProgress,
+# DownloadProgress, and the Init progress wrapper {download 1, task 2}
+_STREAMS = {
+    "Init": {"wrapped": 1},
+    "UpdateIndex": {"download": 1},
+    "PlatformInstall": {"download": 1, "task": 2},
+    "PlatformUninstall": {"task": 1},
+    "LibraryInstall": {"download": 1, "task": 2},
+    "LibraryUninstall": {"task": 1},
+    "Compile": {"out": 1, "err": 2, "task": 3},
+    "Upload": {"out": 1, "err": 2},
+}
+
+class _Lines:
+    # out/err arrive in arbitrary chunks; the log wants whole lines
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._buf = ""
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        self._buf += chunk.decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+        *lines, self._buf = self._buf.split("\n")
+        return [{"kind": self.kind, "text": line} for line in lines if line]
+
+    def flush(self) -> List[dict]:
+        line, self._buf = self._buf, ""
+        return [{"kind": self.kind, "text": line}] if line else []
+
+def _grpc():
+    try:
+        import grpc
+    except ImportError:
+        raise DaemonError("grpcio is not installed") from None
+    return grpc
+
+def parse_address(line: str) -> Optional[int]:
+    m = _ADDRESS_RE.search(line)
+    return int(m.group(1) or m.group(2)) if m else None
+
+class ArduinoDaemon:
+    # one long-lived `arduino-cli daemon` and its core instance; the index, cores and libraries
+    # are loaded once instead of on every compile/upload/core call
+    def __init__(self):
+        self.proc: Optional[subprocess.Popen] = None
+        self.address: Optional[str] = None
+        self._channel = None
+        self._instance: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(cls, cli: str, additional_urls: Sequence[str] = (), timeout: float = 15.0) -> "ArduinoDaemon":
+        _grpc()
+        args = [cli, "daemon", "--port", "0", "--format", "json"]
+        if additional_urls:
+            args += ["--additional-urls", ",".join(additional_urls)]
+        d = cls()
+        try:
+            d.proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        except OSError as e:
+            raise DaemonError(f"could not run {cli}: {e}") from None
+        port: List[int] = []
+        seen: List[str] = []
+
+        def watch():
+            # the daemon announces its port on stdout; keep draining so it never blocks on the pipe
+            for line in d.proc.stdout:
+                if not port:
+                    seen.append(line.strip())
+                    got = parse_address(line)
+                    if got:
+                        port.append(got)
+        threading.Thread(target=watch, name="arduino-daemon-out", daemon=True).start()
+        deadline = time.monotonic() + timeout
+        while not port and d.proc.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        if not port:
+            d.close()
+            raise DaemonError("arduino-cli daemon did not start: " + ("; ".join(seen[-3:]) or "no output"))
+        try:
+            d.connect(f"127.0.0.1:{port[0]}", timeout=max(1.0, deadline - time.monotonic()))
+        except Exception:
+            d.close()
+            raise
+        return d
+
+    def connect(self, address: str, timeout: float = 5.0):
+        grpc = _grpc()
+        self.address = address
+        self._channel = grpc.insecure_channel(address)
+        try:
+            grpc.channel_ready_future(self._channel).result(timeout=timeout)
+        except grpc.FutureTimeoutError:
+            raise DaemonError(f"no arduino-cli daemon at {address}") from None
+        # CreateResponse {instance 1}
+        self._instance = _get(_parse(self._unary("Create", b"")), 1)
+        if self._instance is None:
+            raise DaemonError("daemon returned no instance")
+        for _ in self._init():
+            pass
+
+    @property
+    def alive(self) -> bool:
+        return self._channel is not None and (self.proc is None or self.proc.poll() is None)
+
+    def close(self):
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+        self._instance = None
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                self.proc.terminate()
+                try:
+                    self.proc.wait(timeout=2.0)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+            self.proc = None
+
+    def _call(self, kind: str, method: str):
+        if self._channel is None:
+            raise DaemonError("daemon is not connected")
+        make = self._channel.unary_unary if kind == "unary" else self._channel.unary_stream
+        # no serializers: requests and responses travel as raw message bytes
+        return make(f"/{SERVICE}/{method}")
+
+    def _unary(self, method: str, request: bytes) -> bytes:
+        grpc = _grpc()
+        try:
+            return self._call("unary", method)(request)
+        except grpc.RpcError as e:
+            raise DaemonError(f"{method}: {e.details() or e.code()}") from None
+
+    def _stream(self, method: str, request: bytes) -> Iterator[dict]:
+        grpc = _grpc()
+        spec = _STREAMS[method]
+        lines = {k: _Lines(k) for k in ("out", "err") if k in spec}
+        state: dict = {}
+        try:
+            for raw in self._call("stream", method)(request):
+                f = _parse(raw)
+                for kind, num in spec.items():
+                    if num not in f:
+                        continue
+                    v = _get(f, num)
+                    if kind in lines:
+                        yield from lines[kind].feed(v)
+                    elif kind == "task":
+                        ev = _task(v)
+                        if ev:
+                            yield ev
+                    elif kind == "download":
+                        ev = _download(v, state)
+                        if ev:
+                            yield ev
+                    else:
+                        inner = _parse(v)
+                        ev = _download(_get(inner, 1), state) if 1 in inner else _task(_get(inner, 2, b""))
+                        if ev:
+                            yield ev
+                if method == "Init" and 2 in f:
+                    # google.rpc.Status {code 1, message 2}: a broken index or platform, not fatal
+                    yield {"kind": "err", "text": _text(_parse(_get(f, 2)), 2)}
+        except grpc.RpcError as e:
+            raise DaemonError(f"{method}: {e.details() or e.code()}") from None
+        for ln in lines.values():
+            yield from ln.flush()
+
+    def _init(self) -> Iterator[dict]:
+        # (re)loads indexes, platforms and libraries into the instance
+        yield from self._stream("Init", _msg((1, self._instance)))
+
+    def _locked(self, method: str, request: bytes, reload: bool = False) -> Iterator[dict]:
+        # one operation at a time; installs change what the instance has loaded
+        with self._lock:
+            yield from self._stream(method, request)
+            if reload:
+                yield from self._init()
+
+    def core_installed(self, core: str) -> bool:
+        # PlatformSearchResponse {search_output 1 [PlatformSummary {metadata 1 {id 1}, installed_version 3}]}
+        with self._lock:
+            got = _parse(self._unary("PlatformSearch", _msg((1, self._instance), (2, core))))
+        for raw in got.get(1, []):
+            summary = _parse(raw)
+            if _text(_parse(_get(summary, 1, b"")), 1) == core and _get(summary, 3):
+                return True
+        return False
+
+    def update_index(self) -> Iterator[dict]:
+        return self._locked("UpdateIndex", _msg((1, self._instance)), reload=True)
+
+    def core_install(self, core: str) -> Iterator[dict]:
+        package, arch = core.split(":", 1)
+        return self._locked("PlatformInstall", _msg((1, self._instance), (2, package), (3, arch)), reload=True)
+
+    def core_uninstall(self, core: str) -> Iterator[dict]:
+        package, arch = core.split(":", 1)
+        return self._locked("PlatformUninstall", _msg((1, self._instance), (2, package), (3, arch)), reload=True)
+
+    def lib_install(self, name: str) -> Iterator[dict]:
+        return self._locked("LibraryInstall", _msg((1, self._instance), (2, name)), reload=True)
+
+    def lib_uninstall(self, name: str) -> Iterator[dict]:
+        return self._locked("LibraryUninstall", _msg((1, self._instance), (2, name)), reload=True)
+
+    def compile(self, fqbn: str, sketch: str, build_path: str, properties: Sequence[str] = ()) -> Iterator[dict]:
+        req = _msg((1, self._instance), (2, fqbn), (3, sketch), (7, build_path), *((8, p) for p in properties))
+        return self._locked("Compile", req)
+
+    def upload(self, fqbn: str, port: str, input_file: str) -> Iterator[dict]:
+        # Port {address 1, protocol 3}; import_file 7 is what `upload --input-file` sends
+        req = _msg((1, self._instance), (2, fqbn), (4, _msg((1, port), (3, "serial"))), (7, input_file))
+        return self._locked("Upload", req)
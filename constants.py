@@ -1,17 +1,104 @@
 DEFAULT_BLOCKED = {"left", "right"}
 BOSSAC_URL = "https://downloads.arduino.cc/tools/bossac-1.9.1-arduino2-windows.tar.gz"
 ARDUINO_CLI_URL = "https://downloads.arduino.cc/arduino-cli/arduino-cli_latest_Windows_64bit.zip"
+# keep one `arduino-cli daemon` (needs grpcio) instead of a process per compile/upload/core call
+ARDUINO_CLI_DAEMON = False
+# "defines" go to the sketch as -D build flags; hid_interval_us is the USB poll period of the
+# mouse endpoint (full speed 1 ms, high speed down to 125 us) and the firmware reports it back.
+# "wide_hid" boards have the PluggableUSB HID() the 16-bit descriptor is registered with
 BOARDS = {
     "Arduino Due": {
         "fqbn": "arduino:sam:arduino_due_x",
         "flash": "bossac",
         "ext": ".bin",
+        "hid_interval_us": 1000,
+        "wide_hid": True,
+        "defines": {},
     },
     "Arduino Leonardo": {
         "fqbn": "arduino:avr:leonardo",
         "flash": "arduino-cli",
         "ext": ".hex",
+        "hid_interval_us": 1000,
+        "wide_hid": True,
+        "defines": {},
+    },
+    "Arduino Zero (Native USB)": {
+        "fqbn": "arduino:samd:arduino_zero_native",
+        "flash": "arduino-cli",
+        "ext": ".bin",
+        "hid_interval_us": 1000,
+        "wide_hid": True,
+        # Serial is the EDBG programming port's UART, as on the Due
+        "defines": {},
+    },
+    "Teensy 4.1": {
+        "fqbn": "teensy:avr:teensy41:usb=serialhid",
+        "flash": "arduino-cli",
+        "ext": ".hex",
+        "index_url": "https://www.pjrc.com/teensy/package_teensy_index.json",
+        "hid_interval_us": 125,
+        "wide_hid": False,
+        # a USB-UART adapter on pins 0/1 to the scripting PC; the USB port is high-speed HID
+        "defines": {"LINK": "Serial1", "HID_INTERVAL_US": 125},
     },
 }
 APP_NAME = "MouseControler - Fizo"
 TOOLS_SUBDIR = "tools"
+WHIP_MAX_SESSIONS = 1
+WHIP_IDLE_TIMEOUT = 15.0
+WHIP_SHM_SLOTS = 3
+WHIP_SHM_SLOT_BYTES = 1920 * 1080 * 3
+WHIP_CODEC_PREFERENCE = ("H264", "VP8")
+WHIP_MAX_WIDTH = 1920
+WHIP_MAX_HEIGHT = 1080
+WHIP_MAX_FPS = 60
+WHIP_MAX_BITRATE_KBPS = 0
+WHIP_MIN_BITRATE_KBPS = 300
+WHIP_AUTO_BITRATE_CEILING_KBPS = 20000
+WHIP_DECODE_BACKLOG_MS = 120.0
+WHIP_STALL_SECONDS = 1.0
+WHIP_PLI_MIN_INTERVAL = 1.0
+WHIP_LOW_LATENCY = False
+WHIP_HOST_ONLY_ICE = False
+WHIP_PC_POOL_SIZE = 2
+WHIP_IFACE_CACHE_TTL = 30.0
+SERIAL_BOOT_BAUD = 1000000
+SERIAL_BAUD_CANDIDATES = (115200, 250000, 500000, 1000000, 2000000)
+SERIAL_PROBE_PACKETS = 120
+SERIAL_PROBE_PAYLOAD = 32
+SERIAL_PROBE_REVERT_MS = 1000
+SERIAL_ENCODING = "auto"
+SERIAL_WIDE_HID = False
+SERIAL_PLAYOUT_MS = 0.0
+SERIAL_STALE_MS = 100.0
+SERIAL_STALE_POLICY = "merge"
+SERIAL_RX_WINDOW = 64
+SERIAL_CREDIT_INTERVAL_MS = 5
+SERIAL_CREDIT_STALL_S = 0.5
+SERIAL_OS_BUFFER_MS = 2.0
+SERIAL_HID_REPORT_S = 0.001
+SERIAL_PING_S = 1.0
+TRACE_CAPACITY = 65536
+TRACE_SECONDS = 10.0
+TRACE_SPIKE_MS = 150.0
+TRACE_SPIKE_COOLDOWN_S = 30.0
+UI_FALLBACK_FPS = 60.0
+UI_LOG_LINES_PER_FRAME = 200
+UI_LOG_BACKLOG = 3000
+HISTORY_LEVELS = ((1, 3600), (10, 2160), (60, 1440))
+HISTORY_SERIES = (
+    ("serial.packets", "pkt/s"),
+    ("serial.bytes", "B/s"),
+    ("serial.dropped", "1/s"),
+    ("serial.coalesced", "1/s"),
+    ("serial.expired", "1/s"),
+    ("serial.rtt", "ms"),
+    ("serial.jitter_in", "us"),
+    ("serial.jitter_out", "us"),
+    ("whip.fps", "fps"),
+    ("whip.drops", "1/s"),
+)
+HISTORY_WINDOWS = ((60, "1 min"), (600, "10 min"), (3600, "1 h"), (21600, "6 h"), (86400, "24 h"))
+BENCH_BASELINE = "perf_baseline.json"
+BENCH_REGRESSION_PCT = 10.0
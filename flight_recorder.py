@@ -0,0 +1,124 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from constants import TRACE_CAPACITY, TRACE_SECONDS, TRACE_SPIKE_MS, TRACE_SPIKE_COOLDOWN_S
+
+class FlightRecorder:
+    # fixed ring of (t, dur, name, tid, args); dur < 0 marks an instant.
+    # Writers never lock: the slot index comes from an atomic counter.
+    def __init__(self, capacity: int = TRACE_CAPACITY, seconds: float = TRACE_SECONDS):
+        self.capacity = int(capacity)
+        self.seconds = float(seconds)
+        self.enabled = True
+        self.directory = tempfile.gettempdir()
+        self.spike_ms = TRACE_SPIKE_MS
+        self.spike_cooldown = TRACE_SPIKE_COOLDOWN_S
+        self.on_dump: Optional[Callable[[str, str], None]] = None
+        self._buf: List[Optional[tuple]] = [None] * self.capacity
+        self._seq = itertools.count()
+        self._names: Dict[int, str] = {}
+        self._sources: List[Callable[[], list]] = []
+        self._last_spike = 0.0
+        self._dump_lock = threading.Lock()
+
+    def mark(self, name: str, args=None):
+        if self.enabled:
+            self._buf[next(self._seq) % self.capacity] = (time.perf_counter(), -1.0, name, threading.get_ident(), args)
+
+    def span(self, name: str, t0: float, t1: Optional[float] = None, args=None):
+        if self.enabled:
+            if t1 is None:
+                t1 = time.perf_counter()
+            self._buf[next(self._seq) % self.capacity] = (t0, t1 - t0, name, threading.get_ident(), args)
+
+    def name_thread(self, name: str):
+        self._names[threading.get_ident()] = name
+
+    def add_source(self, fn: Callable[[], list]):
+        # fn returns [(pid, events, thread_names)] from other processes
+        self._sources.append(fn)
+
+    def remove_source(self, fn: Callable[[], list]):
+        try:
+            self._sources.remove(fn)
+        except ValueError:
+            pass
+
+    def thread_names(self) -> Dict[int, str]:
+        names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+        names.update(self._names)
+        return names
+
+    def export(self, seconds: Optional[float] = None) -> list:
+        events = [e for e in list(self._buf) if e is not None]
+        events.sort(key=lambda e: e[0])
+        horizon = seconds if seconds is not None else self.seconds
+        if events and horizon > 0:
+            cutoff = time.perf_counter() - horizon
+            events = [e for e in events if e[0] + max(0.0, e[1]) >= cutoff]
+        return events
+
+    def check_latency(self, stage: str, ms: float):
+        if not self.enabled or self.spike_ms <= 0 or ms < self.spike_ms:
+            return
+        now = time.monotonic()
+        if now - self._last_spike < self.spike_cooldown:
+            return
+        self._last_spike = now
+        self.mark("latency_spike", {"stage": stage, "ms": round(ms, 2)})
+        # let the events after the spike land before writing
+        t = threading.Timer(0.25, self.dump, kwargs={"reason": f"spike-{stage}"})
+        t.daemon = True
+        t.start()
+
+    def chrome_trace(self, seconds: Optional[float] = None) -> dict:
+        out: List[dict] = []
+        procs = [(os.getpid(), self.export(seconds), self.thread_names())]
+        for fn in list(self._sources):
+            try:
+                procs += fn()
+            except Exception:
+                pass
+        for pid, events, names in procs:
+            out.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                        "args": {"name": "main" if pid == os.getpid() else f"worker {pid}"}})
+            seen = set()
+            for t, dur, name, tid, args in events:
+                ev = {"name": name, "ph": "X" if dur >= 0 else "i", "ts": round(t * 1e6, 3), "pid": pid, "tid": tid}
+                if dur >= 0:
+                    ev["dur"] = round(dur * 1e6, 3)
+                else:
+                    ev["s"] = "t"
+                if args is not None:
+                    ev["args"] = args if isinstance(args, dict) else {"v": args}
+                out.append(ev)
+                seen.add(tid)
+            for tid in seen:
+                out.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                            "args": {"name": names.get(tid, f"thread {tid}")}})
+        return {"traceEvents": out, "displayTimeUnit": "ms"}
+
+    def dump(self, path: Optional[str] = None, seconds: Optional[float] = None, reason: str = "manual") -> Optional[str]:
+        with self._dump_lock:
+            trace = self.chrome_trace(seconds)
+            if path is None:
+                path = os.path.join(self.directory, time.strftime("trace-%Y%m%d-%H%M%S") + f"-{reason}.json")
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(trace, f)
+            except Exception:
+                return None
+        if self.on_dump is not None:
+            try:
+                self.on_dump(path, reason)
+            except Exception:
+                pass
+        return path
+
+RECORDER = FlightRecorder()
@@ -0,0 +1,89 @@
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from auth_guard import require_auth
+
+Transform = Callable[[int, int], Tuple[int, int]]
+
+class Scale:
+    # keeps the fractional part so slow movements are not rounded away
+    def __init__(self, factor: float):
+        self.factor = float(factor)
+        self._rx = 0.0
+        self._ry = 0.0
+
+    def __call__(self, dx: int, dy: int) -> Tuple[int, int]:
+        fx = dx * self.factor + self._rx
+        fy = dy * self.factor + self._ry
+        ix, iy = int(fx), int(fy)
+        self._rx, self._ry = fx - ix, fy - iy
+        return ix, iy
+
+class Invert:
+    def __init__(self, x: bool = False, y: bool = False):
+        self.sx = -1 if x else 1
+        self.sy = -1 if y else 1
+
+    def __call__(self, dx: int, dy: int) -> Tuple[int, int]:
+        return dx * self.sx, dy * self.sy
+
+def build_transforms(scale: float = 1.0, invert_x: bool = False, invert_y: bool = False) -> List[Transform]:
+    out: List[Transform] = []
+    if scale != 1.0:
+        out.append(Scale(scale))
+    if invert_x or invert_y:
+        out.append(Invert(invert_x, invert_y))
+    return out
+
+class Forwarder:
+    # input source -> transforms -> SerialLink; safe to feed from any thread
+    def __init__(self, link, transforms: Optional[List[Transform]] = None):
+        self.link = link
+        self.transforms: List[Transform] = list(transforms or [])
+        self.forwarding = False
+        self.on_state: Optional[Callable[[bool], None]] = None
+        self.received = 0
+        self.forwarded = 0
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        self._started = 0.0
+
+    def set_forwarding(self, enabled: bool) -> bool:
+        if enabled:
+            try:
+                require_auth()
+            except Exception:
+                enabled = False
+        changed = enabled != self.forwarding
+        self.forwarding = enabled
+        if enabled and changed:
+            self._started = time.monotonic()
+        if changed and self.on_state is not None:
+            try:
+                self.on_state(enabled)
+            except Exception:
+                pass
+        return enabled
+
+    def feed(self, dx: int, dy: int):
+        self.received += 1
+        if not self.forwarding or not self.link.ser:
+            return
+        with self._lock:
+            for t in self.transforms:
+                dx, dy = t(dx, dy)
+        if not (dx or dy):
+            self.suppressed += 1
+            return
+        self.link.send_delta(dx, dy)
+        self.forwarded += 1
+
+    def stats(self) -> dict:
+        return {
+            "forwarding": self.forwarding,
+            "received": self.received,
+            "forwarded": self.forwarded,
+            "suppressed": self.suppressed,
+            "uptime_s": round(time.monotonic() - self._started, 1) if self.forwarding else 0.0,
+        }
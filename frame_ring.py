@@ -0,0 +1,69 @@
+import os
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+# per-slot header: seq (u64, 0 while writing), w, h, ch (u32), pad (u32)
+_HDR = struct.Struct("<QIIII")
+_HDR_SIZE = 64
+
+class SharedFrameRing:
+    def __init__(self, slots: int, slot_bytes: int, name: Optional[str] = None):
+        self.slots = int(slots)
+        self.slot_bytes = int(slot_bytes)
+        self._stride = _HDR_SIZE + self.slot_bytes
+        size = self._stride * self.slots
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            if os.name == "posix":
+                # attaching registers the segment with this process's own resource tracker,
+                # which would unlink it when the process exits; the creator owns it
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+        self._seq = 0
+        self.oversize = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def write(self, arr) -> Optional[Tuple[int, int]]:
+        h, w, ch = arr.shape
+        n = h * w * ch
+        if n > self.slot_bytes:
+            self.oversize += 1
+            return None
+        self._seq += 1
+        slot = self._seq % self.slots
+        base = slot * self._stride
+        buf = self._shm.buf
+        _HDR.pack_into(buf, base, 0, w, h, ch, 0)
+        import numpy as np  # type: ignore
+        dst = np.ndarray((h, w, ch), dtype=np.uint8, buffer=buf, offset=base + _HDR_SIZE)
+        dst[...] = arr
+        _HDR.pack_into(buf, base, self._seq, w, h, ch, 0)
+        return slot, self._seq
+
+    def view(self, slot: int, seq: int):
+        base = slot * self._stride
+        got, w, h, ch, _ = _HDR.unpack_from(self._shm.buf, base)
+        if got != seq:
+            return None
+        import numpy as np  # type: ignore
+        return np.ndarray((h, w, ch), dtype=np.uint8, buffer=self._shm.buf, offset=base + _HDR_SIZE)
+
+    def still_valid(self, slot: int, seq: int) -> bool:
+        return _HDR.unpack_from(self._shm.buf, slot * self._stride)[0] == seq
+
+    def close(self):
+        try:
+            self._shm.close()
+        except Exception:
+            pass
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except Exception:
+                pass
@@ -1,4 +1,4 @@
-import sys, threading, time, subprocess, os, shutil, json, re, tarfile, zipfile, urllib.request, tempfile, base64
+import sys, threading, time, subprocess, os, shutil, re, tarfile, zipfile, urllib.request, tempfile
 import serial, serial.tools.list_ports
 from PySide6 import QtCore, QtWidgets, QtGui
 
@@ -6,18 +6,42 @@ if sys.platform != "win32":
     raise SystemExit("This app supports Windows only.")
 
 from security import start_security_guard
-from auth_guard import start_integrity_monitor, set_session_token, require_auth
-from mouse_blocker import MouseBlocker, EscapeListener, RawInputFilter
+from auth_guard import start_integrity_monitor, set_session_token, authenticate_user
+from mouse_blocker import MouseBlocker, EscapeListener
+from raw_input_filter import RawInputFilter
 from serial_sender import SerialSender
+from arduino_daemon import ArduinoDaemon, DaemonError
+from forward_core import Forwarder
 from whip_server import WhipServer
+from pipeline_stats import STAGES, format_summary
+from flight_recorder import RECORDER
+from ui_scheduler import UiScheduler
+from app_config import appdata_dir, load_config, save_config
+from metrics_history import HistogramDelta, MetricsHistory
+from sparkline import HistoryPanel
 from constants import (
     DEFAULT_BLOCKED,
     BOSSAC_URL,
     ARDUINO_CLI_URL,
+    ARDUINO_CLI_DAEMON,
     BOARDS,
-    APP_NAME,
     TOOLS_SUBDIR,
+    WHIP_MAX_SESSIONS,
+    WHIP_IDLE_TIMEOUT,
+    WHIP_LOW_LATENCY,
+    WHIP_HOST_ONLY_ICE,
+    SERIAL_BOOT_BAUD,
+    SERIAL_ENCODING,
+    SERIAL_WIDE_HID,
+    SERIAL_PLAYOUT_MS,
+    SERIAL_STALE_MS,
+    SERIAL_STALE_POLICY,
+    TRACE_SECONDS,
+    TRACE_SPIKE_MS,
+    HISTORY_SERIES,
 )
+from sdp_policy import NegotiationPolicy
+from synthetic import PATTERNS, PIX_FMTS
 
 start_security_guard()
 start_integrity_monitor()
@@ -37,25 +61,6 @@ QProgressBar::chunk { background-color: #2e8bff; }
 """
 
 
-def authenticate_user(username: str, password: str) -> tuple[bool, str | None]:
-    # import requests
-    # try:
-    #     r = requests.post(
-    #         "https://api.test.com/login",
-    #         json={"username": username, "password": password},
-    #         timeout=5,
-    #     )
-    #     r.raise_for_status()
-    #     data = r.json()
-    #     return True, data.get("token")
-    # except Exception:
-    #     return False, None
-
-    if username == "test" and password == "test":
-        return True, base64.b64encode(os.urandom(16)).decode('ascii')
-    return False, None
-
-
 class LoginDialog(QtWidgets.QDialog):
     def __init__(self):
         super().__init__()
@@ -107,34 +112,11 @@ class LoginDialog(QtWidgets.QDialog):
         else:
             self.errorLbl.setText("Invalid credentials. Use test/test for now.")
 
-def appdata_dir():
-    base = os.getenv("APPDATA") or os.path.expanduser("~")
-    folder = os.path.join(base, APP_NAME)
-    os.makedirs(folder, exist_ok=True)
-    return folder
-
-def config_path():
-    return os.path.join(appdata_dir(), "config.json")
-
 def tools_dir():
     td = os.path.join(appdata_dir(), TOOLS_SUBDIR)
     os.makedirs(td, exist_ok=True)
     return td
 
-def load_config():
-    try:
-        with open(config_path(), "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-def save_config(cfg: dict):
-    try:
-        with open(config_path(), "w", encoding="utf-8") as f:
-            json.dump(cfg, f)
-    except Exception:
-        pass
-
 def wait_for_bossa_port(timeout=5.0) -> str | None:
     t0 = time.time()
     while time.time() - t0 < timeout:
@@ -163,8 +145,7 @@ def to_windows_bossac_port(port: str) -> str:
         return port
 
 class MainWindow(QtWidgets.QMainWindow):
-    flashProgress = QtCore.Signal(int)
-    flashLogLine  = QtCore.Signal(str)
+    traceDumped = QtCore.Signal(str, str)
 
     def __init__(self):
         super().__init__()
@@ -173,18 +154,46 @@ class MainWindow(QtWidgets.QMainWindow):
         self.statusBar()
 
         self.cfg = load_config()
+        self.ui = UiScheduler(self)
+        self.history = MetricsHistory()
+        for name, unit in HISTORY_SERIES + tuple((f"whip.{s}", "ms p95") for s in STAGES):
+            self.history.define(name, unit)
+        self._whip_hist_delta = HistogramDelta()
+        self._whip_drops_seen: int | None = None
+        self._whip_sessions_state: list = []
+        RECORDER.name_thread("gui")
+        RECORDER.directory = os.path.join(appdata_dir(), "traces")
+        RECORDER.spike_ms = float(self.cfg.get("trace_spike_ms", TRACE_SPIKE_MS))
+        RECORDER.on_dump = lambda path, reason: self.traceDumped.emit(path, reason)
+        self.traceDumped.connect(self._on_trace_dumped)
+        self.traceBtn = QtWidgets.QToolButton()
+        self.traceBtn.setText("Dump trace")
+        self.traceBtn.setToolTip(f"Write the last {TRACE_SECONDS:.0f} s of pipeline events as a Chrome trace (Ctrl+Shift+T)")
+        self.traceBtn.setShortcut(QtGui.QKeySequence("Ctrl+Shift+T"))
+        self.traceBtn.clicked.connect(self.on_trace_clicked)
+        self.statusBar().addPermanentWidget(self.traceBtn)
         self._bossac_path = self.cfg.get("bossac_path") if self.cfg else None
+        self._cli_daemon: ArduinoDaemon | None = None
+        # a failed daemon start is remembered until the option is toggled, so later builds
+        # don't wait out the start timeout again
+        self._cli_daemon_failed = False
         self._board_name = self.cfg.get("board", "Arduino Due")
 
         self.sender = SerialSender()
+        self.forwarder = Forwarder(self.sender.link)
         self.sender.connectedChanged.connect(self.on_connected_changed)
-        self.sender.statsUpdated.connect(self.on_stats)
+        self.sender.statsUpdated.connect(lambda pps: self.ui.post("stats", self.on_stats, pps))
+        self.sender.linkStatsUpdated.connect(self._record_link_stats)
+        self.sender.probeFinished.connect(self.on_probe_finished)
 
         self.whip = WhipServer()
         self.whip.startedChanged.connect(self._on_whip_started)
         self.whip.urlsUpdated.connect(self._on_whip_urls)
         self.whip.statusChanged.connect(self._on_whip_status)
-        self.whip.frameReady.connect(self._on_whip_frame)
+        self.whip.frameReady.connect(lambda img: self.ui.post("frame", self._on_whip_frame, img))
+        self.whip.sessionsUpdated.connect(self._record_whip_sessions)
+        self.whip.transportStatsUpdated.connect(self._on_whip_transport)
+        self._whip_transport: dict = {}
         self._whip_last_frame: QtGui.QImage | None = None
         self._whip_debug_win = None
 
@@ -209,6 +218,46 @@ class MainWindow(QtWidgets.QMainWindow):
         self.connectBtn.setEnabled(False)
         self.flashBtn = QtWidgets.QPushButton("Flash…")
         self.clearBtn = QtWidgets.QPushButton("Clear packages")
+        self.probeBtn = QtWidgets.QPushButton("Probe baud")
+        self.probeBtn.setToolTip("Test candidate baud rates against the firmware and remember the fastest clean one")
+        self.encodingCombo = QtWidgets.QComboBox()
+        for label, name in (("Auto encoding", "auto"), ("Compact encoding", "compact"), ("Legacy encoding", "legacy")):
+            self.encodingCombo.addItem(label, name)
+        self.encodingCombo.setToolTip("Auto picks what the firmware reports at connect. Compact sends variable-length "
+                                      "deltas and falls back to 2-byte packets if the firmware predates it")
+        idx = self.encodingCombo.findData(self.cfg.get("serial_encoding", SERIAL_ENCODING))
+        self.encodingCombo.setCurrentIndex(max(0, idx))
+        self.wideChk = QtWidgets.QCheckBox("16-bit reports")
+        self.wideChk.setToolTip("Flash the firmware with a 16-bit HID mouse so any move reaches the PC in one report; "
+                                "takes effect on the next flash")
+        self.wideChk.setChecked(bool(self.cfg.get("hid_wide", SERIAL_WIDE_HID)))
+        self._update_wide_enabled()
+        self.daemonChk = QtWidgets.QCheckBox("Keep arduino-cli running")
+        self.daemonChk.setToolTip("Run arduino-cli once as a background service so compile, upload and core checks "
+                                  "skip reloading its index every time. Needs the grpcio package")
+        self.daemonChk.setChecked(bool(self.cfg.get("cli_daemon", ARDUINO_CLI_DAEMON)))
+        self.playoutSpin = QtWidgets.QDoubleSpinBox()
+        self.playoutSpin.setRange(0.0, 50.0)
+        self.playoutSpin.setSingleStep(0.5)
+        self.playoutSpin.setSuffix(" ms playout")
+        self.playoutSpin.setSpecialValueText("No playout")
+        self.playoutSpin.setToolTip("The firmware replays motion on the mouse's original cadence this long after it "
+                                    "happened, hiding serial jitter. Needs compact encoding; applies on connect")
+        self.playoutSpin.setValue(float(self.cfg.get("playout_ms", SERIAL_PLAYOUT_MS)))
+        self.staleSpin = QtWidgets.QDoubleSpinBox()
+        self.staleSpin.setRange(0.0, 2000.0)
+        self.staleSpin.setSingleStep(10.0)
+        self.staleSpin.setDecimals(0)
+        self.staleSpin.setSuffix(" ms max latency")
+        self.staleSpin.setSpecialValueText("Replay all motion")
+        self.staleSpin.setToolTip("Motion still queued this long after it happened, e.g. after the link stalled, "
+                                  "is merged into one jump or dropped instead of replayed")
+        self.staleSpin.setValue(float(self.cfg.get("stale_ms", SERIAL_STALE_MS)))
+        self.staleCombo = QtWidgets.QComboBox()
+        for label, name in (("Merge stale motion", "merge"), ("Drop stale motion", "drop")):
+            self.staleCombo.addItem(label, name)
+        self.staleCombo.setCurrentIndex(max(0, self.staleCombo.findData(self.cfg.get("stale_policy", SERIAL_STALE_POLICY))))
+        self.sender.set_staleness(self.staleSpin.value(), self.staleCombo.currentData())
         self.statusLbl = QtWidgets.QLabel("Disconnected")
 
         l1.addWidget(QtWidgets.QLabel("Board:"), 0, 0)
@@ -220,6 +269,13 @@ class MainWindow(QtWidgets.QMainWindow):
         l1.addWidget(self.flashBtn, 2, 2)
         l1.addWidget(self.statusLbl, 2, 3, alignment=QtCore.Qt.AlignRight)
         l1.addWidget(self.clearBtn, 3, 1, 1, 2)
+        l1.addWidget(self.probeBtn, 3, 3)
+        l1.addWidget(self.encodingCombo, 4, 1, 1, 2)
+        l1.addWidget(self.wideChk, 4, 3)
+        l1.addWidget(self.daemonChk, 5, 3)
+        l1.addWidget(self.playoutSpin, 5, 1, 1, 2)
+        l1.addWidget(self.staleSpin, 6, 1, 1, 2)
+        l1.addWidget(self.staleCombo, 6, 3)
 
         g2 = QtWidgets.QGroupBox("Mouse forwarding")
         l2 = QtWidgets.QGridLayout(g2)
@@ -274,8 +330,18 @@ class MainWindow(QtWidgets.QMainWindow):
         tips.setStyleSheet("color:#a9b1c7;")
         tips.setWordWrap(True)
 
+        self.mouseHistory = HistoryPanel(self.history, [
+            ("serial.packets", "packets/s"),
+            ("serial.bytes", "bytes/s"),
+            ("serial.dropped", "dropped/s"),
+            ("serial.rtt", "link RTT ms", "{:.1f}", True),
+            ("serial.jitter_in", "arrival jitter us", "{:.0f}", True),
+            ("serial.jitter_out", "playout jitter us", "{:.0f}", True),
+        ])
+
         layout.addWidget(g1)
         layout.addWidget(g2)
+        layout.addWidget(self.mouseHistory)
         layout.addWidget(g3)
         layout.addWidget(tips)
         tabs.addTab(mousePage, "Mouse")
@@ -307,6 +373,9 @@ class MainWindow(QtWidgets.QMainWindow):
         gl.addWidget(self.whipOpenDebug, 3, 2)
         gl.addWidget(self.whipPreview, 4, 0, 1, 3)
         gl.addWidget(self.whipStats, 5, 0, 1, 3)
+        self.whipLatency = QtWidgets.QLabel("")
+        self.whipLatency.setStyleSheet("color:#a9b1c7;")
+        gl.addWidget(self.whipLatency, 8, 0, 1, 3)
         cropBox = QtWidgets.QGroupBox("Crop")
         cropLayout = QtWidgets.QGridLayout(cropBox)
         self.cropEnable = QtWidgets.QCheckBox("Enable crop")
@@ -336,11 +405,149 @@ class MainWindow(QtWidgets.QMainWindow):
         cropLayout.addWidget(QtWidgets.QLabel("Y:"), 2, 2)
         cropLayout.addWidget(self.cropY, 2, 3)
         gl.addWidget(cropBox, 6, 0, 1, 3)
+        sessBox = QtWidgets.QGroupBox("Sessions")
+        sessLayout = QtWidgets.QGridLayout(sessBox)
+        self.whipMaxSessions = QtWidgets.QSpinBox()
+        self.whipMaxSessions.setRange(1, 16)
+        self.whipMaxSessions.setValue(int(self.cfg.get("whip_max_sessions", WHIP_MAX_SESSIONS)))
+        self.whipIdleTimeout = QtWidgets.QSpinBox()
+        self.whipIdleTimeout.setRange(1, 3600)
+        self.whipIdleTimeout.setSuffix(" s")
+        self.whipIdleTimeout.setValue(int(self.cfg.get("whip_idle_timeout", WHIP_IDLE_TIMEOUT)))
+        self.whipIsolated = QtWidgets.QCheckBox("Decode in separate process")
+        self.whipIsolated.setChecked(bool(self.cfg.get("whip_isolated", False)))
+        self.whipSessions = QtWidgets.QLabel("No active sessions")
+        self.whipSessions.setStyleSheet("color:#a9b1c7;")
+        sessLayout.addWidget(QtWidgets.QLabel("Max sessions:"), 0, 0)
+        sessLayout.addWidget(self.whipMaxSessions, 0, 1)
+        sessLayout.addWidget(QtWidgets.QLabel("Idle timeout:"), 0, 2)
+        sessLayout.addWidget(self.whipIdleTimeout, 0, 3)
+        self.whipLowLatency = QtWidgets.QCheckBox("Low latency (skip to newest frame)")
+        self.whipLowLatency.setChecked(bool(self.cfg.get("whip_low_latency", WHIP_LOW_LATENCY)))
+        sessLayout.addWidget(self.whipIsolated, 1, 0, 1, 2)
+        sessLayout.addWidget(self.whipLowLatency, 1, 2, 1, 2)
+        sessLayout.addWidget(self.whipSessions, 2, 0, 1, 4)
+        gl.addWidget(sessBox, 7, 0, 1, 3)
+        policy = NegotiationPolicy.from_dict(self.cfg.get("whip_policy"))
+        negBox = QtWidgets.QGroupBox("Negotiation")
+        negLayout = QtWidgets.QGridLayout(negBox)
+        self.whipCodec = QtWidgets.QComboBox()
+        self.whipCodec.addItem("H264 first", (["H264", "VP8"], False))
+        self.whipCodec.addItem("VP8 first", (["VP8", "H264"], False))
+        self.whipCodec.addItem("H264 only", (["H264"], True))
+        self.whipCodec.addItem("VP8 only", (["VP8"], True))
+        for i in range(self.whipCodec.count()):
+            codecs, strict = self.whipCodec.itemData(i)
+            if codecs[0] == (policy.codecs or ["H264"])[0] and strict == policy.strict:
+                self.whipCodec.setCurrentIndex(i)
+                break
+        self.whipMaxW = QtWidgets.QSpinBox()
+        self.whipMaxW.setRange(0, 7680)
+        self.whipMaxW.setSpecialValueText("any")
+        self.whipMaxW.setValue(policy.max_width)
+        self.whipMaxH = QtWidgets.QSpinBox()
+        self.whipMaxH.setRange(0, 4320)
+        self.whipMaxH.setSpecialValueText("any")
+        self.whipMaxH.setValue(policy.max_height)
+        self.whipMaxFps = QtWidgets.QSpinBox()
+        self.whipMaxFps.setRange(0, 240)
+        self.whipMaxFps.setSpecialValueText("any")
+        self.whipMaxFps.setValue(policy.max_fps)
+        negLayout.addWidget(QtWidgets.QLabel("Codec:"), 0, 0)
+        negLayout.addWidget(self.whipCodec, 0, 1, 1, 5)
+        negLayout.addWidget(QtWidgets.QLabel("Max W:"), 1, 0)
+        negLayout.addWidget(self.whipMaxW, 1, 1)
+        negLayout.addWidget(QtWidgets.QLabel("Max H:"), 1, 2)
+        negLayout.addWidget(self.whipMaxH, 1, 3)
+        negLayout.addWidget(QtWidgets.QLabel("Max fps:"), 1, 4)
+        negLayout.addWidget(self.whipMaxFps, 1, 5)
+        feedback = self.cfg.get("whip_feedback", {})
+        self.whipMaxKbps = QtWidgets.QSpinBox()
+        self.whipMaxKbps.setRange(0, 100000)
+        self.whipMaxKbps.setSingleStep(500)
+        self.whipMaxKbps.setSuffix(" kbps")
+        self.whipMaxKbps.setSpecialValueText("auto")
+        self.whipMaxKbps.setValue(int(feedback.get("max_kbps", 0)))
+        self.whipAdaptive = QtWidgets.QCheckBox("Adapt to decode speed")
+        self.whipAdaptive.setChecked(bool(feedback.get("adaptive", True)))
+        negLayout.addWidget(QtWidgets.QLabel("Max bitrate:"), 2, 0)
+        negLayout.addWidget(self.whipMaxKbps, 2, 1, 1, 2)
+        negLayout.addWidget(self.whipAdaptive, 2, 3, 1, 3)
+        self.whipHostOnly = QtWidgets.QCheckBox("Host candidates only (LAN, skips STUN)")
+        self.whipHostOnly.setChecked(bool(self.cfg.get("whip_host_only", WHIP_HOST_ONLY_ICE)))
+        negLayout.addWidget(self.whipHostOnly, 3, 0, 1, 6)
+        gl.addWidget(negBox, 9, 0, 1, 3)
+        synth = self.cfg.get("whip_synthetic", {})
+        synthBox = QtWidgets.QGroupBox("Test source")
+        synthLayout = QtWidgets.QGridLayout(synthBox)
+        self.synthEnable = QtWidgets.QCheckBox("Enable synthetic video")
+        self.synthEnable.setChecked(bool(synth.get("enabled", False)))
+        self.synthW = QtWidgets.QSpinBox()
+        self.synthW.setRange(16, 7680)
+        self.synthW.setValue(int(synth.get("width", 640)))
+        self.synthH = QtWidgets.QSpinBox()
+        self.synthH.setRange(16, 4320)
+        self.synthH.setValue(int(synth.get("height", 360)))
+        self.synthFps = QtWidgets.QSpinBox()
+        self.synthFps.setRange(0, 480)
+        self.synthFps.setSpecialValueText("max")
+        self.synthFps.setValue(int(synth.get("fps", 30)))
+        self.synthFmt = QtWidgets.QComboBox()
+        self.synthFmt.addItems(list(PIX_FMTS))
+        self.synthFmt.setCurrentText(synth.get("pix_fmt", "yuv420p"))
+        self.synthPattern = QtWidgets.QComboBox()
+        self.synthPattern.addItems(list(PATTERNS))
+        self.synthPattern.setCurrentText(synth.get("pattern", "gradient"))
+        synthLayout.addWidget(self.synthEnable, 0, 0, 1, 2)
+        synthLayout.addWidget(self.synthFmt, 0, 2, 1, 2)
+        synthLayout.addWidget(self.synthPattern, 0, 4, 1, 2)
+        synthLayout.addWidget(QtWidgets.QLabel("W:"), 1, 0)
+        synthLayout.addWidget(self.synthW, 1, 1)
+        synthLayout.addWidget(QtWidgets.QLabel("H:"), 1, 2)
+        synthLayout.addWidget(self.synthH, 1, 3)
+        synthLayout.addWidget(QtWidgets.QLabel("fps:"), 1, 4)
+        synthLayout.addWidget(self.synthFps, 1, 5)
+        gl.addWidget(synthBox, 10, 0, 1, 3)
+        self.whipHistory = HistoryPanel(self.history, [
+            ("whip.fps", "video fps", "{:.1f}"),
+            ("whip.drops", "dropped frames/s"),
+            ("whip.total", "total p95 ms", "{:.1f}", True),
+            ("whip.decode", "decode p95 ms", "{:.1f}", True),
+            ("whip.paint", "paint p95 ms", "{:.1f}", True),
+        ])
+        gl.addWidget(self.whipHistory, 11, 0, 1, 3)
         tabs.addTab(whipPage, "WHIP")
+        self._tabs = tabs
+        self._whip_page = whipPage
+        tabs.currentChanged.connect(lambda _i: self._update_whip_demand())
 
         self.whipStart.toggled.connect(self._on_whip_start_toggled)
         self.whipCopy.clicked.connect(self._copy_whip_urls)
         self.whipOpenDebug.clicked.connect(self._open_whip_debug)
+        self.whipMaxSessions.valueChanged.connect(lambda _v: self._on_whip_limits_changed())
+        self.whipIdleTimeout.valueChanged.connect(lambda _v: self._on_whip_limits_changed())
+        self.whip.set_session_limits(self.whipMaxSessions.value(), float(self.whipIdleTimeout.value()))
+        self.whipIsolated.toggled.connect(self._on_whip_isolated_changed)
+        self.whipLowLatency.toggled.connect(self._on_whip_low_latency_changed)
+        self.whip.set_low_latency(self.whipLowLatency.isChecked())
+        self.whipCodec.currentIndexChanged.connect(lambda _i: self._on_whip_policy_changed())
+        self.whipMaxW.valueChanged.connect(lambda _v: self._on_whip_policy_changed())
+        self.whipMaxH.valueChanged.connect(lambda _v: self._on_whip_policy_changed())
+        self.whipMaxFps.valueChanged.connect(lambda _v: self._on_whip_policy_changed())
+        self.whip.set_negotiation_policy(policy.to_dict())
+        self.whipMaxKbps.editingFinished.connect(self._on_whip_feedback_changed)
+        self.whipAdaptive.toggled.connect(lambda _c: self._on_whip_feedback_changed())
+        self.whip.set_feedback_config(self._whip_feedback_config())
+        self.whipHostOnly.toggled.connect(self._on_whip_host_only_changed)
+        self.whip.set_host_only_ice(self.whipHostOnly.isChecked())
+        self.synthEnable.toggled.connect(lambda _c: self._on_synthetic_changed())
+        self.synthFmt.currentIndexChanged.connect(lambda _i: self._on_synthetic_changed())
+        self.synthPattern.currentIndexChanged.connect(lambda _i: self._on_synthetic_changed())
+        for sb in (self.synthW, self.synthH, self.synthFps):
+            sb.editingFinished.connect(self._on_synthetic_changed)
+        self.whip.set_synthetic_source(self._synthetic_config())
+        self._update_whip_demand()
+        self.whip.set_isolated(self.whipIsolated.isChecked())
 
         self.blocker = MouseBlocker()
         self.blocker.set_blocked(self._blocked_buttons())
@@ -348,6 +555,13 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.refreshBtn.clicked.connect(self.fill_ports)
         self.connectBtn.toggled.connect(self.on_connect_toggled)
+        self.probeBtn.clicked.connect(self.on_probe_clicked)
+        self.encodingCombo.currentIndexChanged.connect(self._on_encoding_changed)
+        self.wideChk.toggled.connect(self._on_wide_changed)
+        self.daemonChk.toggled.connect(self._on_daemon_changed)
+        self.playoutSpin.valueChanged.connect(self._on_playout_changed)
+        self.staleSpin.valueChanged.connect(self._on_stale_changed)
+        self.staleCombo.currentIndexChanged.connect(self._on_stale_changed)
         self.toggleBtn.toggled.connect(self.on_toggle_forwarding)
         self.flashBtn.clicked.connect(self.on_flash_clicked)
         self.clearBtn.clicked.connect(self._on_clear_packages)
@@ -365,14 +579,18 @@ class MainWindow(QtWidgets.QMainWindow):
         self.forwarding = False
         self.filter = None
 
-        self.flashProgress.connect(self._on_flash_progress)
-        self.flashLogLine.connect(self._on_flash_log)
-
         self.fill_ports()
 
         self._whip_last_frame_t: float | None = None
         self._whip_fps_ema: float = 0.0
         self._whip_ms_ema: float = 0.0
+        self._whip_latency_timer = QtCore.QTimer(self)
+        self._whip_latency_timer.setInterval(1000)
+        self._whip_latency_timer.timeout.connect(self._refresh_whip_latency)
+        self._history_timer = QtCore.QTimer(self)
+        self._history_timer.setInterval(1000)
+        self._history_timer.timeout.connect(self._sample_history)
+        self._history_timer.start()
 
         def _on_crop_changed_local():
             center = self.cropCenter.isChecked()
@@ -417,33 +635,109 @@ class MainWindow(QtWidgets.QMainWindow):
     def on_connect_toggled(self, checked):
         if checked:
             port = self.portCombo.currentData()
-            ok = self.sender.open(port, 1000000) if port else False
+            target = self.cfg.get("serial_baud", {}).get(self._baud_key(port)) if port else None
+            encoding = self.encodingCombo.currentData()
+            playout = self.playoutSpin.value()
+            ok = self.sender.open(port, SERIAL_BOOT_BAUD, target, encoding, playout) if port else False
             if not ok:
                 self.statusLbl.setText("Failed")
                 self.connectBtn.blockSignals(True); self.connectBtn.setChecked(False); self.connectBtn.blockSignals(False)
                 self.connectBtn.setText("Connect")
                 return
-            self.statusLbl.setText("Connected @ 1,000,000")
+            self.statusLbl.setText(self._connected_text())
+            self.statusLbl.setToolTip(self._caps_text())
             self.connectBtn.setText("Disconnect")
         else:
             self.sender.close()
             self.statusLbl.setText("Disconnected")
             self.connectBtn.setText("Connect")
 
+    def _connected_text(self) -> str:
+        parts = [p for p, on in (("compact", self.sender.encoding == "compact"),
+                                 ("16-bit", self.sender.report_step > 127),
+                                 (f"playout {self.sender.playout_us / 1000:g} ms", self.sender.playout_us)) if on]
+        suffix = f" ({', '.join(parts)})" if parts else ""
+        return f"Connected @ {self.sender.baud:,}{suffix}"
+
+    def _caps_text(self) -> str:
+        caps = self.sender.caps
+        if caps is None:
+            return "Firmware predates the capability handshake; reflash to pick settings automatically"
+        d = caps.to_dict()
+        return (f"Firmware protocol v{d['version']}: {', '.join(d['features'])}\n"
+                f"HID report every {d['hid_interval_us']} us, up to {d['report_step']} per axis, "
+                f"{d['rx_window']} B receive buffer")
+
+    def _on_encoding_changed(self, _index: int):
+        self.cfg["serial_encoding"] = self.encodingCombo.currentData()
+        save_config(self.cfg)
+
+    def _on_playout_changed(self, value: float):
+        self.cfg["playout_ms"] = value
+        save_config(self.cfg)
+
+    def _on_daemon_changed(self, checked: bool):
+        self.cfg["cli_daemon"] = checked
+        save_config(self.cfg)
+        self._cli_daemon_failed = False
+        if not checked:
+            self._close_cli_daemon()
+
+    def _on_stale_changed(self, *_):
+        self.cfg["stale_ms"] = self.staleSpin.value()
+        self.cfg["stale_policy"] = self.staleCombo.currentData()
+        self.sender.set_staleness(self.cfg["stale_ms"], self.cfg["stale_policy"])
+        save_config(self.cfg)
+
+    def _on_wide_changed(self, checked: bool):
+        self.cfg["hid_wide"] = checked
+        save_config(self.cfg)
+
+    def _baud_key(self, port: str) -> str:
+        return f"{self._board_name}|{port}"
+
+    def on_probe_clicked(self):
+        port = self.portCombo.currentData()
+        if not port:
+            return
+        if self.connectBtn.isChecked():
+            self.connectBtn.setChecked(False)
+        if self.sender.start_probe(port):
+            self.probeBtn.setEnabled(False)
+            self.connectBtn.setEnabled(False)
+            self.statusLbl.setText("Probing…")
+
+    def on_probe_finished(self, result: dict):
+        self.probeBtn.setEnabled(True)
+        self.connectBtn.setEnabled(True)
+        best = result.get("best")
+        if result.get("error") or not best:
+            self.statusLbl.setText("Probe failed")
+            self.statusBar().showMessage(f"Baud probe failed: {result.get('error') or 'no clean rate'}", 5000)
+            return
+        self.cfg.setdefault("serial_baud", {})[self._baud_key(result["port"])] = best
+        save_config(self.cfg)
+        summary = ", ".join(
+            f"{r['baud']:,}: {r['bytes_per_s'] / 1000:.0f} kB/s" if r["clean"] else f"{r['baud']:,}: errors"
+            for r in result["runs"]
+        )
+        self.statusLbl.setText(f"Best {best:,}")
+        self.statusBar().showMessage(f"Baud probe: {summary}", 8000)
+
     def on_connected_changed(self, ok:bool):
         self.connectBtn.blockSignals(True)
         self.connectBtn.setChecked(ok)
         self.connectBtn.blockSignals(False)
         if ok:
-            self.statusLbl.setText("Connected")
-        elif self.statusLbl.text() != "Failed":
-            self.statusLbl.setText("Disconnected")
+            self.statusLbl.setText(self._connected_text())
+            self.statusLbl.setToolTip(self._caps_text())
+        else:
+            self.statusLbl.setToolTip("")
+            if self.statusLbl.text() != "Failed":
+                self.statusLbl.setText("Disconnected")
 
     def on_toggle_forwarding(self, enabled):
-        try:
-            require_auth()
-        except Exception:
-            enabled = False
+        enabled = self.forwarder.set_forwarding(enabled)
         self.forwarding = enabled
         self.toggleBtn.setText("Stop forwarding" if enabled else "Start forwarding")
         app = QtWidgets.QApplication.instance()
@@ -467,8 +761,7 @@ class MainWindow(QtWidgets.QMainWindow):
             QtCore.QTimer.singleShot(0, lambda: self.toggleBtn.setChecked(False))
 
     def _on_delta(self, dx:int, dy:int):
-        if self.forwarding and self.sender.ser:
-            self.sender.send_delta(dx, dy)
+        self.forwarder.feed(dx, dy)
 
     def _blocked_buttons(self) -> set[str]:
         buttons = set()
@@ -495,10 +788,67 @@ class MainWindow(QtWidgets.QMainWindow):
         self._board_name = name
         self.cfg["board"] = name
         save_config(self.cfg)
+        self._update_wide_enabled()
+
+    def _update_wide_enabled(self):
+        board = self.boardCombo.currentData() or {}
+        self.wideChk.setEnabled(bool(board.get("wide_hid")))
 
     def on_stats(self, pps:int):
         self.rateLbl.setText(f"{pps} pkts/s")
 
+    def _record_link_stats(self, link: dict):
+        fw = link.get("firmware") or {}
+        self.history.add_many({
+            "serial.packets": link.get("packets", 0),
+            "serial.bytes": link.get("bytes", 0),
+            "serial.dropped": link.get("dropped", 0),
+            "serial.coalesced": link.get("coalesced", 0),
+            "serial.expired": link.get("expired", 0),
+            "serial.rtt": link.get("rtt_ms"),
+            "serial.jitter_in": fw.get("jitter_in_us"),
+            "serial.jitter_out": fw.get("jitter_out_us"),
+        })
+        self.ui.post("link", self.on_link_stats, link)
+
+    def on_link_stats(self, link: dict):
+        lines = [
+            f"{link['bytes']} B/s on the wire",
+            f"coalesced {link['coalesced']}, expired {link.get('expired', 0)}, waits {link['credit_waits']}, short writes {link['short_writes']}",
+        ]
+        if link.get("rtt_ms") is not None:
+            lines.append(f"round trip {link['rtt_ms']:.2f} ms, dropped {link.get('dropped', 0)}")
+        if "window" in link:
+            lines.append(f"in flight {link['in_flight']}/{link['window']} B, resyncs {link['resyncs']}")
+        else:
+            lines.append("no credit reports from firmware; pacing on the OS buffer")
+        fw = link.get("firmware")
+        if fw:
+            lines.append(f"firmware: rx full {fw['rx_full']}, discarded {fw['discarded']}, "
+                         f"{fw['moves']} moves in {fw['reports']} reports, clipped {fw['clipped']}")
+            if "jitter_in_us" in fw:
+                lines.append(f"jitter {fw['jitter_in_us']} us on arrival, {fw['jitter_out_us']} us after playout, "
+                             f"late {fw['late']}, overflow {fw['playout_overflow']}")
+        self.rateLbl.setToolTip("\n".join(lines))
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QtCore.QEvent.WindowStateChange and hasattr(self, '_tabs'):
+            self._update_whip_demand()
+
+    def _update_whip_demand(self):
+        screen = self.screen()
+        rate = screen.refreshRate() if screen is not None else 60.0
+        self.ui.set_rate(rate)
+        if self._tabs.currentWidget() is self._whip_page and not self.isMinimized():
+            self.whip.subscribe("preview", rate)
+        else:
+            self.whip.unsubscribe("preview")
+        if self._whip_debug_win is not None and self._whip_debug_win.isVisible():
+            self.whip.subscribe("debug", rate)
+        else:
+            self.whip.unsubscribe("debug")
+
     def closeEvent(self, event):
         try:
             self.blocker.stop()
@@ -507,9 +857,60 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.whip.stop()
             except Exception:
                 pass
+            self._close_cli_daemon()
         finally:
             super().closeEvent(event)
 
+    def _cli_session(self, cli: str) -> ArduinoDaemon | None:
+        # None means run arduino-cli per command, as without the option
+        if not self.daemonChk.isChecked() or self._cli_daemon_failed:
+            return None
+        if self._cli_daemon is not None and self._cli_daemon.alive:
+            return self._cli_daemon
+        self._close_cli_daemon()
+        urls = sorted({b["index_url"] for b in BOARDS.values() if b.get("index_url")})
+        try:
+            self._cli_daemon = ArduinoDaemon.start(cli, urls)
+            self.ui.log(self.log, f"arduino-cli daemon on {self._cli_daemon.address}")
+        except DaemonError as e:
+            self._cli_daemon_failed = True
+            self.ui.log(self.log, f"arduino-cli daemon unavailable ({e}); running arduino-cli per command "
+                                  "until the option is toggled")
+        return self._cli_daemon
+
+    def _close_cli_daemon(self):
+        if self._cli_daemon is not None:
+            self._cli_daemon.close()
+            self._cli_daemon = None
+
+    def _on_cli_event(self, ev: dict):
+        # called from worker threads; progress arrives structured, no text scraping
+        if ev["kind"] == "progress":
+            self.ui.post("progress", self._on_flash_progress, max(0, min(100, int(ev["percent"]))))
+        else:
+            self.ui.log(self.log, ev["text"])
+
+    def _run_daemon(self, events) -> bool:
+        # streams a daemon call on a worker thread while the UI keeps painting, like _run_cli
+        done_evt = threading.Event()
+        result = {"ok": False}
+
+        def worker():
+            try:
+                for ev in events:
+                    self._on_cli_event(ev)
+                result["ok"] = True
+            except DaemonError as e:
+                self.ui.log(self.log, f"Error: {e}")
+            finally:
+                done_evt.set()
+
+        threading.Thread(target=worker, daemon=True).start()
+        while not done_evt.is_set():
+            QtWidgets.QApplication.processEvents()
+            time.sleep(0.01)
+        return result["ok"]
+
     def _run_cli(self, args: list[str]) -> bool:
         try:
             proc = subprocess.Popen(
@@ -527,11 +928,11 @@ class MainWindow(QtWidgets.QMainWindow):
                     QtWidgets.QApplication.processEvents()
                     time.sleep(0.01)
                     continue
-                self.log.appendPlainText(line.rstrip("\r\n"))
+                self.ui.log(self.log, line.rstrip("\r\n"))
                 QtWidgets.QApplication.processEvents()
             return proc.returncode == 0
         except Exception as e:
-            self.log.appendPlainText(f"Error: {e}")
+            self.ui.log(self.log, f"Error: {e}")
             return False
 
     def locate_arduino_cli(self) -> str | None:
@@ -549,7 +950,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.progress.setRange(0, 100)
         self.progress.setValue(0)
-        self.log.appendPlainText(f"Downloading arduino-cli from:\n{ARDUINO_CLI_URL}")
+        self.ui.log(self.log, f"Downloading arduino-cli from:\n{ARDUINO_CLI_URL}")
 
         zip_path = os.path.join(tools_dir(), "arduino-cli.zip")
         done_evt = threading.Event()
@@ -569,12 +970,8 @@ class MainWindow(QtWidgets.QMainWindow):
                             got += len(chunk)
                             if total:
                                 pct = max(0, min(100, int(got * 100 / total)))
-                                QtCore.QMetaObject.invokeMethod(
-                                    self, "flashProgress", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(int, pct)
-                                )
-                QtCore.QMetaObject.invokeMethod(
-                    self, "flashLogLine", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, "Download complete. Extracting…")
-                )
+                                self.ui.post("progress", self._on_flash_progress, pct)
+                self.ui.log(self.log, "Download complete. Extracting…")
                 with zipfile.ZipFile(zip_path, "r") as zf:
                     zf.extract("arduino-cli.exe", tools_dir())
                 result["ok"] = True
@@ -589,11 +986,11 @@ class MainWindow(QtWidgets.QMainWindow):
             time.sleep(0.02)
 
         if result["ok"] and os.path.isfile(exe_path):
-            self.flashProgress.emit(100)
-            self.log.appendPlainText(f"arduino-cli ready: {exe_path}")
+            self.ui.post("progress", self._on_flash_progress, 100)
+            self.ui.log(self.log, f"arduino-cli ready: {exe_path}")
             return exe_path
         else:
-            self.log.appendPlainText(f"Auto-download failed: {result['err']}")
+            self.ui.log(self.log, f"Auto-download failed: {result['err']}")
             return None
 
     def locate_bossac(self) -> str | None:
@@ -624,8 +1021,24 @@ class MainWindow(QtWidgets.QMainWindow):
             return path
         return None
 
-    def _ensure_core_installed(self, cli:str, fqbn:str)->bool:
-        core = ":".join(fqbn.split(":")[:2])
+    def _ensure_core_installed(self, cli:str, board:dict)->bool:
+        core = ":".join(board["fqbn"].split(":")[:2])
+        # third-party cores such as Teensy come from their own package index
+        urls = ["--additional-urls", board["index_url"]] if board.get("index_url") else []
+        daemon = self._cli_session(cli)
+        if daemon is not None:
+            try:
+                if daemon.core_installed(core):
+                    return True
+                self.ui.log(self.log, f"Installing core {core}…")
+                for step in (daemon.update_index, lambda: daemon.lib_install("Mouse"), lambda: daemon.core_install(core)):
+                    if not self._run_daemon(step()):
+                        raise RuntimeError("arduino-cli daemon step failed")
+                return True
+            except (DaemonError, RuntimeError) as e:
+                self.ui.log(self.log, f"Core install failed: {e}")
+                QtWidgets.QMessageBox.critical(self, "Core install failed", f"Could not install {core}. See log.")
+                return False
         try:
             out = subprocess.check_output([cli, "core", "list"], text=True, stderr=subprocess.STDOUT)
             if core in out:
@@ -633,16 +1046,16 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception:
             pass
         try:
-            self.log.appendPlainText(f"Installing core {core}…")
-            if not self._run_cli([cli, "core", "update-index"]):
+            self.ui.log(self.log, f"Installing core {core}…")
+            if not self._run_cli([cli, "core", "update-index", *urls]):
                 raise RuntimeError("core update-index failed")
             if not self._run_cli([cli, "lib", "install", "Mouse"]):
                 raise RuntimeError("lib install Mouse failed")
-            if not self._run_cli([cli, "core", "install", core]):
+            if not self._run_cli([cli, "core", "install", core, *urls]):
                 raise RuntimeError("core install failed")
             return True
         except Exception as e:
-            self.log.appendPlainText(f"Core install failed: {e}")
+            self.ui.log(self.log, f"Core install failed: {e}")
             QtWidgets.QMessageBox.critical(self, "Core install failed", f"Could not install {core}. See log.")
             return False
 
@@ -652,7 +1065,12 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         board = self.boardCombo.currentData()
         core = ":".join(board["fqbn"].split(":")[:2])
-        self.log.appendPlainText("Removing library…")
+        self.ui.log(self.log, "Removing library…")
+        daemon = self._cli_session(cli)
+        if daemon is not None:
+            self._run_daemon(daemon.lib_uninstall("Mouse"))
+            self._run_daemon(daemon.core_uninstall(core))
+            return
         self._run_cli([cli, "lib", "uninstall", "Mouse"])
         self._run_cli([cli, "core", "uninstall", core])
 
@@ -661,7 +1079,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if not cli:
             return None
         board = self.boardCombo.currentData()
-        if not self._ensure_core_installed(cli, board["fqbn"]):
+        if not self._ensure_core_installed(cli, board):
             return None
         build_dir = tempfile.mkdtemp()
         sketch = os.path.join(os.path.dirname(__file__), "ControlMouse.ino")
@@ -673,14 +1091,26 @@ class MainWindow(QtWidgets.QMainWindow):
             board["fqbn"],
             "--build-path",
             build_dir,
-            sketch,
         ]
-        self.log.appendPlainText("Compiling sketch…")
+        defines = dict(board.get("defines", {}))
+        if self.wideChk.isChecked() and board.get("wide_hid"):
+            defines["WIDE_HID"] = 1
+        props = []
+        if defines:
+            flags = " ".join(f"-D{k}={v}" for k, v in defines.items())
+            props.append(f"compiler.cpp.extra_flags={flags}")
+            args += ["--build-property", props[0]]
+        args.append(sketch)
+        self.ui.log(self.log, "Compiling sketch…")
         ok = False
+        daemon = self._cli_session(cli)
         try:
-            ok = self._run_cli(args)
+            if daemon is not None:
+                ok = self._run_daemon(daemon.compile(board["fqbn"], sketch, build_dir, props))
+            else:
+                ok = self._run_cli(args)
         except Exception as e:
-            self.log.appendPlainText(str(e))
+            self.ui.log(self.log, str(e))
         if not ok:
             QtWidgets.QMessageBox.critical(self, "Build failed", "arduino-cli compile failed. See log.")
             return None
@@ -694,7 +1124,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.progress.setRange(0, 100)
         self.progress.setValue(0)
-        self.log.appendPlainText(f"Downloading bossac from:\n{BOSSAC_URL}")
+        self.ui.log(self.log, f"Downloading bossac from:\n{BOSSAC_URL}")
 
         done_evt = threading.Event()
         result = {"ok": False, "exe": None, "err": None}
@@ -712,8 +1142,8 @@ class MainWindow(QtWidgets.QMainWindow):
                             got += len(chunk)
                             if total:
                                 pct = max(0, min(100, int(got * 100 / total)))
-                                QtCore.QMetaObject.invokeMethod(self, "flashProgress", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(int, pct))
-                QtCore.QMetaObject.invokeMethod(self, "flashLogLine", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, "Download complete. Extracting…"))
+                                self.ui.post("progress", self._on_flash_progress, pct)
+                self.ui.log(self.log, "Download complete. Extracting…")
 
                 found = None
                 with tarfile.open(tar_path, "r:gz") as tf:
@@ -747,11 +1177,11 @@ class MainWindow(QtWidgets.QMainWindow):
             time.sleep(0.02)
 
         if result["ok"]:
-            self.flashProgress.emit(100)
-            self.log.appendPlainText(f"bossac ready: {result['exe']}")
+            self.ui.post("progress", self._on_flash_progress, 100)
+            self.ui.log(self.log, f"bossac ready: {result['exe']}")
             return result["exe"]
         else:
-            self.log.appendPlainText(f"Auto-download failed: {result['err']}")
+            self.ui.log(self.log, f"Auto-download failed: {result['err']}")
             return None
 
     def on_flash_clicked(self):
@@ -767,7 +1197,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
 
             self.progress.setValue(0)
-            self.log.clear()
+            self.ui.clear(self.log)
             self.statusBar().showMessage("Preparing bootloader…")
 
             selected_port = self.portCombo.currentData()
@@ -800,25 +1230,25 @@ class MainWindow(QtWidgets.QMainWindow):
                     proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
                     for line in proc.stdout:
                         line = line.rstrip("\r\n")
-                        QtCore.QMetaObject.invokeMethod(self, "flashLogLine", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, line))
+                        self.ui.log(self.log, line)
                         m = re.search(r'(\d{1,3})\s*%', line)
                         if m:
                             pct = max(0, min(100, int(m.group(1))))
-                            QtCore.QMetaObject.invokeMethod(self, "flashProgress", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(int, pct))
+                            self.ui.post("progress", self._on_flash_progress, pct)
                         else:
                             m2 = re.search(r'\((\d+)\s*/\s*(\d+)\s*pages?\)', line, re.IGNORECASE)
                             if m2:
                                 cur, total = int(m2.group(1)), max(1, int(m2.group(2)))
                                 pct = int((cur / total) * 100)
-                                QtCore.QMetaObject.invokeMethod(self, "flashProgress", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(int, pct))
+                                self.ui.post("progress", self._on_flash_progress, pct)
                     proc.wait()
                     ok = (proc.returncode == 0)
                 except Exception as e:
-                    QtCore.QMetaObject.invokeMethod(self, "flashLogLine", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, f"Error: {e}"))
+                    self.ui.log(self.log, f"Error: {e}")
                     ok = False
                 finally:
                     if ok:
-                        QtCore.QMetaObject.invokeMethod(self, "flashProgress", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(int, 100))
+                        self.ui.post("progress", self._on_flash_progress, 100)
                     QtCore.QMetaObject.invokeMethod(self, "_flash_done",
                         QtCore.Qt.QueuedConnection,
                         QtCore.Q_ARG(bool, ok),
@@ -835,7 +1265,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 QtWidgets.QMessageBox.warning(self, "No port", "No serial port selected.")
                 return
             self.progress.setValue(0)
-            self.log.clear()
+            self.ui.clear(self.log)
             self.setEnabled(False)
             self.statusBar().showMessage(f"Flashing on {selected_port}…")
             args = [
@@ -845,22 +1275,28 @@ class MainWindow(QtWidgets.QMainWindow):
                 "--port", selected_port,
                 "--input-file", bin_path,
             ]
+            daemon = self._cli_session(cli)
 
             def run_upload():
                 ok = False
                 try:
+                    if daemon is not None:
+                        for ev in daemon.upload(board["fqbn"], selected_port, bin_path):
+                            self._on_cli_event(ev)
+                        ok = True
+                        return
                     proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
                     for line in proc.stdout:
                         line = line.rstrip("\r\n")
-                        QtCore.QMetaObject.invokeMethod(self, "flashLogLine", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, line))
+                        self.ui.log(self.log, line)
                     proc.wait()
                     ok = (proc.returncode == 0)
                 except Exception as e:
-                    QtCore.QMetaObject.invokeMethod(self, "flashLogLine", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(str, f"Error: {e}"))
+                    self.ui.log(self.log, f"Error: {e}")
                     ok = False
                 finally:
                     if ok:
-                        QtCore.QMetaObject.invokeMethod(self, "flashProgress", QtCore.Qt.QueuedConnection, QtCore.Q_ARG(int, 100))
+                        self.ui.post("progress", self._on_flash_progress, 100)
                     QtCore.QMetaObject.invokeMethod(self, "_flash_done",
                         QtCore.Qt.QueuedConnection,
                         QtCore.Q_ARG(bool, ok),
@@ -873,12 +1309,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.progress.setRange(0, 100)
         self.progress.setValue(pct)
 
-    @QtCore.Slot(str)
-    def _on_flash_log(self, line:str):
-        self.log.appendPlainText(line)
-
     @QtCore.Slot(bool, str)
     def _flash_done(self, ok:bool, port_used:str):
+        self.ui.flush()
         self.setEnabled(True)
         self.fill_ports()
         if ok:
@@ -895,13 +1328,20 @@ class MainWindow(QtWidgets.QMainWindow):
         self.whipStart.blockSignals(False)
         self.whipStart.setText("Stop Server" if ok else "Start Server")
         self.statusBar().showMessage("WHIP server running" if ok else "WHIP server stopped", 3000)
-        if not ok:
+        if ok:
+            self._whip_latency_timer.start()
+        else:
+            self._whip_latency_timer.stop()
+            self.ui.discard("frame")
+            self.whipLatency.setText("")
             self._whip_last_frame = None
             self.whipPreview.clear()
             self.whipStats.setText("")
             self._whip_last_frame_t = None
             self._whip_fps_ema = 0.0
             self._whip_ms_ema = 0.0
+            self.whipSessions.setText("No active sessions")
+            self._whip_transport = {}
             if hasattr(self, '_whip_debug_win') and self._whip_debug_win is not None:
                 try:
                     self._whip_debug_win.update_frame(None)
@@ -918,10 +1358,128 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception:
             pass
 
+    def _on_whip_limits_changed(self):
+        self.cfg["whip_max_sessions"] = int(self.whipMaxSessions.value())
+        self.cfg["whip_idle_timeout"] = int(self.whipIdleTimeout.value())
+        save_config(self.cfg)
+        self.whip.set_session_limits(self.whipMaxSessions.value(), float(self.whipIdleTimeout.value()))
+
+    def _on_whip_policy_changed(self):
+        codecs, strict = self.whipCodec.currentData()
+        policy = NegotiationPolicy(
+            codecs=codecs,
+            max_width=self.whipMaxW.value(),
+            max_height=self.whipMaxH.value(),
+            max_fps=self.whipMaxFps.value(),
+            strict=strict,
+        )
+        self.cfg["whip_policy"] = policy.to_dict()
+        save_config(self.cfg)
+        self.whip.set_negotiation_policy(policy.to_dict())
+
+    def _on_whip_host_only_changed(self, checked: bool):
+        self.cfg["whip_host_only"] = bool(checked)
+        save_config(self.cfg)
+        self.whip.set_host_only_ice(checked)
+
+    def _whip_feedback_config(self) -> dict:
+        return {"max_kbps": int(self.whipMaxKbps.value()), "adaptive": self.whipAdaptive.isChecked()}
+
+    def _on_whip_feedback_changed(self):
+        cfg = self._whip_feedback_config()
+        self.cfg["whip_feedback"] = cfg
+        save_config(self.cfg)
+        self.whip.set_feedback_config(cfg)
+
+    def _synthetic_config(self) -> dict:
+        return {
+            "enabled": self.synthEnable.isChecked(),
+            "width": int(self.synthW.value()),
+            "height": int(self.synthH.value()),
+            "fps": int(self.synthFps.value()),
+            "pix_fmt": self.synthFmt.currentText(),
+            "pattern": self.synthPattern.currentText(),
+        }
+
+    def _on_synthetic_changed(self):
+        cfg = self._synthetic_config()
+        self.cfg["whip_synthetic"] = cfg
+        save_config(self.cfg)
+        self.whip.set_synthetic_source(cfg)
+
+    def _on_whip_low_latency_changed(self, checked: bool):
+        self.cfg["whip_low_latency"] = bool(checked)
+        save_config(self.cfg)
+        self.whip.set_low_latency(checked)
+
+    def _on_whip_isolated_changed(self, checked: bool):
+        self.cfg["whip_isolated"] = bool(checked)
+        save_config(self.cfg)
+        self.whip.set_isolated(checked)
+        if self.whipStart.isChecked():
+            self.statusBar().showMessage("Restart the WHIP server to apply", 3000)
+
+    def _record_whip_sessions(self, sessions: list[dict]):
+        self._whip_sessions_state = list(sessions or [])
+        self.ui.post("sessions", self._on_whip_sessions, sessions)
+
+    def _sample_history(self):
+        if self.whipStart.isChecked():
+            sessions = self._whip_sessions_state
+            drops = sum(int(s.get("skipped", 0)) for s in sessions)
+            drops += sum(int(t.get("frames_dropped", 0)) for t in self._whip_transport.values())
+            values = {f"whip.{stage}": ms for stage, ms in self._whip_hist_delta.sample(self.whip.stats.export_raw()).items()}
+            values["whip.fps"] = sum(float(s.get("fps", 0.0)) for s in sessions)
+            if self._whip_drops_seen is not None:
+                values["whip.drops"] = max(0, drops - self._whip_drops_seen)
+            self._whip_drops_seen = drops
+            self.history.add_many(values)
+        else:
+            self._whip_drops_seen = None
+        self.ui.post("history", self._refresh_history)
+
+    def _refresh_history(self):
+        self.mouseHistory.refresh()
+        self.whipHistory.refresh()
+
+    def _on_whip_sessions(self, sessions: list[dict]):
+        if not sessions:
+            self.whipSessions.setText("No active sessions")
+            return
+        lines = []
+        for s in sessions:
+            lines.append(
+                f"{s['id'][:8]}  {s['remote'] or '?'}  {s['state']}  |  "
+                f"{s['width']}x{s['height']}  ~{s['fps']:.1f} fps  |  "
+                f"{s['frames']} frames  skipped {s.get('skipped', 0)}  |  up {s['age']:.0f}s"
+            )
+            if s.get('setup_ms') is not None:
+                ttff = f"{s['ttff'] * 1000:.0f} ms" if s.get('ttff') is not None else "-"
+                lines.append(f"    setup {s['setup_ms']:.0f} ms  first frame {ttff}")
+            t = self._whip_transport.get(s['id'])
+            if t:
+                lines.append(
+                    f"    {t['bitrate_kbps']:.0f} kbps  loss {t['loss_pct']:.1f}% ({t['packets_lost']})  "
+                    f"jitter {t['jitter_ms']:.1f} ms  |  NACK {t['nack']}  PLI {t['pli']}  |  "
+                    f"decoded {t['frames_decoded']}  dropped {t['frames_dropped']}"
+                )
+            if s.get('bitrate_cap_kbps') is not None:
+                rec = s.get('last_recovery_ms')
+                lines.append(
+                    f"    cap {s['bitrate_cap_kbps']} kbps  backlog {s['decode_backlog_ms']:.0f} ms  |  "
+                    f"keyframe requests {s['keyframe_requests']}  decode errors {s.get('decode_errors', 0)}"
+                    + (f"  last recovery {rec:.0f} ms" if rec is not None else "")
+                )
+        self.whipSessions.setText("\n".join(lines))
+
+    def _on_whip_transport(self, stats: dict):
+        self._whip_transport = dict(stats or {})
+
     @QtCore.Slot()
     def _open_whip_debug(self):
         if not hasattr(self, '_whip_debug_win') or self._whip_debug_win is None:
             self._whip_debug_win = WHIPDebugWindow(self)
+            self._whip_debug_win.visibilityChanged.connect(lambda _v: self._update_whip_demand())
             if self._whip_last_frame is not None:
                 self._whip_debug_win.update_frame(self._whip_last_frame)
         self._whip_debug_win.show()
@@ -934,6 +1492,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if not img.isNull():
             pm = QtGui.QPixmap.fromImage(img)
             self.whipPreview.setPixmap(pm.scaled(self.whipPreview.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.FastTransformation))
+            self.whip.record_paint(img)
         t = time.time()
         if self._whip_last_frame_t is not None:
             dt = max(1e-6, t - self._whip_last_frame_t)
@@ -949,6 +1508,18 @@ class MainWindow(QtWidgets.QMainWindow):
         if hasattr(self, '_whip_debug_win') and self._whip_debug_win is not None:
             self._whip_debug_win.update_frame(img)
 
+    def on_trace_clicked(self):
+        if RECORDER.dump() is None:
+            self.statusBar().showMessage("Could not write trace", 5000)
+
+    @QtCore.Slot(str, str)
+    def _on_trace_dumped(self, path: str, reason: str):
+        what = "Trace" if reason == "manual" else f"Latency spike ({reason.removeprefix('spike-')}), trace"
+        self.statusBar().showMessage(f"{what} written to {path} (open in chrome://tracing or ui.perfetto.dev)", 10000)
+
+    def _refresh_whip_latency(self):
+        self.whipLatency.setText(format_summary(self.whip.stats.summary()))
+
     def _on_whip_start_toggled(self, checked: bool):
         if checked:
             self.whip.start(self.whipPort.value())
@@ -963,6 +1534,8 @@ class MainWindow(QtWidgets.QMainWindow):
             self.statusBar().showMessage("Copied WHIP URLs to clipboard", 3000)
 
 class WHIPDebugWindow(QtWidgets.QDialog):
+    visibilityChanged = QtCore.Signal(bool)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("WHIP Debug")
@@ -978,6 +1551,14 @@ class WHIPDebugWindow(QtWidgets.QDialog):
         self._fps = 0.0
         self._ms = 0.0
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.visibilityChanged.emit(True)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.visibilityChanged.emit(False)
+
     def update_frame(self, img: QtGui.QImage | None):
         if img is None or (hasattr(img, 'isNull') and img.isNull()):
             self.view.clear()
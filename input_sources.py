@@ -0,0 +1,184 @@
+import math
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from flight_recorder import RECORDER
+
+OnDelta = Callable[[int, int], None]
+
+class SyntheticSource:
+    # circles at a fixed report rate; exercises the link without a mouse
+    def __init__(self, on_delta: OnDelta, rate_hz: float = 1000.0, radius: float = 200.0, period_s: float = 1.0):
+        self.on_delta = on_delta
+        self.rate_hz = rate_hz
+        self.radius = radius
+        self.period_s = period_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="input-synthetic", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        step = 1.0 / self.rate_hz
+        w = 2 * math.pi / self.period_s
+        x = y = 0.0
+        sent_x = sent_y = 0
+        t0 = time.perf_counter()
+        n = 0
+        while not self._stop.is_set():
+            n += 1
+            t = n * step
+            x = self.radius * math.cos(w * t)
+            y = self.radius * math.sin(w * t)
+            dx, dy = int(x) - sent_x, int(y) - sent_y
+            sent_x += dx
+            sent_y += dy
+            if dx or dy:
+                RECORDER.mark("input.raw", (dx, dy))
+                self.on_delta(dx, dy)
+            delay = t0 + t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+# linux/input.h
+EV_SYN, EV_REL = 0x00, 0x02
+REL_X, REL_Y = 0x00, 0x01
+SYN_REPORT = 0
+EVIOCGRAB = 0x40044590
+_EVENT = struct.Struct("llHHi")
+
+def find_evdev_mouse() -> Optional[str]:
+    try:
+        with open("/proc/bus/input/devices", "r", encoding="utf-8") as f:
+            blocks = f.read().split("\n\n")
+    except OSError:
+        return None
+    for block in blocks:
+        handlers = ""
+        rel = 0
+        for line in block.splitlines():
+            if line.startswith("H: Handlers="):
+                handlers = line.split("=", 1)[1]
+            elif line.startswith("B: REL="):
+                rel = int(line.split("=", 1)[1].split()[-1], 16)
+        if "mouse" in handlers and rel & 0x3 == 0x3:
+            for h in handlers.split():
+                if h.startswith("event"):
+                    return f"/dev/input/{h}"
+    return None
+
+class EvdevSource:
+    # relative motion straight from /dev/input, one callback per SYN_REPORT
+    def __init__(self, on_delta: OnDelta, path: Optional[str] = None, grab: bool = False):
+        self.on_delta = on_delta
+        self.path = path or find_evdev_mouse()
+        self.grab = grab
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+
+    def start(self):
+        if not self.path:
+            raise OSError("no evdev mouse found; pass --source evdev:/dev/input/eventN")
+        self._fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        if self.grab:
+            import fcntl
+            fcntl.ioctl(self._fd, EVIOCGRAB, 1)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="input-evdev", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        fd = self._fd
+        dx = dy = 0
+        size = _EVENT.size
+        buf = b""
+        while not self._stop.is_set():
+            r, _, _ = select.select([fd], [], [], 0.2)
+            if not r:
+                continue
+            try:
+                chunk = os.read(fd, size * 64)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            if not chunk:
+                return
+            buf += chunk
+            n = len(buf) - len(buf) % size
+            for _s, _us, etype, code, value in _EVENT.iter_unpack(buf[:n]):
+                if etype == EV_REL:
+                    if code == REL_X:
+                        dx += value
+                    elif code == REL_Y:
+                        dy += value
+                elif etype == EV_SYN and code == SYN_REPORT and (dx or dy):
+                    RECORDER.mark("input.raw", (dx, dy))
+                    self.on_delta(dx, dy)
+                    dx = dy = 0
+            buf = buf[n:]
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+# RAWINPUT is a header (dwType, dwSize, hDevice, wParam) followed by RAWMOUSE, where
+# lLastX/lLastY sit 12 bytes in; reading them in place skips building the ctypes structure
+RIM_TYPEMOUSE = 0
+_RAW_HEADER = 8 + 2 * struct.calcsize("P")
+_RAW_TYPE = struct.Struct("<I")
+_RAW_XY = struct.Struct("<ii")
+_RAW_XY_AT = _RAW_HEADER + 12
+
+def parse_raw_mouse(buf) -> Optional[Tuple[int, int]]:
+    if len(buf) < _RAW_XY_AT + 8 or _RAW_TYPE.unpack_from(buf)[0] != RIM_TYPEMOUSE:
+        return None
+    dx, dy = _RAW_XY.unpack_from(buf, _RAW_XY_AT)
+    return (dx, dy) if dx or dy else None
+
+class RawInputSource:
+    # Windows raw input on a message-only window; hooks share its message loop
+    def __init__(self, on_delta: OnDelta, hooks=()):
+        from mouse_blocker import RawInputWindow
+        self._window = RawInputWindow(on_delta, hooks)
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[BaseException] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="input-raw", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._window.run()
+        except BaseException as e:
+            self.error = e
+
+    def stop(self):
+        self._window.stop()
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+def default_source_kind() -> str:
+    return "raw" if sys.platform == "win32" else "evdev"
@@ -0,0 +1,173 @@
+import csv
+import math
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from constants import HISTORY_LEVELS
+from pipeline_stats import LatencyHistogram
+
+NAN = float("nan")
+
+class _Level:
+    # one resolution: mean and peak per bucket in preallocated arrays
+    def __init__(self, step: int, size: int):
+        self.step = step
+        self.size = size
+        self.mean = array("f", [NAN]) * size
+        self.peak = array("f", [NAN]) * size
+        self.newest: Optional[int] = None
+        self._bucket: Optional[int] = None
+        self._sum = 0.0
+        self._n = 0
+        self._max = -math.inf
+
+    def add(self, t: float, value: float):
+        b = int(t) // self.step
+        if self._bucket is not None and b != self._bucket:
+            self._commit()
+        self._bucket = b
+        self._sum += value
+        self._n += 1
+        if value > self._max:
+            self._max = value
+
+    def _commit(self):
+        b = self._bucket
+        if self.newest is not None:
+            # buckets with no samples read back as gaps
+            for k in range(max(self.newest + 1, b - self.size + 1), b):
+                self.mean[k % self.size] = NAN
+                self.peak[k % self.size] = NAN
+        if self.newest is None or b > self.newest:
+            self.mean[b % self.size] = self._sum / self._n
+            self.peak[b % self.size] = self._max
+            self.newest = b
+        self._sum = 0.0
+        self._n = 0
+        self._max = -math.inf
+
+    def read(self, first: int, last: int) -> List[Tuple[float, float]]:
+        out = []
+        for b in range(first, last + 1):
+            if b == self._bucket and self._n:
+                out.append((self._sum / self._n, self._max))
+            elif self.newest is not None and self.newest - self.size < b <= self.newest:
+                out.append((self.mean[b % self.size], self.peak[b % self.size]))
+            else:
+                out.append((NAN, NAN))
+        return out
+
+class Series:
+    def __init__(self, name: str, unit: str = "", levels=HISTORY_LEVELS):
+        self.name = name
+        self.unit = unit
+        self.levels = [_Level(step, size) for step, size in levels]
+        self.last = NAN
+
+    def add(self, value: float, t: Optional[float] = None):
+        if value is None or value != value:
+            return
+        t = time.time() if t is None else t
+        value = float(value)
+        for lv in self.levels:
+            lv.add(t, value)
+        self.last = value
+
+    def level_for(self, seconds: float) -> _Level:
+        for lv in self.levels:
+            if lv.step * lv.size >= seconds:
+                return lv
+        return self.levels[-1]
+
+    def window(self, seconds: float, now: Optional[float] = None, peak: bool = False) -> Tuple[int, List[float]]:
+        # (step, values oldest first) from the finest level that covers the window
+        lv = self.level_for(seconds)
+        now = time.time() if now is None else now
+        last = int(now) // lv.step
+        first = last - max(1, int(math.ceil(seconds / lv.step))) + 1
+        return lv.step, [p if peak else m for m, p in lv.read(first, last)]
+
+class MetricsHistory:
+    # named per-second series; add() is safe from any thread
+    def __init__(self, levels=HISTORY_LEVELS):
+        self._levels = tuple(levels)
+        self._lock = threading.Lock()
+        self.series: Dict[str, Series] = {}
+
+    def define(self, name: str, unit: str = "") -> Series:
+        with self._lock:
+            s = self.series.get(name)
+            if s is None:
+                s = self.series[name] = Series(name, unit, self._levels)
+            return s
+
+    def add(self, name: str, value: float, t: Optional[float] = None):
+        s = self.series.get(name) or self.define(name)
+        with self._lock:
+            s.add(value, t)
+
+    def add_many(self, values: Dict[str, float], t: Optional[float] = None):
+        t = time.time() if t is None else t
+        for name, value in values.items():
+            self.add(name, value, t)
+
+    def window(self, name: str, seconds: float, peak: bool = False) -> Tuple[int, List[float]]:
+        s = self.series.get(name)
+        if s is None:
+            return 1, []
+        with self._lock:
+            return s.window(seconds, peak=peak)
+
+    def rows(self, seconds: float, names: Optional[Iterable[str]] = None, now: Optional[float] = None):
+        names = list(names or self.series)
+        now = time.time() if now is None else now
+        with self._lock:
+            cols = [self.series[n] for n in names if n in self.series]
+            # every series shares the same levels, so rows line up
+            step = cols[0].level_for(seconds).step if cols else 1
+            last = int(now) // step
+            first = last - max(1, int(math.ceil(seconds / step))) + 1
+            data = [s.level_for(seconds).read(first, last) for s in cols]
+        header = ["time"]
+        for s in cols:
+            label = f"{s.name} ({s.unit})" if s.unit else s.name
+            header += [label] if step == 1 else [label, f"{label} max"]
+        rows = []
+        for i in range(last - first + 1 if data else 0):
+            vals = []
+            for col in data:
+                m, p = col[i]
+                vals += [m] if step == 1 else [m, p]
+            if all(v != v for v in vals):
+                continue
+            ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime((first + i) * step))
+            rows.append([ts] + ["" if v != v else round(v, 3) for v in vals])
+        return header, rows
+
+    def export_csv(self, path: str, seconds: float = 3600.0, names: Optional[Iterable[str]] = None) -> int:
+        header, rows = self.rows(seconds, names)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(header)
+            w.writerows(rows)
+        return len(rows)
+
+class HistogramDelta:
+    # turns cumulative PipelineStats histograms into per-interval percentiles
+    def __init__(self):
+        self._prev: Dict[str, list] = {}
+
+    def sample(self, raw: Dict[str, list], q: float = 0.95) -> Dict[str, float]:
+        out = {}
+        for stage, (counts, n, total, peak) in raw.items():
+            prev = self._prev.get(stage)
+            self._prev[stage] = [list(counts), n, total, peak]
+            if prev is None or n < prev[1]:
+                continue
+            h = LatencyHistogram()
+            h.load_raw([[a - b for a, b in zip(counts, prev[0])], n - prev[1], total - prev[2], peak])
+            if h.n:
+                out[stage] = h.percentile(q)
+        return out
@@ -0,0 +1,273 @@
+// Motion accumulator, playout ring and compact token decoder used by ControlMouse.ino.
+// Plain C with no Arduino dependencies, so it builds and runs the same on the host.
+#ifndef MOTION_CORE_H
+#define MOTION_CORE_H
+
+#include <stdint.h>
+
+// pending motion saturates here; matches COMPACT_LIMIT in serial_codec.py
+#define MOTION_LIMIT 32767L
+// per-axis limit of one HID report: the stock 8-bit mouse, or the 16-bit descriptor
+#define MOTION_STEP 127
+#define MOTION_STEP_WIDE MOTION_LIMIT
+
+typedef struct {
+  int32_t dx;
+  int32_t dy;
+  uint32_t moves;    // deltas folded in
+  uint32_t reports;  // reports taken out
+  uint32_t clipped;  // adds that hit MOTION_LIMIT
+} MotionAcc;
+
+static inline void motionInit(MotionAcc *m) {
+  m->dx = m->dy = 0;
+  m->moves = m->reports = m->clipped = 0;
+}
+
+static inline int32_t motionClamp(int32_t v, int32_t lim) {
+  return v > lim ? lim : (v < -lim ? -lim : v);
+}
+
+// d * run without 64-bit math; anything past 4 * MOTION_LIMIT clamps the same way
+static inline int32_t motionScale(int32_t d, uint32_t run) {
+  uint32_t mag = d < 0 ? (uint32_t)0 - (uint32_t)d : (uint32_t)d;
+  if (mag > (uint32_t)(4 * MOTION_LIMIT) || (mag && run > (uint32_t)(4 * MOTION_LIMIT) / mag)) {
+    return d < 0 ? -4 * MOTION_LIMIT : 4 * MOTION_LIMIT;
+  }
+  return d * (int32_t)run;
+}
+
+// folds in motion that is already scaled; motionAdd also counts the deltas
+static inline void motionMerge(MotionAcc *m, int32_t sx, int32_t sy) {
+  int32_t x = m->dx + sx;
+  int32_t y = m->dy + sy;
+  m->dx = motionClamp(x, MOTION_LIMIT);
+  m->dy = motionClamp(y, MOTION_LIMIT);
+  if (m->dx != x || m->dy != y) m->clipped++;
+}
+
+static inline void motionAdd(MotionAcc *m, int32_t dx, int32_t dy, uint32_t run) {
+  motionMerge(m, motionScale(dx, run), motionScale(dy, run));
+  m->moves += run;
+}
+
+static inline uint8_t motionPending(const MotionAcc *m) {
+  return m->dx != 0 || m->dy != 0;
+}
+
+// next report of at most step per axis; 0 when nothing is pending
+static inline uint8_t motionTake(MotionAcc *m, int16_t step, int16_t *sx, int16_t *sy) {
+  if (!motionPending(m)) return 0;
+  *sx = (int16_t)motionClamp(m->dx, step);
+  *sy = (int16_t)motionClamp(m->dy, step);
+  m->dx -= *sx;
+  m->dy -= *sy;
+  m->reports++;
+  return 1;
+}
+
+// Playout: motion stamped with its source time (device microseconds) waits until
+// source + delay, so reports keep the source cadence instead of the serial jitter.
+#ifndef PLAYOUT_SLOTS
+#if defined(__AVR__)
+#define PLAYOUT_SLOTS 16
+#else
+#define PLAYOUT_SLOTS 64
+#endif
+#endif
+
+// RFC 3550 interarrival jitter of a transit time, kept in 1/16 us
+typedef struct {
+  uint32_t last;
+  uint32_t jitter;
+  uint8_t primed;
+} Jitter;
+
+static inline void jitterAdd(Jitter *j, uint32_t transit) {
+  if (j->primed) {
+    int32_t d = (int32_t)(transit - j->last);
+    if (d < 0) d = -d;
+    j->jitter += (uint32_t)d - ((j->jitter + 8) >> 4);
+  }
+  j->last = transit;
+  j->primed = 1;
+}
+
+static inline uint32_t jitterUs(const Jitter *j) {
+  return j->jitter >> 4;
+}
+
+typedef struct {
+  uint32_t due;
+  int32_t dx;
+  int32_t dy;
+} PlayoutSlot;
+
+typedef struct {
+  PlayoutSlot slot[PLAYOUT_SLOTS];
+  uint8_t head;
+  uint8_t count;
+  uint32_t delay;     // 0 passes motion straight through
+  uint32_t late;      // stamped motion already past its due time on arrival
+  uint32_t overflow;  // slots released early because the ring was full
+  Jitter in;          // transit at arrival: the serial link's jitter
+  Jitter out;         // transit at release: what the reports see
+} Playout;
+
+static inline void playoutInit(Playout *p) {
+  p->head = p->count = 0;
+  p->delay = p->late = p->overflow = 0;
+  p->in.last = p->in.jitter = p->in.primed = 0;
+  p->out.last = p->out.jitter = p->out.primed = 0;
+}
+
+static inline PlayoutSlot *playoutTail(Playout *p) {
+  return &p->slot[(p->head + p->count - 1) % PLAYOUT_SLOTS];
+}
+
+static inline void playoutPop(Playout *p, MotionAcc *m) {
+  PlayoutSlot *s = &p->slot[p->head];
+  motionMerge(m, s->dx, s->dy);
+  p->head = (p->head + 1) % PLAYOUT_SLOTS;
+  p->count--;
+}
+
+static inline void playoutPush(Playout *p, MotionAcc *m, uint32_t due, int32_t x, int32_t y) {
+  if (p->count) {
+    PlayoutSlot *t = playoutTail(p);
+    // motion never overtakes what is already queued
+    if ((int32_t)(due - t->due) <= 0) {
+      t->dx = motionClamp(t->dx + x, 4 * MOTION_LIMIT);
+      t->dy = motionClamp(t->dy + y, 4 * MOTION_LIMIT);
+      return;
+    }
+  }
+  if (p->count == PLAYOUT_SLOTS) {
+    playoutPop(p, m);
+    p->overflow++;
+  }
+  p->count++;
+  PlayoutSlot *s = playoutTail(p);
+  s->due = due;
+  s->dx = x;
+  s->dy = y;
+}
+
+static inline void playoutRelease(Playout *p, MotionAcc *m, uint32_t now) {
+  while (p->count && (int32_t)(now - p->slot[p->head].due) >= 0) {
+    jitterAdd(&p->out, now - p->slot[p->head].due);
+    playoutPop(p, m);
+  }
+}
+
+static inline void playoutSetDelay(Playout *p, MotionAcc *m, uint32_t delay) {
+  while (p->count) playoutPop(p, m);
+  p->delay = delay;
+}
+
+// src is only meaningful when stamped; unstamped motion follows whatever is queued
+static inline void playoutAdd(Playout *p, MotionAcc *m, uint8_t stamped, uint32_t src, uint32_t now,
+                              int32_t dx, int32_t dy, uint32_t run) {
+  int32_t x = motionScale(dx, run);
+  int32_t y = motionScale(dy, run);
+  m->moves += run;
+  if (stamped) jitterAdd(&p->in, now - src);
+  if (!p->delay || (!stamped && !p->count)) {
+    if (stamped) jitterAdd(&p->out, now - src);
+    motionMerge(m, x, y);
+    return;
+  }
+  uint32_t due = stamped ? src + p->delay : playoutTail(p)->due;
+  if (stamped && (int32_t)(now - due) > 0) p->late++;
+  // a stamp from a bad clock estimate must not hold motion for longer than the delay
+  if (stamped && (int32_t)(due - now) > (int32_t)p->delay) due = now + p->delay;
+  playoutPush(p, m, due, x, y);
+  playoutRelease(p, m, now);
+}
+
+// Compact tokens (see serial_codec.py): a byte below SMALL_BASE^2 is one small move, a
+// header 0x81-0x87 announces zigzag varint fields (run, dx, dy), T_TIME one stamp field.
+#define COMPACT_SMALL 5
+#define COMPACT_SMALL_BASE (2 * COMPACT_SMALL + 1)
+#define COMPACT_F_X 0x01
+#define COMPACT_F_Y 0x02
+#define COMPACT_F_RUN 0x04
+#define COMPACT_F_TIME 0x08
+#define COMPACT_T_TIME 0x79
+#define COMPACT_MAX_VARINT 3
+
+#define COMPACT_NONE 0     // token still incomplete
+#define COMPACT_MOVE 1     // dx, dy repeated run times
+#define COMPACT_STAMP 2    // low bits of the next move's source time
+#define COMPACT_INVALID 3  // byte discarded
+
+typedef struct {
+  uint8_t flags;
+  uint8_t field;
+  uint8_t bytes;
+  uint32_t acc;
+  uint32_t fields[3];
+} CompactDec;
+
+typedef struct {
+  int32_t dx;
+  int32_t dy;
+  uint32_t run;
+  uint32_t stamp;
+} CompactToken;
+
+static inline void compactReset(CompactDec *d) {
+  d->flags = d->field = d->bytes = 0;
+  d->acc = 0;
+}
+
+static inline int32_t compactUnzigzag(uint32_t u) {
+  return (u & 1) ? -(int32_t)((u + 1) >> 1) : (int32_t)(u >> 1);
+}
+
+// one byte in; fills *t and returns COMPACT_MOVE or COMPACT_STAMP when a token completes
+static inline uint8_t compactFeed(CompactDec *d, uint8_t b, CompactToken *t) {
+  if (!d->flags) {
+    if (b < 0x80) {
+      if (b < COMPACT_SMALL_BASE * COMPACT_SMALL_BASE) {
+        t->dx = b / COMPACT_SMALL_BASE - COMPACT_SMALL;
+        t->dy = b % COMPACT_SMALL_BASE - COMPACT_SMALL;
+        t->run = 1;
+        return COMPACT_MOVE;
+      }
+      if (b != COMPACT_T_TIME) return COMPACT_INVALID;
+      d->flags = COMPACT_F_TIME;
+      return COMPACT_NONE;
+    }
+    if (b > 0x87 || !(b & (COMPACT_F_X | COMPACT_F_Y))) return COMPACT_INVALID;
+    d->flags = b & 0x07;
+    return COMPACT_NONE;
+  }
+  d->acc |= (uint32_t)(b & 0x7F) << (7 * d->bytes);
+  if (b & 0x80) {
+    if (++d->bytes >= COMPACT_MAX_VARINT) {
+      compactReset(d);
+      return COMPACT_INVALID;
+    }
+    return COMPACT_NONE;
+  }
+  d->fields[d->field++] = d->acc;
+  d->acc = 0;
+  d->bytes = 0;
+  uint8_t need = ((d->flags & COMPACT_F_X) != 0) + ((d->flags & COMPACT_F_Y) != 0) +
+                 ((d->flags & COMPACT_F_RUN) != 0) + ((d->flags & COMPACT_F_TIME) != 0);
+  if (d->field < need) return COMPACT_NONE;
+  uint8_t flags = d->flags;
+  compactReset(d);
+  if (flags & COMPACT_F_TIME) {
+    t->stamp = d->fields[0];
+    return COMPACT_STAMP;
+  }
+  uint8_t i = 0;
+  t->run = (flags & COMPACT_F_RUN) ? d->fields[i++] + 2 : 1;
+  t->dx = (flags & COMPACT_F_X) ? compactUnzigzag(d->fields[i++]) : 0;
+  t->dy = (flags & COMPACT_F_Y) ? compactUnzigzag(d->fields[i++]) : 0;
+  return COMPACT_MOVE;
+}
+
+#endif
@@ -0,0 +1,121 @@
+from typing import List, Optional, Tuple
+
+# mirrors motion_core.h; FirmwareModel uses it and tests/test_motion_core.py compiles the C core against it
+MOTION_LIMIT = 32767
+MOTION_STEP = 127
+MOTION_STEP_WIDE = MOTION_LIMIT
+PLAYOUT_SLOTS = 64
+_U32 = 0xFFFFFFFF
+
+def _clamp(v: int, lim: int) -> int:
+    return lim if v > lim else (-lim if v < -lim else v)
+
+def _scale(d: int, run: int) -> int:
+    return _clamp(d * run, 4 * MOTION_LIMIT)
+
+def _s32(v: int) -> int:
+    v &= _U32
+    return v - (1 << 32) if v & 0x80000000 else v
+
+class MotionAccumulator:
+    def __init__(self):
+        self.dx = self.dy = 0
+        self.moves = self.reports = self.clipped = 0
+
+    def merge(self, sx: int, sy: int):
+        x = self.dx + sx
+        y = self.dy + sy
+        self.dx = _clamp(x, MOTION_LIMIT)
+        self.dy = _clamp(y, MOTION_LIMIT)
+        if self.dx != x or self.dy != y:
+            self.clipped += 1
+
+    def add(self, dx: int, dy: int, run: int = 1):
+        self.merge(_scale(dx, run), _scale(dy, run))
+        self.moves = (self.moves + run) & _U32
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.dx or self.dy)
+
+    def take(self, step: int = MOTION_STEP) -> Optional[Tuple[int, int]]:
+        if not self.pending:
+            return None
+        sx, sy = _clamp(self.dx, step), _clamp(self.dy, step)
+        self.dx -= sx
+        self.dy -= sy
+        self.reports += 1
+        return sx, sy
+
+    def counters(self) -> Tuple[int, int, int]:
+        return self.moves, self.reports, self.clipped
+
+class Jitter:
+    # RFC 3550 interarrival jitter in 1/16 us, as jitterAdd
+    def __init__(self):
+        self.last = self.jitter = 0
+        self.primed = False
+
+    def add(self, transit: int):
+        transit &= _U32
+        if self.primed:
+            d = abs(_s32(transit - self.last))
+            self.jitter = (self.jitter + d - ((self.jitter + 8) >> 4)) & _U32
+        self.last = transit
+        self.primed = True
+
+    @property
+    def us(self) -> int:
+        return self.jitter >> 4
+
+class Playout:
+    def __init__(self, slots: int = PLAYOUT_SLOTS):
+        self.slots = slots
+        self.queue: List[List[int]] = []
+        self.delay = self.late = self.overflow = 0
+        self.jitter_in = Jitter()
+        self.jitter_out = Jitter()
+
+    def _pop(self, m: MotionAccumulator):
+        _due, x, y = self.queue.pop(0)
+        m.merge(x, y)
+
+    def _push(self, m: MotionAccumulator, due: int, x: int, y: int):
+        if self.queue:
+            tail = self.queue[-1]
+            if _s32(due - tail[0]) <= 0:
+                tail[1] = _clamp(tail[1] + x, 4 * MOTION_LIMIT)
+                tail[2] = _clamp(tail[2] + y, 4 * MOTION_LIMIT)
+                return
+        if len(self.queue) == self.slots:
+            self._pop(m)
+            self.overflow += 1
+        self.queue.append([due & _U32, x, y])
+
+    def release(self, m: MotionAccumulator, now: int):
+        while self.queue and _s32(now - self.queue[0][0]) >= 0:
+            self.jitter_out.add(now - self.queue[0][0])
+            self._pop(m)
+
+    def set_delay(self, m: MotionAccumulator, delay: int):
+        while self.queue:
+            self._pop(m)
+        self.delay = delay
+
+    def add(self, m: MotionAccumulator, stamp: Optional[int], now: int, dx: int, dy: int, run: int = 1):
+        x, y = _scale(dx, run), _scale(dy, run)
+        m.moves = (m.moves + run) & _U32
+        if stamp is not None:
+            self.jitter_in.add(now - stamp)
+        if not self.delay or (stamp is None and not self.queue):
+            if stamp is not None:
+                self.jitter_out.add(now - stamp)
+            m.merge(x, y)
+            return
+        due = (stamp + self.delay) & _U32 if stamp is not None else self.queue[-1][0]
+        if stamp is not None and _s32(now - due) > 0:
+            self.late += 1
+        if stamp is not None and _s32(due - now) > self.delay:
+            due = (now + self.delay) & _U32
+        self._push(m, due, x, y)
+        self.release(m, now)
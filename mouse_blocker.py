@@ -1,7 +1,8 @@
 import ctypes
 from ctypes import wintypes
-from PySide6 import QtCore
 from auth_guard import require_auth
+from flight_recorder import RECORDER
+from input_sources import parse_raw_mouse
 
 user32 = ctypes.WinDLL("user32", use_last_error=True)
 WM_INPUT = 0x00FF
@@ -216,57 +217,108 @@ class EscapeListener:
             self._hook = None
             self._proc = None
 
-class RawInputFilter(QtCore.QAbstractNativeEventFilter):
-    def __init__(self, hwnd: int, on_delta):
-        super().__init__()
-        self.hwnd = hwnd
-        self.on_delta = on_delta
-        self._registered = False
-        self.register()
+def register_raw_mouse(hwnd: int) -> bool:
+    try:
+        require_auth()
+    except Exception:
+        return False
+    rid = RAWINPUTDEVICE()
+    rid.usUsagePage = 0x01
+    rid.usUsage = 0x02
+    rid.dwFlags = RIDEV_INPUTSINK
+    rid.hwndTarget = wintypes.HWND(hwnd)
+    return bool(RegisterRawInputDevices(ctypes.byref(rid), 1, ctypes.sizeof(RAWINPUTDEVICE)))
+
+def read_raw_mouse(lparam):
+    size = UINT(0)
+    GetRawInputData(lparam, RID_INPUT, None, ctypes.byref(size), ctypes.sizeof(RAWINPUTHEADER))
+    if size.value == 0:
+        return None
+    buf = ctypes.create_string_buffer(size.value)
+    got = GetRawInputData(lparam, RID_INPUT, buf, ctypes.byref(size), ctypes.sizeof(RAWINPUTHEADER))
+    if got == 0 or got == 0xFFFFFFFF:
+        return None
+    delta = parse_raw_mouse(buf)
+    if delta is not None:
+        RECORDER.mark("input.raw", delta)
+    return delta
 
-    def register(self):
-        if self._registered:
-            return
-        try:
-            require_auth()
-        except Exception:
-            return
-        rid = RAWINPUTDEVICE()
-        rid.usUsagePage = 0x01
-        rid.usUsage = 0x02
-        rid.dwFlags = RIDEV_INPUTSINK
-        rid.hwndTarget = wintypes.HWND(self.hwnd)
-        ok = RegisterRawInputDevices(ctypes.byref(rid), 1, ctypes.sizeof(RAWINPUTDEVICE))
-        self._registered = bool(ok)
-
-    def nativeEventFilter(self, eventType, message):
-        if eventType != b'windows_generic_MSG':
-            return False, 0
-        try:
-            addr = int(message)
-        except TypeError:
-            addr = message.__int__()
+WNDPROC = ctypes.WINFUNCTYPE(LRESULT, wintypes.HWND, UINT, WPARAM, LPARAM)
 
-        pmsg = ctypes.cast(ctypes.c_void_p(addr), ctypes.POINTER(wintypes.MSG))
-        msg = pmsg.contents
+class WNDCLASSW(ctypes.Structure):
+    _fields_ = [
+        ("style", UINT),
+        ("lpfnWndProc", WNDPROC),
+        ("cbClsExtra", ctypes.c_int),
+        ("cbWndExtra", ctypes.c_int),
+        ("hInstance", wintypes.HINSTANCE),
+        ("hIcon", wintypes.HICON),
+        ("hCursor", wintypes.HANDLE),
+        ("hbrBackground", wintypes.HBRUSH),
+        ("lpszMenuName", wintypes.LPCWSTR),
+        ("lpszClassName", wintypes.LPCWSTR),
+    ]
 
-        if msg.message == WM_INPUT:
-            self._handle_wm_input(msg.lParam)
-        return False, 0
+HWND_MESSAGE = -3
+WM_QUIT = 0x0012
+DefWindowProc = user32.DefWindowProcW
+DefWindowProc.restype = LRESULT
+DefWindowProc.argtypes = [wintypes.HWND, UINT, WPARAM, LPARAM]
+CreateWindowEx = user32.CreateWindowExW
+CreateWindowEx.restype = wintypes.HWND
+CreateWindowEx.argtypes = [wintypes.DWORD, wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.DWORD, ctypes.c_int,
+                           ctypes.c_int, ctypes.c_int, ctypes.c_int, wintypes.HWND, wintypes.HMENU,
+                           wintypes.HINSTANCE, wintypes.LPVOID]
+GetMessage = user32.GetMessageW
+GetMessage.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, UINT, UINT]
+DispatchMessage = user32.DispatchMessageW
+DispatchMessage.argtypes = [ctypes.POINTER(wintypes.MSG)]
+PostThreadMessage = user32.PostThreadMessageW
+PostThreadMessage.argtypes = [wintypes.DWORD, UINT, WPARAM, LPARAM]
+SetTimer = user32.SetTimer
+SetTimer.restype = ctypes.c_size_t
+SetTimer.argtypes = [wintypes.HWND, ctypes.c_size_t, UINT, ctypes.c_void_p]
+
+class RawInputWindow:
+    # message-only window pumping WM_INPUT and the low-level hooks without Qt
+    def __init__(self, on_delta, hooks=()):
+        self.on_delta = on_delta
+        self.hooks = list(hooks)
+        self._thread_id = 0
+        self._proc = WNDPROC(lambda hwnd, msg, wp, lp: DefWindowProc(hwnd, msg, wp, lp))
+
+    def run(self):
+        kernel32 = ctypes.windll.kernel32
+        self._thread_id = kernel32.GetCurrentThreadId()
+        hinst = kernel32.GetModuleHandleW(None)
+        wc = WNDCLASSW()
+        wc.lpfnWndProc = self._proc
+        wc.hInstance = hinst
+        wc.lpszClassName = "MouseForwarderRawInput"
+        user32.RegisterClassW(ctypes.byref(wc))
+        hwnd = CreateWindowEx(0, wc.lpszClassName, "", 0, 0, 0, 0, 0, wintypes.HWND(HWND_MESSAGE), None, hinst, None)
+        if not hwnd:
+            err = ctypes.get_last_error()
+            raise OSError(err, ctypes.FormatError(err))
+        try:
+            if not register_raw_mouse(hwnd):
+                raise OSError("RegisterRawInputDevices failed")
+            for h in self.hooks:
+                h.start()
+            # a thread timer wakes GetMessage so Ctrl+C is noticed
+            SetTimer(None, 0, 200, None)
+            msg = wintypes.MSG()
+            while GetMessage(ctypes.byref(msg), None, 0, 0) > 0:
+                if msg.message == WM_INPUT:
+                    delta = read_raw_mouse(msg.lParam)
+                    if delta is not None:
+                        self.on_delta(*delta)
+                DispatchMessage(ctypes.byref(msg))
+        finally:
+            for h in self.hooks:
+                h.stop()
+            user32.DestroyWindow(hwnd)
 
-    def _handle_wm_input(self, lparam):
-        size = UINT(0)
-        GetRawInputData(lparam, RID_INPUT, None, ctypes.byref(size), ctypes.sizeof(RAWINPUTHEADER))
-        if size.value == 0:
-            return
-        buf = ctypes.create_string_buffer(size.value)
-        got = GetRawInputData(lparam, RID_INPUT, buf, ctypes.byref(size), ctypes.sizeof(RAWINPUTHEADER))
-        if got == 0 or got == 0xFFFFFFFF:
-            return
-        ri = RAWINPUT.from_buffer_copy(buf)
-        if ri.header.dwType != RIM_TYPEMOUSE:
-            return
-        dx = int(ri.data.mouse.lLastX)
-        dy = int(ri.data.mouse.lLastY)
-        if dx or dy:
-            self.on_delta(dx, dy)
+    def stop(self):
+        if self._thread_id:
+            PostThreadMessage(self._thread_id, WM_QUIT, 0, 0)
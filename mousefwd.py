@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+T_START = time.perf_counter()
+
+from auth_guard import authenticate_user, set_session_token
+from constants import SERIAL_BOOT_BAUD, SERIAL_ENCODING, SERIAL_PLAYOUT_MS, SERIAL_STALE_MS, SERIAL_STALE_POLICY
+from flight_recorder import RECORDER
+from forward_core import Forwarder, build_transforms
+from input_sources import EvdevSource, RawInputSource, SyntheticSource, default_source_kind
+from serial_link import SerialLink
+
+BUTTONS = ("left", "right", "middle", "back", "forward", "wheel")
+
+def _emulated_factory():
+    from serial_emulator import EmulatedSerial
+    dev = EmulatedSerial()
+
+    def factory(port, baudrate, timeout, write_timeout):
+        dev.baudrate = baudrate
+        dev.timeout = timeout
+        return dev
+    return factory
+
+def _make_source(kind: str, forwarder: Forwarder, args, stop: threading.Event):
+    if kind == "synthetic":
+        return SyntheticSource(forwarder.feed, rate_hz=args.rate)
+    if kind.startswith("evdev"):
+        path = kind.split(":", 1)[1] if ":" in kind else None
+        return EvdevSource(forwarder.feed, path, grab=args.grab)
+    if kind == "raw":
+        hooks = []
+        if not args.no_block:
+            from mouse_blocker import MouseBlocker, EscapeListener
+            blocker = MouseBlocker()
+            blocker.set_blocked({b for b in args.block_buttons.split(",") if b in BUTTONS})
+            hooks = [blocker, EscapeListener(stop.set)]
+        return RawInputSource(forwarder.feed, hooks)
+    raise SystemExit(f"unknown source {kind!r}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Forward mouse motion to the Arduino without the GUI.")
+    ap.add_argument("--port", help="serial port, e.g. COM5 or /dev/ttyACM0")
+    ap.add_argument("--emulate", action="store_true", help="use the emulated firmware instead of a port")
+    ap.add_argument("--baud", type=int, default=0, help="switch to this baud rate after connecting")
+    ap.add_argument("--encoding", choices=("auto", "legacy", "compact"), default=SERIAL_ENCODING)
+    ap.add_argument("--playout-ms", type=float, default=SERIAL_PLAYOUT_MS,
+                    help="firmware replays motion on the source cadence this long after it happened (compact only)")
+    ap.add_argument("--max-latency-ms", type=float, default=SERIAL_STALE_MS,
+                    help="queued motion older than this is merged or dropped instead of replayed, 0 replays all")
+    ap.add_argument("--stale", choices=("merge", "drop"), default=SERIAL_STALE_POLICY,
+                    help="what happens to motion over --max-latency-ms")
+    ap.add_argument("--source", default=default_source_kind(),
+                    help="raw (Windows), evdev[:/dev/input/eventN] (Linux) or synthetic")
+    ap.add_argument("--rate", type=float, default=1000.0, help="synthetic source report rate")
+    ap.add_argument("--scale", type=float, default=1.0)
+    ap.add_argument("--invert-x", action="store_true")
+    ap.add_argument("--invert-y", action="store_true")
+    ap.add_argument("--grab", action="store_true", help="evdev: take the device away from the local desktop")
+    ap.add_argument("--no-block", action="store_true", help="raw: leave the local cursor and buttons alone")
+    ap.add_argument("--block-buttons", default="", help="raw: comma list of " + ",".join(BUTTONS))
+    ap.add_argument("--user", default=os.getenv("MF_USER", ""))
+    ap.add_argument("--password", default=os.getenv("MF_PASSWORD", ""))
+    ap.add_argument("--seconds", type=float, default=0.0, help="stop after this long, 0 runs until Escape/Ctrl+C")
+    ap.add_argument("--stats", action="store_true", help="print link stats every second")
+    ap.add_argument("--trace", metavar="PATH", help="write the flight recorder as a Chrome trace on exit")
+    args = ap.parse_args(argv)
+    if not args.port and not args.emulate:
+        ap.error("--port or --emulate is required")
+
+    ok, _token = authenticate_user(args.user, args.password)
+    if not ok:
+        print("authentication failed (set --user/--password or MF_USER/MF_PASSWORD)", file=sys.stderr)
+        return 2
+    set_session_token(args.user, args.password)
+
+    RECORDER.name_thread("main")
+    link = SerialLink(_emulated_factory() if args.emulate else None)
+    link.set_staleness(args.max_latency_ms, args.stale)
+    if args.stats:
+        link.on_link_stats = lambda s: print(json.dumps(s), file=sys.stderr)
+    port = args.port or "emulated"
+    if not link.open(port, SERIAL_BOOT_BAUD, args.baud or None, args.encoding, args.playout_ms):
+        print(f"could not open {port}", file=sys.stderr)
+        return 1
+    forwarder = Forwarder(link, build_transforms(args.scale, args.invert_x, args.invert_y))
+    stop = threading.Event()
+    source = _make_source(args.source, forwarder, args, stop)
+    try:
+        source.start()
+    except OSError as e:
+        link.close()
+        print(f"input source failed: {e}", file=sys.stderr)
+        return 1
+    forwarder.set_forwarding(True)
+    try:
+        print(f"forwarding {args.source} -> {port} @ {link.baud:,} ({link.encoding}"
+              f"{', credits' if link.credits else ''}{', 16-bit' if link.report_step > 127 else ''}"
+              f"{f', playout {link.playout_us / 1000:g} ms' if link.playout_us else ''}), "
+              f"ready in {(time.perf_counter() - T_START) * 1000:.0f} ms",
+              file=sys.stderr)
+        if args.stats and link.caps is not None:
+            print(json.dumps({"firmware": link.caps.to_dict()}), file=sys.stderr)
+        deadline = time.monotonic() + args.seconds if args.seconds > 0 else None
+        while not stop.wait(0.2):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if not link.ser or getattr(source, "error", None) is not None:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        summary = forwarder.stats()
+        forwarder.set_forwarding(False)
+        source.stop()
+        link.close()
+        if args.trace:
+            RECORDER.dump(args.trace)
+    err = getattr(source, "error", None)
+    if err is not None:
+        print(f"input source failed: {err}", file=sys.stderr)
+        return 1
+    print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import platform
+import select
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from auth_guard import set_session_token
+from constants import BENCH_BASELINE, BENCH_REGRESSION_PCT, SERIAL_BOOT_BAUD
+from flight_recorder import RECORDER
+
+class Skip(Exception):
+    pass
+
+CASES: Dict[str, Callable[[float], Tuple[float, str]]] = {}
+
+def case(name: str):
+    def deco(fn):
+        CASES[name] = fn
+        return fn
+    return deco
+
+def higher_is_better(unit: str) -> bool:
+    return unit.endswith("/s")
+
+def _per_op(op: Callable[[], object], seconds: float, batch: int = 1000, reset: Optional[Callable[[], None]] = None) -> float:
+    # ns per call; reset runs between batches, outside the timed region
+    total = 0
+    ops = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or not ops:
+        if reset is not None:
+            reset()
+        t0 = time.perf_counter_ns()
+        for _ in range(batch):
+            op()
+        total += time.perf_counter_ns() - t0
+        ops += batch
+    return total / ops
+
+@case("serial.enqueue")
+def bench_enqueue(seconds: float):
+    # the Qt-free link behind SerialSender.send_delta, so headless installs can run it
+    from serial_link import SerialLink
+    link = SerialLink()
+    # connected as far as send_delta is concerned, but with no writer draining the queue
+    link.ser, link._running = True, True
+    q = link._q
+
+    def reset():
+        with q.mutex:
+            q.queue.clear()
+    try:
+        return _per_op(lambda: link.send_delta(3, -2), seconds, batch=4000, reset=reset), "ns/op"
+    finally:
+        link.ser, link._running = None, False
+
+def _pty_drain(seconds: float, firmware: bool, encoding: str):
+    if not hasattr(os, "openpty"):
+        raise Skip("needs a pty")
+    from serial_emulator import FirmwareModel
+    from serial_link import SerialLink
+    master, slave = os.openpty()
+    path = os.ttyname(slave)
+    # without firmware nothing answers, so the writer falls back to OS buffer pacing
+    fw = FirmwareModel(report_s=0.0) if firmware else FirmwareModel(rx_buffer=0xFFFF, report_s=0.0)
+    stop = threading.Event()
+
+    def pump():
+        while not stop.is_set():
+            r, _, _ = select.select([master], [], [], 0.001)
+            now = time.perf_counter()
+            if r:
+                try:
+                    fw.feed(os.read(master, 4096), now)
+                except OSError:
+                    return
+            fw.tick(now)
+            out = fw.take_output()
+            if firmware:
+                for data, _baud in out:
+                    os.write(master, data)
+    t = threading.Thread(target=pump, daemon=True)
+    t.start()
+    link = SerialLink()
+    try:
+        if not link.open(path, SERIAL_BOOT_BAUD, None, encoding):
+            raise Skip(f"could not open {path}")
+        sent = 0
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            if link._q.qsize() < 3000:
+                for _ in range(256):
+                    link.send_delta(1, 0)
+                sent += 256
+            else:
+                time.sleep(0)
+        want = sent - link.dropped
+        got = 0
+        seen = 0
+        deadline = time.perf_counter() + 5.0
+        while got < want and time.perf_counter() < deadline:
+            moves = fw.moves
+            n = len(moves)
+            got += sum(dx for dx, _dy in moves[seen:n])
+            seen = n
+            time.sleep(0.0005)
+        elapsed = time.perf_counter() - t0
+        if got < want:
+            raise Skip(f"only {got}/{want} deltas arrived")
+        return got / elapsed, "deltas/s"
+    finally:
+        link.close()
+        stop.set()
+        t.join(1.0)
+        os.close(master)
+        os.close(slave)
+
+@case("serial.drain.pty")
+def bench_drain(seconds: float):
+    return _pty_drain(seconds, False, "legacy")
+
+@case("serial.drain.pty.credits")
+def bench_drain_credits(seconds: float):
+    return _pty_drain(seconds, True, "compact")
+
+@case("rawinput.parse")
+def bench_rawinput(seconds: float):
+    import ctypes
+    import random
+    from input_sources import _RAW_HEADER, parse_raw_mouse
+    rnd = random.Random(1)
+    bufs = []
+    for _ in range(256):
+        raw = bytearray(_RAW_HEADER + 24)
+        struct.pack_into("<II", raw, 0, 0, len(raw))
+        struct.pack_into("<ii", raw, _RAW_HEADER + 12, rnd.randint(-40, 40), rnd.randint(-40, 40))
+        bufs.append(ctypes.create_string_buffer(bytes(raw), len(raw)))
+    state = {"i": 0}
+
+    def op():
+        i = state["i"] = (state["i"] + 1) & 255
+        parse_raw_mouse(bufs[i])
+    return _per_op(op, seconds), "ns/op"
+
+def _video_frame(width: int = 1280, height: int = 720):
+    try:
+        import numpy as np
+        from av import VideoFrame
+    except ImportError:
+        raise Skip("needs numpy and av")
+    rgb = (np.arange(width * height * 3, dtype=np.uint32) % 251).astype(np.uint8).reshape(height, width, 3)
+    return VideoFrame.from_ndarray(rgb, format="rgb24").reformat(format="yuv420p")
+
+@case("video.convert.720p")
+def bench_convert(seconds: float):
+    frame = _video_frame()
+    return _per_op(lambda: frame.to_ndarray(format="rgb24"), seconds, batch=10) / 1000.0, "us/op"
+
+@case("video.crop.720p")
+def bench_crop(seconds: float):
+    from whip_ingest import crop_frame
+    arr = _video_frame().to_ndarray(format="rgb24")
+    return _per_op(lambda: crop_frame(arr, 0, 0, 320, 320, True), seconds, batch=100) / 1000.0, "us/op"
+
+@case("video.qimage.720p")
+def bench_qimage(seconds: float):
+    try:
+        from whip_server import frame_to_qimage
+    except ImportError:
+        raise Skip("needs PySide6")
+    arr = _video_frame().to_ndarray(format="rgb24")
+    return _per_op(lambda: frame_to_qimage(arr), seconds, batch=10) / 1000.0, "us/op"
+
+@case("config.save")
+def bench_config_save(seconds: float):
+    import app_config
+    cfg = {
+        "board": "Arduino Due",
+        "blocked_buttons": ["left", "right"],
+        "serial_encoding": "compact",
+        "serial_baud": {f"Arduino Due|COM{i}": 1000000 for i in range(8)},
+        "whip_policy": {"codecs": ["H264", "VP8"], "max_width": 1920, "max_height": 1080, "max_fps": 60, "strict": False},
+        "whip_synthetic": {"enabled": False, "width": 1280, "height": 720, "fps": 60, "pix_fmt": "yuv420p", "pattern": "bars"},
+        "whip_feedback": {"max_kbps": 0, "adaptive": True},
+        "whip_max_sessions": 4,
+        "whip_idle_timeout": 30,
+    }
+    old = os.environ.get("APPDATA")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["APPDATA"] = tmp
+        try:
+            return _per_op(lambda: app_config.save_config(cfg), seconds, batch=50) / 1000.0, "us/op"
+        finally:
+            if old is None:
+                os.environ.pop("APPDATA", None)
+            else:
+                os.environ["APPDATA"] = old
+
+@case("recorder.mark")
+def bench_mark(seconds: float):
+    return _per_op(lambda: RECORDER.mark("bench", None), seconds), "ns/op"
+
+def _meta() -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except Exception:
+        rev = ""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": rev,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+def run(names, seconds: float = 0.3, repeat: int = 3, log=None) -> dict:
+    set_session_token("bench", "bench")
+    results = {}
+    for name in names:
+        runs = []
+        unit = ""
+        try:
+            for _ in range(repeat):
+                value, unit = CASES[name](seconds)
+                runs.append(value)
+        except Skip as e:
+            results[name] = {"skipped": str(e)}
+            if log:
+                log(f"{name:<28} skipped: {e}")
+            continue
+        value = statistics.median(runs)
+        results[name] = {"value": round(value, 3), "unit": unit, "runs": [round(v, 3) for v in runs]}
+        if log:
+            spread = (max(runs) - min(runs)) / value * 100.0 if value else 0.0
+            log(f"{name:<28} {value:>14,.1f} {unit:<9} ±{spread / 2:.1f}%")
+    return {"meta": _meta(), "results": results}
+
+def compare(base: dict, new: dict, threshold: float = BENCH_REGRESSION_PCT):
+    # [(name, base, new, unit, change %, verdict)]; verdict is "regression", "improved" or "ok"
+    rows = []
+    for name, b in base.get("results", {}).items():
+        n = new.get("results", {}).get(name)
+        if not n or "value" not in b or "value" not in n or not b["value"]:
+            continue
+        change = (n["value"] - b["value"]) / b["value"] * 100.0
+        gain = change if higher_is_better(n["unit"]) else -change
+        verdict = "regression" if gain < -threshold else ("improved" if gain > threshold else "ok")
+        rows.append((name, b["value"], n["value"], n["unit"], change, verdict))
+    return rows
+
+def _select(patterns) -> list:
+    if not patterns:
+        return list(CASES)
+    return [n for n in CASES if any(p in n for p in patterns)]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Micro-benchmarks for the forwarding and video hot paths.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    r = sub.add_parser("run")
+    c = sub.add_parser("compare", help="compare a baseline against a saved run, or against a fresh run")
+    c.add_argument("baseline", nargs="?", default=BENCH_BASELINE)
+    c.add_argument("current", nargs="?", help="saved run to compare; omitted runs the suite now")
+    c.add_argument("--threshold", type=float, default=BENCH_REGRESSION_PCT, help="percent change that counts")
+    for p in (r, c):
+        p.add_argument("-k", dest="only", action="append", help="only cases whose name contains this, repeatable")
+        p.add_argument("--seconds", type=float, default=0.3, help="time per repeat")
+        p.add_argument("--repeat", type=int, default=3)
+    r.add_argument("--save", nargs="?", const=BENCH_BASELINE, metavar="PATH", help=f"write JSON (default {BENCH_BASELINE})")
+    r.add_argument("--json", action="store_true", help="print the raw JSON report")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "list":
+        for name in CASES:
+            print(name)
+        return 0
+    log = lambda line: print(line, file=sys.stderr)
+    if args.cmd == "run":
+        report = run(_select(args.only), args.seconds, args.repeat, log)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            log(f"saved {args.save}")
+        if args.json:
+            print(json.dumps(report, indent=2))
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    if args.current:
+        with open(args.current, "r", encoding="utf-8") as f:
+            new = json.load(f)
+    else:
+        names = [n for n in _select(args.only) if n in base.get("results", {})]
+        new = run(names, args.seconds, args.repeat, log)
+    rows = compare(base, new, args.threshold)
+    print(f"baseline {base['meta'].get('commit') or '?'} {base['meta'].get('time')}  vs  "
+          f"{new['meta'].get('commit') or '?'} {new['meta'].get('time')}  (threshold {args.threshold:g}%)")
+    for name, b, n, unit, change, verdict in rows:
+        flag = {"regression": "  REGRESSION", "improved": "  improved"}.get(verdict, "")
+        print(f"  {name:<28} {b:>14,.1f} -> {n:>14,.1f} {unit:<9} {change:+7.1f}%{flag}")
+    return 1 if any(row[5] == "regression" for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
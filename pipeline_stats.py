@@ -0,0 +1,127 @@
+import bisect
+import threading
+from typing import Dict, List, Optional
+
+STAGES = ("receive", "decode", "convert", "crop", "handoff", "paint", "total")
+
+_BUCKET_EDGES_MS = [0.05 * (1.25 ** i) for i in range(48)]
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_EDGES_MS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms: float):
+        if ms < 0:
+            ms = 0.0
+        self.counts[bisect.bisect_left(_BUCKET_EDGES_MS, ms)] += 1
+        self.n += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q: float) -> float:
+        if not self.n:
+            return 0.0
+        target = q * self.n
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return min(_BUCKET_EDGES_MS[i], self.max) if i < len(_BUCKET_EDGES_MS) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.n,
+            "mean": round(self.total / self.n, 3) if self.n else 0.0,
+            "p50": round(self.percentile(0.5), 3),
+            "p95": round(self.percentile(0.95), 3),
+            "p99": round(self.percentile(0.99), 3),
+            "max": round(self.max, 3),
+        }
+
+    def raw(self) -> list:
+        return [list(self.counts), self.n, self.total, self.max]
+
+    def load_raw(self, raw: list):
+        counts, self.n, self.total, self.max = raw
+        self.counts = list(counts)
+
+    def buckets(self) -> List[list]:
+        out = []
+        for i, c in enumerate(self.counts):
+            if c:
+                le = _BUCKET_EDGES_MS[i] if i < len(_BUCKET_EDGES_MS) else None
+                out.append([round(le, 3) if le is not None else "inf", c])
+        return out
+
+class PipelineStats:
+    def __init__(self, stages=STAGES):
+        self._lock = threading.Lock()
+        self._stages = tuple(stages)
+        self._hists: Dict[str, LatencyHistogram] = {s: LatencyHistogram() for s in self._stages}
+
+    def record(self, stage: str, ms: float):
+        h = self._hists.get(stage)
+        if h is None:
+            return
+        with self._lock:
+            h.add(ms)
+
+    def reset(self):
+        with self._lock:
+            self._hists = {s: LatencyHistogram() for s in self._stages}
+
+    def export_raw(self, stages=None) -> dict:
+        with self._lock:
+            return {s: h.raw() for s, h in self._hists.items() if stages is None or s in stages}
+
+    def load_raw(self, raw: dict):
+        with self._lock:
+            for s, r in raw.items():
+                h = self._hists.get(s)
+                if h is not None:
+                    h.load_raw(r)
+
+    def summary(self, with_buckets: bool = False) -> dict:
+        with self._lock:
+            out = {}
+            for s, h in self._hists.items():
+                d = h.summary()
+                if with_buckets:
+                    d["buckets"] = h.buckets()
+                out[s] = d
+            return out
+
+class MediaClock:
+    def __init__(self):
+        self._base: Optional[float] = None
+
+    def delay_ms(self, pts, time_base, now: float) -> Optional[float]:
+        if pts is None or time_base is None:
+            return None
+        try:
+            media_t = float(pts * time_base)
+        except Exception:
+            return None
+        offset = now - media_t
+        if self._base is None or offset < self._base:
+            self._base = offset
+        return (offset - self._base) * 1000.0
+
+    def reset(self):
+        self._base = None
+
+def format_summary(summary: dict, stages=STAGES) -> str:
+    parts = []
+    for s in stages:
+        d = summary.get(s)
+        if not d or not d["count"]:
+            continue
+        parts.append(f"{s} {d['p50']:.1f}/{d['p95']:.1f}")
+    if not parts:
+        return ""
+    return "p50/p95 ms  |  " + "  ".join(parts)
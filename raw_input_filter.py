@@ -0,0 +1,34 @@
+import ctypes
+from ctypes import wintypes
+from PySide6 import QtCore
+from mouse_blocker import WM_INPUT, register_raw_mouse, read_raw_mouse
+
+class RawInputFilter(QtCore.QAbstractNativeEventFilter):
+    def __init__(self, hwnd: int, on_delta):
+        super().__init__()
+        self.hwnd = hwnd
+        self.on_delta = on_delta
+        self._registered = False
+        self.register()
+
+    def register(self):
+        if self._registered:
+            return
+        self._registered = register_raw_mouse(self.hwnd)
+
+    def nativeEventFilter(self, eventType, message):
+        if eventType != b'windows_generic_MSG':
+            return False, 0
+        try:
+            addr = int(message)
+        except TypeError:
+            addr = message.__int__()
+
+        pmsg = ctypes.cast(ctypes.c_void_p(addr), ctypes.POINTER(wintypes.MSG))
+        msg = pmsg.contents
+
+        if msg.message == WM_INPUT:
+            delta = read_raw_mouse(msg.lParam)
+            if delta is not None:
+                self.on_delta(*delta)
+        return False, 0
@@ -0,0 +1,144 @@
+from typing import List, Optional
+
+from constants import (
+    WHIP_MIN_BITRATE_KBPS,
+    WHIP_AUTO_BITRATE_CEILING_KBPS,
+    WHIP_DECODE_BACKLOG_MS,
+    WHIP_STALL_SECONDS,
+    WHIP_PLI_MIN_INTERVAL,
+)
+
+def _video_receivers(pc) -> list:
+    out = []
+    try:
+        for tr in pc.getTransceivers():
+            if getattr(tr, "kind", None) == "video" and tr.receiver is not None:
+                out.append(tr)
+    except Exception:
+        pass
+    return out
+
+def _ssrcs(receiver) -> List[int]:
+    try:
+        return [s.source for s in receiver.getSynchronizationSources()]
+    except Exception:
+        return []
+
+class ReceiverFeedback:
+    def __init__(self, max_kbps: int = 0, adaptive: bool = True):
+        self.max_kbps = max(0, int(max_kbps))
+        self.adaptive = bool(adaptive)
+        self.cap_kbps = self._ceiling()
+        self.keyframe_requests = 0
+        self.last_recovery_ms: Optional[float] = None
+        self._delay_ema: Optional[float] = None
+        self._pending_reason: Optional[str] = None
+        self._last_pli = 0.0
+        self._pli_at: Optional[float] = None
+        self._clamped = set()
+
+    def configure(self, max_kbps: int, adaptive: bool):
+        self.max_kbps = max(0, int(max_kbps))
+        self.adaptive = bool(adaptive)
+        self.cap_kbps = min(self.cap_kbps, self._ceiling()) if self.adaptive else self._ceiling()
+
+    def _ceiling(self) -> int:
+        return self.max_kbps or WHIP_AUTO_BITRATE_CEILING_KBPS
+
+    def on_delay(self, delay_ms: float):
+        if self._delay_ema is None:
+            self._delay_ema = delay_ms
+        else:
+            self._delay_ema += 0.2 * (delay_ms - self._delay_ema)
+
+    def on_frame(self, now: float):
+        if self._pli_at is not None:
+            self.last_recovery_ms = (now - self._pli_at) * 1000.0
+            self._pli_at = None
+
+    def request_keyframe(self, reason: str):
+        if self._pending_reason is None:
+            self._pending_reason = reason
+
+    def update_cap(self, measured_kbps: float):
+        ceiling = self._ceiling()
+        if not self.adaptive:
+            self.cap_kbps = ceiling
+            return
+        backlog = self._delay_ema or 0.0
+        if backlog > WHIP_DECODE_BACKLOG_MS:
+            base = min(self.cap_kbps, measured_kbps) if measured_kbps > 0 else self.cap_kbps
+            self.cap_kbps = int(max(WHIP_MIN_BITRATE_KBPS, base * 0.85))
+        elif backlog < WHIP_DECODE_BACKLOG_MS / 2:
+            self.cap_kbps = int(min(ceiling, self.cap_kbps * 1.05 + 50))
+
+    def keyframe_due(self, now: float, last_frame: Optional[float]) -> Optional[str]:
+        if last_frame is not None and now - last_frame > WHIP_STALL_SECONDS:
+            self.request_keyframe("stall")
+        if self._pending_reason is None or now - self._last_pli < WHIP_PLI_MIN_INTERVAL:
+            return None
+        reason = self._pending_reason
+        self._pending_reason = None
+        self._last_pli = now
+        if self._pli_at is None:
+            self._pli_at = now
+        self.keyframe_requests += 1
+        return reason
+
+    def snapshot(self) -> dict:
+        return {
+            "bitrate_cap_kbps": self.cap_kbps,
+            "decode_backlog_ms": round(self._delay_ema or 0.0, 1),
+            "keyframe_requests": self.keyframe_requests,
+            "last_recovery_ms": round(self.last_recovery_ms, 1) if self.last_recovery_ms is not None else None,
+        }
+
+    def clamp_remb(self, pc):
+        try:
+            from aiortc.rtp import RtcpPsfbPacket, RTCP_PSFB_APP, pack_remb_fci, unpack_remb_fci
+        except Exception:
+            return
+        for tr in _video_receivers(pc):
+            r = tr.receiver
+            if id(r) in self._clamped:
+                continue
+            orig = getattr(r, "_send_rtcp", None)
+            if orig is None:
+                continue
+            self._clamped.add(id(r))
+
+            async def send(packet, _orig=orig):
+                if isinstance(packet, RtcpPsfbPacket) and packet.fmt == RTCP_PSFB_APP:
+                    try:
+                        bitrate, ssrcs = unpack_remb_fci(packet.fci)
+                        cap = self.cap_kbps * 1000
+                        if bitrate > cap:
+                            packet.fci = pack_remb_fci(cap, ssrcs)
+                    except Exception:
+                        pass
+                return await _orig(packet)
+            r._send_rtcp = send
+
+    async def send_remb(self, pc):
+        try:
+            from aiortc.rtp import RtcpPsfbPacket, RTCP_PSFB_APP, pack_remb_fci
+        except Exception:
+            return
+        for tr in _video_receivers(pc):
+            ssrcs = _ssrcs(tr.receiver)
+            if not ssrcs:
+                continue
+            try:
+                packet = RtcpPsfbPacket(fmt=RTCP_PSFB_APP, ssrc=tr.sender._ssrc, media_ssrc=0,
+                                        fci=pack_remb_fci(self.cap_kbps * 1000, ssrcs))
+                await tr.receiver._send_rtcp(packet)
+            except Exception:
+                pass
+
+    async def send_pli(self, pc):
+        for tr in _video_receivers(pc):
+            for ssrc in _ssrcs(tr.receiver):
+                try:
+                    await tr.receiver._send_rtcp_pli(ssrc)
+                except Exception:
+                    pass
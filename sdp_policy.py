@@ -0,0 +1,130 @@
+import math
+from typing import Dict, List, Optional, Sequence
+
+from constants import WHIP_CODEC_PREFERENCE, WHIP_MAX_WIDTH, WHIP_MAX_HEIGHT, WHIP_MAX_FPS
+
+class NegotiationPolicy:
+    def __init__(self, codecs: Sequence[str] = WHIP_CODEC_PREFERENCE, max_width: int = WHIP_MAX_WIDTH,
+                 max_height: int = WHIP_MAX_HEIGHT, max_fps: int = WHIP_MAX_FPS, strict: bool = False):
+        self.codecs = [c.upper() for c in codecs]
+        self.max_width = max(0, int(max_width))
+        self.max_height = max(0, int(max_height))
+        self.max_fps = max(0, int(max_fps))
+        self.strict = bool(strict)
+
+    @classmethod
+    def from_dict(cls, cfg: Optional[dict]) -> "NegotiationPolicy":
+        cfg = cfg or {}
+        return cls(
+            codecs=cfg.get("codecs", WHIP_CODEC_PREFERENCE),
+            max_width=cfg.get("max_width", WHIP_MAX_WIDTH),
+            max_height=cfg.get("max_height", WHIP_MAX_HEIGHT),
+            max_fps=cfg.get("max_fps", WHIP_MAX_FPS),
+            strict=cfg.get("strict", False),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "codecs": list(self.codecs),
+            "max_width": self.max_width,
+            "max_height": self.max_height,
+            "max_fps": self.max_fps,
+            "strict": self.strict,
+        }
+
+    def order_codecs(self, capabilities: list) -> list:
+        def name(c) -> str:
+            return c.mimeType.split("/", 1)[-1].upper()
+
+        rank = {n: i for i, n in enumerate(self.codecs)}
+        media = [c for c in capabilities if name(c) != "RTX"]
+        rtx = [c for c in capabilities if name(c) == "RTX"]
+        if self.strict:
+            media = [c for c in media if name(c) in rank]
+        media.sort(key=lambda c: rank.get(name(c), len(rank)))
+        return media + rtx
+
+    def apply_codec_preferences(self, transceiver) -> bool:
+        try:
+            from aiortc import RTCRtpReceiver
+            caps = RTCRtpReceiver.getCapabilities("video").codecs
+            ordered = self.order_codecs(caps)
+            if not ordered:
+                return False
+            transceiver.setCodecPreferences(ordered)
+            return True
+        except Exception:
+            return False
+
+    def max_fs(self) -> int:
+        if not self.max_width or not self.max_height:
+            return 0
+        return math.ceil(self.max_width / 16) * math.ceil(self.max_height / 16)
+
+    def _codec_params(self, codec: str) -> Dict[str, int]:
+        fs = self.max_fs()
+        params: Dict[str, int] = {}
+        if codec == "H264":
+            if fs:
+                params["max-fs"] = fs
+                if self.max_fps:
+                    params["max-mbps"] = fs * self.max_fps
+        elif codec in ("VP8", "VP9"):
+            if fs:
+                params["max-fs"] = fs
+            if self.max_fps:
+                params["max-fr"] = self.max_fps
+        return params
+
+    def munge_answer(self, sdp: str) -> str:
+        if not (self.max_fs() or self.max_fps):
+            return sdp
+        lines = sdp.splitlines()
+        out: List[str] = []
+        section: List[str] = []
+
+        def flush():
+            if section and section[0].startswith("m=video"):
+                out.extend(self._munge_video_section(section))
+            else:
+                out.extend(section)
+
+        for line in lines:
+            if line.startswith("m="):
+                flush()
+                section = [line]
+            elif section:
+                section.append(line)
+            else:
+                out.append(line)
+        flush()
+        return "\r\n".join(out) + "\r\n"
+
+    def _munge_video_section(self, section: List[str]) -> List[str]:
+        codecs: Dict[str, str] = {}
+        for line in section:
+            if line.startswith("a=rtpmap:"):
+                pt, _, enc = line[len("a=rtpmap:"):].partition(" ")
+                codecs[pt] = enc.split("/", 1)[0].upper()
+        fmtp_seen = set()
+        out: List[str] = []
+        for line in section:
+            if line.startswith("a=fmtp:"):
+                pt, _, params = line[len("a=fmtp:"):].partition(" ")
+                extra = self._codec_params(codecs.get(pt, ""))
+                if extra:
+                    have = {p.split("=", 1)[0].strip() for p in params.split(";") if p}
+                    add = ";".join(f"{k}={v}" for k, v in extra.items() if k not in have)
+                    if add:
+                        line = f"{line};{add}" if params else f"{line}{add}"
+                fmtp_seen.add(pt)
+            out.append(line)
+        for pt, codec in codecs.items():
+            extra = self._codec_params(codec)
+            if pt not in fmtp_seen and extra:
+                out.append(f"a=fmtp:{pt} " + ";".join(f"{k}={v}" for k, v in extra.items()))
+        if self.max_width and self.max_height:
+            out.append(f"a=imageattr:* recv [x=[1:{self.max_width}],y=[1:{self.max_height}]]")
+        if self.max_fps:
+            out.append(f"a=framerate:{self.max_fps}")
+        return out
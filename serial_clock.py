@@ -0,0 +1,46 @@
+import struct
+import time
+from collections import deque
+from typing import Optional
+
+from serial_protocol import OP_TIME
+import serial_probe
+
+_MASK = 0xFFFFFFFF
+
+class ClockSync:
+    # maps time.perf_counter() onto the firmware's u32 microsecond clock. Queueing only
+    # ever adds delay, so the offset comes from the lowest-RTT of the recent exchanges;
+    # the window stays short because the two crystals drift apart by up to ~0.1 ms/s
+    def __init__(self, window: int = 4):
+        self._samples: deque = deque(maxlen=window)
+        self.offset_us: Optional[int] = None
+        self.rtt_ms: Optional[float] = None
+
+    @property
+    def synced(self) -> bool:
+        return self.offset_us is not None
+
+    def add(self, t_send: float, t_recv: float, device_us: int):
+        rtt = t_recv - t_send
+        mid = round((t_send + t_recv) * 500000.0)
+        self._samples.append((rtt, (device_us - mid) & _MASK))
+        best = min(self._samples)
+        self.rtt_ms = best[0] * 1000.0
+        self.offset_us = best[1]
+
+    def device_us(self, t: float) -> int:
+        return (round(t * 1000000.0) + (self.offset_us or 0)) & _MASK
+
+def decode_time(payload: bytes) -> Optional[int]:
+    if len(payload) != 4:
+        return None
+    return struct.unpack("<I", payload)[0]
+
+def sync(ser, clock: ClockSync, rounds: int = 8, timeout: float = 0.05) -> bool:
+    for _ in range(rounds):
+        t_send = time.perf_counter()
+        got = decode_time(serial_probe.request(ser, OP_TIME, timeout=timeout, attempts=1) or b"")
+        if got is not None:
+            clock.add(t_send, time.perf_counter(), got)
+    return clock.synced
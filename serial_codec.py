@@ -0,0 +1,276 @@
+import argparse
+import json
+import random
+import struct
+import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from serial_protocol import clamp_delta
+
+ENC_LEGACY = 0
+ENC_COMPACT = 1
+ENCODINGS = {"legacy": ENC_LEGACY, "compact": ENC_COMPACT}
+
+# compact stream tokens
+#   0x00-0x78  both axes in [-5, 5]: (dx + 5) * 11 + (dy + 5)
+#   0x79       T_TIME, then a varint: source time of the next motion token in
+#              device microseconds, low STAMP_BITS bits (see serial_clock.py)
+#   0x7A-0x7F  reserved
+#   0x80       ESC, a command frame follows
+#   0x81-0x87  0x80 | F_X | F_Y | F_RUN, then zigzag varints: run count - 2, dx, dy
+#              absent axes are zero; a run repeats the delta
+SMALL = 5
+SMALL_BASE = 2 * SMALL + 1
+SMALL_MAX = SMALL_BASE * SMALL_BASE - 1
+F_X = 0x01
+F_Y = 0x02
+F_RUN = 0x04
+F_TIME = 0x08
+T_TIME = 0x79
+STAMP_BITS = 21
+STAMP_MASK = (1 << STAMP_BITS) - 1
+COMPACT_LIMIT = 32767
+_MAX_VARINT = 3
+
+def _zigzag(v: int) -> int:
+    return (v << 1) if v >= 0 else ((-v << 1) - 1)
+
+def _unzigzag(u: int) -> int:
+    return (u >> 1) if not (u & 1) else -((u + 1) >> 1)
+
+def _varint(u: int, out: bytearray):
+    while u >= 0x80:
+        out.append((u & 0x7F) | 0x80)
+        u >>= 7
+    out.append(u)
+
+def clamp_compact(v: int) -> int:
+    return COMPACT_LIMIT if v > COMPACT_LIMIT else (-COMPACT_LIMIT if v < -COMPACT_LIMIT else v)
+
+def hid_steps(dx: int, dy: int) -> List[Tuple[int, int]]:
+    # a HID report carries one signed byte per axis, so the firmware splits larger moves
+    out = []
+    while dx or dy:
+        sx, sy = clamp_delta(dx), clamp_delta(dy)
+        out.append((sx, sy))
+        dx -= sx
+        dy -= sy
+    return out
+
+def encode_legacy(deltas: Iterable[Tuple]) -> bytes:
+    out = bytearray()
+    for d in deltas:
+        out += struct.pack("bb", clamp_delta(d[0]), clamp_delta(d[1]))
+    return bytes(out)
+
+def _encode_one(dx: int, dy: int, run: int, out: bytearray):
+    if run == 1 and -SMALL <= dx <= SMALL and -SMALL <= dy <= SMALL:
+        out.append((dx + SMALL) * SMALL_BASE + (dy + SMALL))
+        return
+    flags = (F_X if dx else 0) | (F_Y if dy else 0) | (F_RUN if run > 1 else 0)
+    if not flags & (F_X | F_Y):
+        return
+    out.append(0x80 | flags)
+    if run > 1:
+        _varint(run - 2, out)
+    if dx:
+        _varint(_zigzag(dx), out)
+    if dy:
+        _varint(_zigzag(dy), out)
+
+def encode_compact_timed(items: Sequence[Tuple[int, int, Optional[int]]]) -> bytes:
+    # (dx, dy, stamp) with stamp in device microseconds or None; a stamp goes out
+    # whenever it changes and applies to the motion token right after it
+    out = bytearray()
+    i = 0
+    n = len(items)
+    while i < n:
+        stamp = items[i][2]
+        j = i + 1
+        while j < n and items[j][2] == stamp:
+            j += 1
+        group = encode_compact([(dx, dy) for dx, dy, _ in items[i:j]])
+        if stamp is not None and group:
+            out.append(T_TIME)
+            _varint(stamp & STAMP_MASK, out)
+        out += group
+        i = j
+    return bytes(out)
+
+def encode_compact(deltas: Sequence[Tuple[int, int]]) -> bytes:
+    out = bytearray()
+    i = 0
+    n = len(deltas)
+    while i < n:
+        dx, dy = clamp_compact(deltas[i][0]), clamp_compact(deltas[i][1])
+        j = i + 1
+        while j < n and clamp_compact(deltas[j][0]) == dx and clamp_compact(deltas[j][1]) == dy:
+            j += 1
+        run = j - i
+        # a run token only pays off once the single-token form repeats enough
+        if run == 2 and -SMALL <= dx <= SMALL and -SMALL <= dy <= SMALL:
+            _encode_one(dx, dy, 1, out)
+            _encode_one(dx, dy, 1, out)
+        else:
+            _encode_one(dx, dy, run, out)
+        i = j
+    return bytes(out)
+
+class CompactDecoder:
+    # reference decoder; compactFeed in motion_core.h implements the same state machine
+    def __init__(self):
+        self.reset()
+        self.invalid = 0
+        self.stamp: Optional[int] = None
+
+    def reset(self):
+        self._flags = 0
+        self._fields: List[int] = []
+        self._acc = 0
+        self._shift = 0
+        self._nbytes = 0
+
+    def _need(self) -> int:
+        return bin(self._flags & 0x0F).count("1")
+
+    def take_stamp(self) -> Optional[int]:
+        # the stamp, if any, that preceded the motion just returned
+        stamp, self.stamp = self.stamp, None
+        return stamp
+
+    def feed_byte(self, b: int) -> List[Tuple[int, int]]:
+        if not self._flags:
+            if b == T_TIME:
+                self._flags = F_TIME
+                return []
+            if b < 0x80:
+                if b > SMALL_MAX:
+                    self.invalid += 1
+                    return []
+                return [(b // SMALL_BASE - SMALL, b % SMALL_BASE - SMALL)]
+            if 0x81 <= b <= 0x87 and b & (F_X | F_Y):
+                self._flags = b & 0x07
+                return []
+            self.invalid += 1
+            return []
+        self._acc |= (b & 0x7F) << self._shift
+        self._shift += 7
+        self._nbytes += 1
+        if b & 0x80:
+            if self._nbytes >= _MAX_VARINT:
+                self.invalid += 1
+                self.reset()
+            return []
+        self._fields.append(self._acc)
+        self._acc = self._shift = self._nbytes = 0
+        if len(self._fields) < self._need():
+            return []
+        if self._flags & F_TIME:
+            self.stamp = self._fields[0]
+            self.reset()
+            return []
+        fields = iter(self._fields)
+        flags = self._flags
+        run = next(fields) + 2 if flags & F_RUN else 1
+        dx = _unzigzag(next(fields)) if flags & F_X else 0
+        dy = _unzigzag(next(fields)) if flags & F_Y else 0
+        self.reset()
+        return [(dx, dy)] * run
+
+    def feed(self, data: bytes) -> List[Tuple[int, int]]:
+        out: List[Tuple[int, int]] = []
+        for b in data:
+            out += self.feed_byte(b)
+        return out
+
+# byte-exact vectors shared with the firmware decoder
+VECTORS = [
+    ([(0, 0)], bytes([60])),
+    ([(-5, -5)], bytes([0])),
+    ([(5, 5)], bytes([120])),
+    ([(1, -1)], bytes([70])),
+    ([(6, 0)], bytes([0x81, 12])),
+    ([(0, -6)], bytes([0x82, 11])),
+    ([(127, -128)], bytes([0x83, 0xFE, 0x01, 0xFF, 0x01])),
+    ([(1000, 0)], bytes([0x81, 0xD0, 0x0F])),
+    ([(COMPACT_LIMIT, -COMPACT_LIMIT)], bytes([0x83, 0xFE, 0xFF, 0x03, 0xFD, 0xFF, 0x03])),
+    ([(2, 3)] * 5, bytes([0x87, 3, 4, 6])),
+    ([(40, 0)] * 2, bytes([0x85, 0, 80])),
+    ([(1, 1)] * 2, bytes([72, 72])),
+]
+
+def _random_trace(n: int, seed: int) -> List[Tuple[int, int]]:
+    rng = random.Random(seed)
+    out = []
+    vx = vy = 0.0
+    while len(out) < n:
+        mode = rng.random()
+        if mode < 0.1:
+            d = (rng.randint(-COMPACT_LIMIT, COMPACT_LIMIT), rng.randint(-COMPACT_LIMIT, COMPACT_LIMIT))
+            out += [d] * rng.randint(1, 4)
+            continue
+        vx += rng.gauss(0, 3)
+        vy += rng.gauss(0, 3)
+        vx *= 0.95
+        vy *= 0.95
+        out.append((int(vx), int(vy)))
+    return out[:n]
+
+def motion_per_byte(trace: Sequence[Tuple[int, int]]) -> dict:
+    # legacy has to split anything beyond one byte per axis into extra packets
+    legacy = encode_legacy(s for dx, dy in trace for s in hid_steps(dx, dy))
+    compact = encode_compact(trace)
+    motion = sum(abs(dx) + abs(dy) for dx, dy in trace)
+    return {
+        "deltas": len(trace),
+        "legacy_bytes": len(legacy),
+        "compact_bytes": len(compact),
+        "ratio": round(len(legacy) / len(compact), 2) if compact else 0.0,
+        "counts_per_byte_legacy": round(motion / len(legacy), 1) if legacy else 0.0,
+        "counts_per_byte_compact": round(motion / len(compact), 1) if compact else 0.0,
+    }
+
+def bench(seconds: float = 1.0, baud: int = 1000000) -> dict:
+    traces = {
+        "slow": [(random.Random(i).randint(-3, 3), random.Random(i + 1).randint(-3, 3)) for i in range(4096)],
+        "fast": [(random.Random(i).randint(-300, 300), random.Random(i + 1).randint(-300, 300)) for i in range(4096)],
+        "axis": [(random.Random(i).randint(-60, 60), 0) for i in range(4096)],
+        "mixed": _random_trace(4096, 7),
+    }
+    line_bytes_per_s = baud / 10.0
+    result = {}
+    for name, trace in traces.items():
+        size = motion_per_byte(trace)
+        wire = encode_compact(trace)
+        n = 0
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            encode_compact(trace)
+            n += 1
+        enc = n * len(trace) / (time.perf_counter() - t0)
+        n = 0
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            CompactDecoder().feed(wire)
+            n += 1
+        dec_bps = n * len(wire) / (time.perf_counter() - t0)
+        size.update({
+            "encode_deltas_per_s": round(enc),
+            "decode_bytes_per_s": round(dec_bps),
+            "deltas_per_s_at_baud_legacy": round(line_bytes_per_s * len(trace) / size["legacy_bytes"]),
+            "deltas_per_s_at_baud_compact": round(line_bytes_per_s * len(trace) / size["compact_bytes"]),
+        })
+        result[name] = size
+    return result
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compact serial motion encoding: size and throughput against the legacy format.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench")
+    b.add_argument("--seconds", type=float, default=0.5)
+    b.add_argument("--baud", type=int, default=1000000)
+    args = ap.parse_args(argv)
+    print(json.dumps(bench(args.seconds, args.baud), indent=2))
+
+if __name__ == "__main__":
+    main()
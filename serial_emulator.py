@@ -0,0 +1,352 @@
+import random
+import struct
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from constants import (
+    SERIAL_BOOT_BAUD,
+    SERIAL_PROBE_REVERT_MS,
+    SERIAL_RX_WINDOW,
+    SERIAL_CREDIT_INTERVAL_MS,
+    SERIAL_HID_REPORT_S,
+)
+from serial_protocol import (
+    ESC,
+    MAX_PAYLOAD,
+    OP_BAUD,
+    OP_PROBE,
+    OP_COMMIT,
+    OP_REVERT,
+    OP_ENCODING,
+    OP_CREDIT,
+    OP_STATS,
+    OP_HID,
+    OP_CAPS,
+    OP_TIME,
+    OP_PLAYOUT,
+    OP_NAK,
+    checksum,
+    encode_command,
+    encode_reply,
+    reply_op,
+)
+from serial_codec import ENC_LEGACY, ENC_COMPACT, STAMP_BITS, CompactDecoder, encode_compact, hid_steps
+from serial_flow import (
+    CAP_BAUD,
+    CAP_COMPACT,
+    CAP_CREDIT,
+    CAP_STATS,
+    CAP_WIDE,
+    CAP_CLOCK,
+    FirmwareCaps,
+    encode_credit,
+    encode_stats,
+)
+from motion_core import MOTION_STEP, MotionAccumulator, Playout
+
+class FirmwareModel:
+    # mirrors the command parser in ControlMouse.ino, with a finite receive buffer;
+    # motion is summed as bytes drain and leaves as at most one HID report per report_s
+    def __init__(self, boot_baud: int = SERIAL_BOOT_BAUD, rx_buffer: int = SERIAL_RX_WINDOW,
+                 report_s: float = SERIAL_HID_REPORT_S, report_step: int = MOTION_STEP, clock_offset_us: int = 0):
+        self.baud = boot_baud
+        self.committed_baud = boot_baud
+        self.moves: List[Tuple[int, int]] = []
+        self.encoding = ENC_LEGACY
+        self.rx_buffer = rx_buffer
+        self.report_s = report_s
+        self.report_step = report_step
+        self.consumed = 0
+        self.overruns = 0
+        self.rx_full = 0
+        self.discarded = 0
+        self.motion = MotionAccumulator()
+        self.playout = Playout()
+        # micros() runs from its own origin; the host only learns it through OP_TIME
+        self.clock_offset_us = clock_offset_us
+        self._now_us = 0
+        self._report_at: Optional[float] = None
+        self.credit = False
+        self._credit_sent = 0
+        self._credit_at = 0.0
+        self._compact = CompactDecoder()
+        self._rx = bytearray()
+        self._out: List[Tuple[bytes, int]] = []
+        self._probe_deadline: Optional[float] = None
+
+    def take_output(self) -> List[Tuple[bytes, int]]:
+        out, self._out = self._out, []
+        return out
+
+    def _reply(self, op: int, payload: bytes = b""):
+        self._out.append((encode_reply(op, payload), self.baud))
+
+    def _switch(self, baud: int):
+        self.baud = baud
+
+    def tick(self, now: float):
+        if self._probe_deadline is not None and now > self._probe_deadline:
+            self._probe_deadline = None
+            self._switch(self.committed_baud)
+        self._run(now)
+
+    def micros(self, now: float) -> int:
+        return (round(now * 1000000.0) + self.clock_offset_us) & 0xFFFFFFFF
+
+    def _expand_stamp(self, low: int) -> int:
+        # the full time nearest to now with the stamp's low bits, as expandStamp
+        span = 1 << STAMP_BITS
+        t = (self._now_us & ~(span - 1)) | low
+        d = ((t - self._now_us + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        if d > span // 2:
+            t -= span
+        elif d < -(span // 2):
+            t += span
+        return t & 0xFFFFFFFF
+
+    def _move(self, dx: int, dy: int, run: int = 1, stamp: Optional[int] = None):
+        if self._probe_deadline is None:
+            self.playout.add(self.motion, stamp, self._now_us, dx, dy, run)
+
+    def _report(self, now: float):
+        self.playout.release(self.motion, self._now_us)
+        while self.motion.pending and (self._report_at is None or now - self._report_at >= self.report_s):
+            self.moves.append(self.motion.take(self.report_step))
+            self._report_at = now
+
+    def _take(self, n: int) -> bytes:
+        data = bytes(self._rx[:n])
+        del self._rx[:n]
+        self.consumed = (self.consumed + n) & 0xFFFFFFFF
+        return data
+
+    def _send_credit(self, now: float):
+        self._credit_sent = self.consumed
+        self._credit_at = now
+        self._reply(reply_op(OP_CREDIT), encode_credit(self.consumed, self.rx_buffer))
+
+    def feed(self, data: bytes, now: float):
+        self._run(now)
+        room = max(0, self.rx_buffer - len(self._rx))
+        if len(data) > room:
+            self.overruns += len(data) - room
+            data = data[:room]
+        self._rx += data
+        self._run(now)
+
+    def _run(self, now: float):
+        rx = self._rx
+        self._now_us = self.micros(now)
+        # the firmware can't see UART overruns, only passes that find the buffer full
+        if self.rx_buffer > 1 and len(rx) >= self.rx_buffer - 1:
+            self.rx_full += 1
+        while rx:
+            if self.encoding == ENC_COMPACT and (rx[0] != ESC or self._compact._flags):
+                invalid = self._compact.invalid
+                got = self._compact.feed_byte(self._take(1)[0])
+                self.discarded += self._compact.invalid - invalid
+                if got:
+                    stamp = self._compact.take_stamp()
+                    if stamp is not None:
+                        stamp = self._expand_stamp(stamp)
+                    self._move(got[0][0], got[0][1], len(got), stamp)
+                continue
+            if rx[0] == ESC:
+                if len(rx) < 3:
+                    break
+                n = rx[2]
+                if n > MAX_PAYLOAD:
+                    self._take(1)
+                    self.discarded += 1
+                    continue
+                if len(rx) < 4 + n:
+                    break
+                frame = self._take(4 + n)
+                op = frame[1]
+                payload = frame[3:3 + n]
+                if frame[3 + n] == checksum(op, payload):
+                    self._command(op, payload, now)
+                else:
+                    self.discarded += 1
+                    self._reply(OP_NAK, bytes((op,)))
+                continue
+            if len(rx) < 2:
+                break
+            dx, dy = struct.unpack("bb", self._take(2))
+            self._move(dx, dy)
+        self._report(now)
+        pending = (self.consumed - self._credit_sent) & 0xFFFFFFFF
+        if self.credit and pending and (pending >= self.rx_buffer // 2
+                                        or now - self._credit_at >= SERIAL_CREDIT_INTERVAL_MS / 1000.0):
+            self._send_credit(now)
+
+    def _command(self, op: int, payload: bytes, now: float):
+        revert = SERIAL_PROBE_REVERT_MS / 1000.0
+        if op == OP_BAUD and len(payload) == 4:
+            self._reply(reply_op(op), payload)
+            self._switch(struct.unpack("<I", payload)[0])
+            self._probe_deadline = now + revert
+        elif op == OP_PROBE:
+            self._reply(reply_op(op), payload)
+            if self._probe_deadline is not None:
+                self._probe_deadline = now + revert
+        elif op == OP_COMMIT:
+            self.committed_baud = self.baud
+            self._probe_deadline = None
+            self._reply(reply_op(op), struct.pack("<I", self.baud))
+        elif op == OP_REVERT:
+            self._reply(reply_op(op), struct.pack("<I", self.committed_baud))
+            self._probe_deadline = None
+            self._switch(self.committed_baud)
+        elif op == OP_ENCODING and len(payload) == 1 and payload[0] in (ENC_LEGACY, ENC_COMPACT):
+            self.encoding = payload[0]
+            self._compact.reset()
+            self._reply(reply_op(op), payload)
+        elif op == OP_CREDIT and len(payload) == 1:
+            self.credit = bool(payload[0])
+            self._send_credit(now)
+        elif op == OP_CAPS:
+            flags = CAP_BAUD | CAP_COMPACT | CAP_CREDIT | CAP_STATS | CAP_CLOCK
+            flags |= CAP_WIDE if self.report_step > 127 else 0
+            caps = FirmwareCaps(1, flags, self.rx_buffer, round(self.report_s * 1e6), self.report_step)
+            self._reply(reply_op(op), caps.encode())
+        elif op == OP_HID and not payload:
+            self._reply(reply_op(op), struct.pack("<H", self.report_step))
+        elif op == OP_STATS and not payload:
+            p = self.playout
+            self._reply(reply_op(op), encode_stats(self.rx_full, self.discarded, *self.motion.counters(),
+                                                   p.jitter_in.us, p.jitter_out.us, p.late, p.overflow))
+        elif op == OP_TIME and not payload:
+            self._reply(reply_op(op), struct.pack("<I", self.micros(now)))
+        elif op == OP_PLAYOUT and len(payload) == 2:
+            self.playout.set_delay(self.motion, struct.unpack("<H", payload)[0])
+            self._reply(reply_op(op), payload)
+        else:
+            self._reply(OP_NAK, bytes((op,)))
+
+def firmware_conformance(vectors) -> List[str]:
+    failures: List[str] = []
+    for deltas, wire in vectors:
+        fw = FirmwareModel(report_s=0.0)
+        fw.encoding = ENC_COMPACT
+        for b in wire:
+            fw.feed(bytes((b,)), 0.0)
+        # a run is summed into one move, so compare net motion and report size
+        want = (sum(d[0] for d in deltas), sum(d[1] for d in deltas))
+        got = (sum(m[0] for m in fw.moves), sum(m[1] for m in fw.moves))
+        if got != want or any(abs(v) > 127 for m in fw.moves for v in m):
+            failures.append(f"firmware {wire.hex()}: {got} != {want}")
+    # commands must still parse in between compact tokens
+    fw = FirmwareModel(report_s=0.0)
+    fw.encoding = ENC_COMPACT
+    fw.feed(encode_compact([(300, -2)]) + encode_command(OP_PROBE, b"x") + encode_compact([(1, 1)]), 0.0)
+    if fw.moves != hid_steps(301, -1) or not fw.take_output():
+        failures.append("firmware: command between compact tokens")
+    return failures
+
+class EmulatedSerial:
+    # pyserial-compatible subset backed by FirmwareModel and a simulated UART
+    def __init__(self, max_baud: int = 1000000, error_rate: float = 0.02, boot_baud: int = SERIAL_BOOT_BAUD,
+                 seed: int = 1, firmware: Optional[FirmwareModel] = None):
+        self.device = firmware or FirmwareModel(boot_baud)
+        self.max_baud = max_baud
+        self.error_rate = error_rate
+        self.timeout: Optional[float] = 0
+        self.write_timeout: Optional[float] = 0
+        self.is_open = True
+        self._baud = boot_baud
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._to_dev: deque = deque()
+        self._to_host: deque = deque()
+        self._rx = bytearray()
+        self._tx_free = 0.0
+        self._dev_tx_free = 0.0
+
+    @property
+    def baudrate(self) -> int:
+        return self._baud
+
+    @baudrate.setter
+    def baudrate(self, baud: int):
+        with self._lock:
+            self._baud = int(baud)
+
+    def _wire(self, data: bytes, send_baud: int, recv_baud: int) -> bytes:
+        if send_baud != recv_baud:
+            return bytes(self._rng.randrange(256) for _ in data)
+        if send_baud <= self.max_baud or not self.error_rate:
+            return data
+        p = min(0.5, self.error_rate * send_baud / self.max_baud)
+        return bytes(self._rng.randrange(256) if self._rng.random() < p else b for b in data)
+
+    def _collect(self, t: float):
+        for out, out_baud in self.device.take_output():
+            start = max(self._dev_tx_free, t)
+            self._dev_tx_free = start + len(out) * 10.0 / out_baud
+            self._to_host.append((self._dev_tx_free, out, out_baud))
+
+    def _pump(self, now: float):
+        dev = self.device
+        while self._to_dev and self._to_dev[0][0] <= now:
+            t, data, baud = self._to_dev.popleft()
+            dev.tick(t)
+            dev.feed(self._wire(data, baud, dev.baud), t)
+            self._collect(t)
+        dev.tick(now)
+        self._collect(now)
+        while self._to_host and self._to_host[0][0] <= now:
+            _, data, baud = self._to_host.popleft()
+            self._rx += self._wire(data, baud, self._baud)
+
+    def write(self, data: bytes) -> int:
+        if not self.is_open:
+            raise OSError("port closed")
+        data = bytes(data)
+        with self._lock:
+            now = time.perf_counter()
+            start = max(self._tx_free, now)
+            self._tx_free = start + len(data) * 10.0 / self._baud
+            self._to_dev.append((self._tx_free, data, self._baud))
+            self._pump(now)
+        return len(data)
+
+    @property
+    def out_waiting(self) -> int:
+        with self._lock:
+            now = time.perf_counter()
+            self._pump(now)
+            return sum(len(d) for t, d, _ in self._to_dev)
+
+    @property
+    def in_waiting(self) -> int:
+        with self._lock:
+            self._pump(time.perf_counter())
+            return len(self._rx)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = time.perf_counter() + (self.timeout or 0)
+        while True:
+            with self._lock:
+                self._pump(time.perf_counter())
+                if self._rx:
+                    out = bytes(self._rx[:size])
+                    del self._rx[:size]
+                    return out
+            if time.perf_counter() >= deadline:
+                return b""
+            time.sleep(0.0005)
+
+    def flush(self):
+        while self.out_waiting:
+            time.sleep(0.0005)
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._pump(time.perf_counter())
+            self._rx.clear()
+
+    def close(self):
+        self.is_open = False
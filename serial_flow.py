@@ -0,0 +1,148 @@
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+from serial_codec import COMPACT_LIMIT
+
+_MASK = 0xFFFFFFFF
+
+def encode_credit(consumed: int, window: int) -> bytes:
+    return struct.pack("<IH", consumed & _MASK, window)
+
+def decode_credit(payload: bytes) -> Optional[Tuple[int, int]]:
+    if len(payload) != 6:
+        return None
+    return struct.unpack("<IH", payload)
+
+# firmware counters behind OP_STATS, all u32; the jitter fields are RFC 3550 estimates
+# in microseconds of playout transit at arrival and at release. Sketches from before
+# the playout buffer send only the first five
+STATS_FIELDS = ("rx_full", "discarded", "moves", "reports", "clipped",
+                "jitter_in_us", "jitter_out_us", "late", "playout_overflow")
+
+def encode_stats(*values: int) -> bytes:
+    return struct.pack(f"<{len(values)}I", *(v & _MASK for v in values))
+
+# OP_CAPS feature bits
+CAP_BAUD = 0x01
+CAP_COMPACT = 0x02
+CAP_CREDIT = 0x04
+CAP_STATS = 0x08
+CAP_WIDE = 0x10
+CAP_CLOCK = 0x20
+
+# the original sketch reads every byte pair as a move, so the caps query carries padding that
+# makes the whole frame add up to no motion there: 80 56 04 aa 7c 40 00 c0 reads as (-128,86)
+# (4,-86) (124,64) (0,-64). The current firmware ignores the payload
+CAPS_PAD = bytes((0xAA, 0x7C, 0x40, 0x00))
+
+class FirmwareCaps:
+    # what the handshake says the flashed sketch can do
+    def __init__(self, version: int, flags: int, rx_window: int, hid_interval_us: int, report_step: int):
+        self.version = version
+        self.flags = flags
+        self.rx_window = rx_window
+        self.hid_interval_us = hid_interval_us
+        self.report_step = report_step
+
+    def has(self, flag: int) -> bool:
+        return bool(self.flags & flag)
+
+    def encode(self) -> bytes:
+        return struct.pack("<BHHHH", self.version, self.flags, self.rx_window, self.hid_interval_us, self.report_step)
+
+    @classmethod
+    def decode(cls, payload: bytes) -> Optional["FirmwareCaps"]:
+        # later protocol versions may append fields
+        if len(payload) < 9:
+            return None
+        return cls(*struct.unpack_from("<BHHHH", payload))
+
+    def to_dict(self) -> dict:
+        names = ("baud", "compact", "credit", "stats", "wide", "clock")
+        return {
+            "version": self.version,
+            "features": [n for i, n in enumerate(names) if self.flags & (1 << i)],
+            "rx_window": self.rx_window,
+            "hid_interval_us": self.hid_interval_us,
+            "report_step": self.report_step,
+        }
+
+def decode_report_step(payload: bytes) -> Optional[int]:
+    # OP_HID: the most one HID report can carry per axis
+    if len(payload) != 2:
+        return None
+    return struct.unpack("<H", payload)[0]
+
+def decode_stats(payload: bytes) -> Optional[dict]:
+    n = len(payload) // 4
+    if len(payload) % 4 or n < 5 or n > len(STATS_FIELDS):
+        return None
+    return dict(zip(STATS_FIELDS, struct.unpack(f"<{n}I", payload)))
+
+class CreditWindow:
+    # bytes the host may have in flight: window - (sent - consumed), on wrapping u32 counters
+    def __init__(self, consumed: int, window: int):
+        self.window = window
+        self.sent = consumed & _MASK
+        self.consumed = consumed & _MASK
+        self.resyncs = 0
+
+    @property
+    def in_flight(self) -> int:
+        return (self.sent - self.consumed) & _MASK
+
+    @property
+    def credit(self) -> int:
+        return max(0, self.window - self.in_flight)
+
+    def on_sent(self, n: int):
+        self.sent = (self.sent + n) & _MASK
+
+    def on_report(self, payload: bytes) -> bool:
+        got = decode_credit(payload)
+        if got is None:
+            return False
+        consumed, window = got
+        # a counter behind the last report or ahead of what was sent is stale or corrupt
+        if (consumed - self.consumed) & _MASK > self.in_flight:
+            return False
+        self.consumed = consumed
+        if window:
+            self.window = window
+        return True
+
+    def resync(self):
+        # bytes lost on the wire never come back as credit
+        self.consumed = self.sent
+        self.resyncs += 1
+
+def coalesce(deltas: Sequence[Tuple], limit: int = COMPACT_LIMIT) -> List[Tuple]:
+    dx = sum(d[0] for d in deltas)
+    dy = sum(d[1] for d in deltas)
+    # timestamped deltas merge into motion carrying the newest source time
+    extra = tuple(deltas[-1][2:]) if deltas else ()
+    out = []
+    while dx or dy:
+        sx = max(-limit, min(limit, dx))
+        sy = max(-limit, min(limit, dy))
+        out.append((sx, sy) + extra)
+        dx -= sx
+        dy -= sy
+    return out
+
+# what happens to queued motion older than the latency budget: "merge" sends it as one
+# jump ahead of the fresh motion, "drop" discards it so the cursor skips it altogether
+STALE_POLICIES = ("merge", "drop")
+
+def expire(deltas: Sequence[Tuple], deadline: float, policy: str = "merge",
+           limit: int = COMPACT_LIMIT) -> Tuple[List[Tuple], int]:
+    # deltas are (dx, dy, enqueue time) oldest first. Merged stale motion is tagged so it
+    # isn't counted again while it waits for credit
+    k = 0
+    while k < len(deltas) and deltas[k][2] < deadline:
+        k += 1
+    if not k:
+        return list(deltas), 0
+    n = sum(1 for d in deltas[:k] if len(d) < 4)
+    stale = [d[:3] + (True,) for d in coalesce(deltas[:k], limit)] if policy == "merge" else []
+    return stale + list(deltas[k:]), n
@@ -0,0 +1,455 @@
+import threading
+import queue
+import time
+from typing import Callable, Optional
+import serial
+from auth_guard import require_auth
+from constants import (
+    SERIAL_BOOT_BAUD,
+    SERIAL_BAUD_CANDIDATES,
+    SERIAL_ENCODING,
+    SERIAL_CREDIT_STALL_S,
+    SERIAL_OS_BUFFER_MS,
+    SERIAL_HID_REPORT_S,
+    SERIAL_PLAYOUT_MS,
+    SERIAL_PING_S,
+    SERIAL_STALE_MS,
+    SERIAL_STALE_POLICY,
+)
+from serial_protocol import OP_ENCODING, OP_CREDIT, OP_PROBE, OP_STATS, OP_HID, OP_CAPS, OP_TIME, OP_PLAYOUT, FrameReader, clamp_delta, encode_command, reply_op
+from serial_codec import (
+    ENCODINGS,
+    ENC_LEGACY,
+    COMPACT_LIMIT,
+    clamp_compact,
+    encode_compact,
+    encode_compact_timed,
+    encode_legacy,
+)
+from serial_flow import (
+    CAP_CLOCK,
+    CAP_COMPACT,
+    CAP_CREDIT,
+    CAP_STATS,
+    CAPS_PAD,
+    STALE_POLICIES,
+    CreditWindow,
+    FirmwareCaps,
+    coalesce,
+    decode_credit,
+    decode_report_step,
+    decode_stats,
+    expire,
+)
+from flight_recorder import RECORDER
+from serial_clock import ClockSync, decode_time
+import serial_clock
+import serial_probe
+
+class SerialLink:
+    # Qt-free serial writer; hooks are called from the caller's or the writer thread
+    def __init__(self, port_factory=None):
+        self.on_connected: Optional[Callable[[bool], None]] = None
+        self.on_stats: Optional[Callable[[int], None]] = None
+        self.on_link_stats: Optional[Callable[[dict], None]] = None
+        self.on_probe: Optional[Callable[[dict], None]] = None
+        self._port_factory = port_factory or serial.Serial
+        self.ser = None
+        self._q = queue.Queue(maxsize=4096)
+        self._running = False
+        self._writer = None
+        self._probe_thread = None
+        self.baud = 0
+        self.encoding = "legacy"
+        # per-axis limit of one HID report; 32767 once the firmware is built with WIDE_HID
+        self.report_step = 127
+        # the firmware's HID report interval paces the writer; sketches without OP_CAPS assume 1 ms
+        self.report_s = SERIAL_HID_REPORT_S
+        self.caps: FirmwareCaps | None = None
+        # set once the firmware has answered a command; the original sketch would read
+        # in-band pings and counter queries as motion
+        self.protocol = False
+        # with a playout delay, deltas carry their source time on the firmware clock
+        self.clock: ClockSync | None = None
+        self.playout_us = 0
+        self._stamping = False
+        self._time_sent: float | None = None
+        self.credits: CreditWindow | None = None
+        self.dropped = 0
+        # queued motion older than this is merged or dropped; 0 lets a stall replay all of it
+        self.stale_ms = SERIAL_STALE_MS
+        self.stale_policy = SERIAL_STALE_POLICY
+        # latest firmware counters; older sketches NAK the query and leave this None
+        self.firmware_stats: dict | None = None
+
+    @staticmethod
+    def _call(hook, *args):
+        if hook is not None:
+            try:
+                hook(*args)
+            except Exception:
+                pass
+
+    def open(self, port: str, baud: int = SERIAL_BOOT_BAUD, target_baud: int | None = None,
+             encoding: str = SERIAL_ENCODING, playout_ms: float = SERIAL_PLAYOUT_MS):
+        self.close()
+        try:
+            require_auth()
+            self.ser = self._port_factory(port=port, baudrate=baud, timeout=0, write_timeout=0)
+            self.ser.timeout = 0.01
+            if target_baud and target_baud != baud:
+                self.protocol = serial_probe.apply_baud(self.ser, target_baud)
+            self.caps = caps = self._query_caps()
+            if caps is None and not self.protocol and target_baud and target_baud != baud:
+                # a board that does not reset when the port opens (a USB-UART bridge) may still run
+                # at the rate an earlier session left it on
+                self.ser.baudrate = target_baud
+                self.caps = caps = self._query_caps()
+                if caps is None:
+                    self.ser.baudrate = baud
+            self.protocol = self.protocol or caps is not None
+            if caps is not None:
+                self.report_step = caps.report_step
+                self.report_s = caps.hid_interval_us / 1e6 or SERIAL_HID_REPORT_S
+            elif self.protocol:
+                # a sketch from before the handshake that still answered the baud switch
+                self.report_step = self._query_report_step()
+            # silence to OP_CAPS means the original sketch: every further query would only
+            # cost a timeout and reach it as motion, so it stays on 2-byte packets
+            if self.protocol:
+                self.encoding = self._select_encoding(self._pick_encoding(encoding))
+            if caps is not None and caps.has(CAP_CLOCK) and self.encoding == "compact":
+                self._start_playout(playout_ms)
+            # last: credits count every byte from here on
+            if caps.has(CAP_CREDIT) if caps is not None else self.protocol:
+                self.credits = self._enable_credits()
+            self.ser.timeout = 0
+            self.baud = self.ser.baudrate
+            self._running = True
+            self._writer = threading.Thread(target=self._writer_loop, name="serial-writer", daemon=True)
+            self._writer.start()
+            self._call(self.on_connected, True)
+            return True
+        except Exception:
+            self.close()
+            return False
+
+    def _query_caps(self) -> FirmwareCaps | None:
+        return FirmwareCaps.decode(serial_probe.request(self.ser, OP_CAPS, CAPS_PAD) or b"")
+
+    def _pick_encoding(self, name: str) -> str:
+        if self.caps is not None and not self.caps.has(CAP_COMPACT):
+            return "legacy"
+        # 2-byte packets would clip what one wide report can carry
+        if name == "auto" or (name == "legacy" and self.report_step > 127):
+            return "compact"
+        return name
+
+    def _select_encoding(self, name: str) -> str:
+        mode = ENCODINGS.get(name, ENC_LEGACY)
+        if mode == ENC_LEGACY:
+            return "legacy"
+        # firmware without the compact decoder NAKs the command and keeps reading pairs
+        if serial_probe.request(self.ser, OP_ENCODING, bytes((mode,))) == bytes((mode,)):
+            return name
+        return "legacy"
+
+    def _start_playout(self, playout_ms: float):
+        clock = ClockSync()
+        if not serial_clock.sync(self.ser, clock):
+            return
+        self.clock = clock
+        # always sent: the firmware keeps its delay from the previous connection
+        us = max(0, min(0xFFFF, round(playout_ms * 1000)))
+        got = serial_probe.request(self.ser, OP_PLAYOUT, us.to_bytes(2, "little"))
+        self.playout_us = int.from_bytes(got, "little") if got and len(got) == 2 else 0
+        self._stamping = self.playout_us > 0
+
+    def _query_report_step(self) -> int:
+        return decode_report_step(serial_probe.request(self.ser, OP_HID) or b"") or 127
+
+    def _enable_credits(self) -> CreditWindow | None:
+        got = decode_credit(serial_probe.request(self.ser, OP_CREDIT, b"\x01") or b"")
+        return CreditWindow(*got) if got else None
+
+    def close(self):
+        self._running = False
+        if self._writer and self._writer.is_alive():
+            self._writer.join(timeout=0.2)
+        self._writer = None
+        if self.ser:
+            if self.protocol:
+                self._release_firmware()
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+        self.ser = None
+        self.baud = 0
+        self.encoding = "legacy"
+        self.report_step = 127
+        self.report_s = SERIAL_HID_REPORT_S
+        self.caps = None
+        self.protocol = False
+        self.credits = None
+        self.firmware_stats = None
+        self.clock = None
+        self.playout_us = 0
+        self._stamping = False
+        self._time_sent = None
+        self._call(self.on_connected, False)
+
+    def _release_firmware(self):
+        # put the firmware back on 2-byte packets at the boot rate, where the next open starts;
+        # boards that reset when the port opens do this anyway, a USB-UART bridge does not
+        try:
+            self.ser.timeout = 0.01
+            # credit frames would read as errors while the new rate is verified
+            if self.credits is not None:
+                serial_probe.request(self.ser, OP_CREDIT, b"\x00")
+            if self.encoding != "legacy":
+                serial_probe.request(self.ser, OP_ENCODING, bytes((ENCODINGS["legacy"],)))
+            if self.ser.baudrate != SERIAL_BOOT_BAUD:
+                serial_probe.apply_baud(self.ser, SERIAL_BOOT_BAUD)
+        except Exception:
+            pass
+
+    def set_staleness(self, stale_ms: float, policy: str = SERIAL_STALE_POLICY):
+        # read by the writer on every pass, so it applies to a running link
+        if policy not in STALE_POLICIES:
+            raise ValueError(f"unknown stale policy {policy!r}")
+        self.stale_policy = policy
+        self.stale_ms = max(0.0, stale_ms)
+
+    def start_probe(self, port: str, candidates=SERIAL_BAUD_CANDIDATES) -> bool:
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return False
+        self.close()
+        self._probe_thread = threading.Thread(target=self._probe, args=(port, tuple(candidates)), daemon=True)
+        self._probe_thread.start()
+        return True
+
+    def _probe(self, port: str, candidates):
+        result = {"port": port, "best": None, "runs": [], "error": None}
+        try:
+            require_auth()
+            ser = self._port_factory(port=port, baudrate=SERIAL_BOOT_BAUD, timeout=0.01, write_timeout=1)
+            try:
+                best, runs = serial_probe.probe_baud(ser, candidates)
+            finally:
+                ser.close()
+            result["best"] = best
+            result["runs"] = [r.to_dict() for r in runs]
+        except Exception as e:
+            result["error"] = str(e)
+        self._call(self.on_probe, result)
+
+    def send_delta(self, dx: int, dy: int):
+        if not self._running or not self.ser:
+            return
+        try:
+            require_auth()
+        except Exception:
+            return
+        clamp = clamp_delta if self.encoding == "legacy" else clamp_compact
+        try:
+            # the enqueue time drives both the staleness deadline and the playout stamp
+            self._q.put_nowait((clamp(dx), clamp(dy), time.perf_counter()))
+        except queue.Full:
+            self.dropped += 1
+            RECORDER.mark("serial.queue_full")
+            return
+        RECORDER.mark("serial.enqueue")
+
+    def _budget(self) -> int:
+        if self.credits is not None:
+            return self.credits.credit
+        # no device feedback: keep at most a couple of HID intervals of wire time in the OS buffer
+        try:
+            waiting = self.ser.out_waiting
+        except Exception:
+            waiting = 0
+        buffer_s = SERIAL_OS_BUFFER_MS / 1000 * self.report_s / SERIAL_HID_REPORT_S
+        return max(0, int(self.baud / 10 * buffer_s) - waiting)
+
+    def _read_replies(self, reader: FrameReader):
+        try:
+            data = self.ser.read(self.ser.in_waiting or 0)
+        except Exception:
+            return False, []
+        progressed = False
+        pongs = []
+        for op, payload in reader.feed(data):
+            if op == reply_op(OP_CREDIT):
+                if self.credits is not None and self.credits.on_report(payload):
+                    progressed = True
+            elif op == reply_op(OP_PROBE):
+                pongs.append(payload)
+            elif op == reply_op(OP_TIME):
+                got = decode_time(payload)
+                if got is not None and self.clock is not None and self._time_sent is not None:
+                    self.clock.add(self._time_sent, time.perf_counter(), got)
+                    self._time_sent = None
+            elif op == reply_op(OP_STATS):
+                self.firmware_stats = decode_stats(payload) or self.firmware_stats
+        return progressed, pongs
+
+    def _writer_loop(self):
+        stats = {"packets": 0, "bytes": 0, "coalesced": 0, "expired": 0, "short_writes": 0, "credit_waits": 0}
+        last = time.time()
+        reader = FrameReader()
+        held: list = []
+        held_n = 0
+        held_at = 0.0
+        pending = b""
+        last_credit = time.monotonic()
+        # an in-band probe once per interval gives the link round trip while forwarding
+        ping_seq = 0
+        ping_at = None
+        ping_last = time.perf_counter()
+        ping_due = False
+        rtt = None
+        dropped = self.dropped
+        legacy = self.encoding == "legacy"
+        clock = self.clock
+        # stamps finer than one HID interval would only cost bytes
+        quantum = max(1, self.caps.hid_interval_us if self.caps else 1000)
+
+        def encode_timed(moves):
+            return encode_compact_timed([(m[0], m[1], clock.device_us(m[2]) // quantum * quantum)
+                                         for m in moves])
+        if legacy:
+            encode = encode_legacy
+        elif self._stamping and clock is not None:
+            encode = encode_timed
+        else:
+            encode = encode_compact
+        limit = 127 if legacy else COMPACT_LIMIT
+        # nothing held back can leave the firmware sooner than its next HID report
+        hold_s = self.report_s
+        stats_cmd = encode_command(OP_STATS) if self.caps is not None and self.caps.has(CAP_STATS) else b""
+        # re-sync the clock with every ping so drift never builds up
+        time_cmd = encode_command(OP_TIME) if clock is not None else b""
+        while self._running and self.ser:
+            waiting = bool(held or pending or ping_at)
+            try:
+                batch = [self._q.get(timeout=hold_s if waiting else 0.01)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < 256:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            if self.stale_ms > 0 and (held or batch):
+                deadline = time.perf_counter() - self.stale_ms / 1000.0
+                if (held or batch)[0][2] < deadline:
+                    kept, n = expire(held + batch, deadline, self.stale_policy, limit)
+                    stats["expired"] += n
+                    if kept and not held:
+                        held_at = time.perf_counter()
+                    held, held_n, batch = kept, (held_n + len(batch)) if kept else 0, []
+            now = time.time()
+            if now - last >= 1.0:
+                self._call(self.on_stats, stats["packets"])
+                link = dict(stats)
+                link["dropped"], dropped = self.dropped - dropped, self.dropped
+                if rtt is not None:
+                    link["rtt_ms"] = round(rtt, 2)
+                if self.credits is not None:
+                    link.update(in_flight=self.credits.in_flight, window=self.credits.window,
+                                resyncs=self.credits.resyncs)
+                if self.firmware_stats is not None:
+                    link["firmware"] = dict(self.firmware_stats)
+                self._call(self.on_link_stats, link)
+                for k in stats:
+                    stats[k] = 0
+                last = now
+            if ping_at is not None and time.perf_counter() - ping_at[1] >= SERIAL_PING_S:
+                # lost on the wire; stop waiting on it and let the next interval retry
+                ping_at = None
+            if self.protocol and time.perf_counter() - ping_last >= SERIAL_PING_S:
+                ping_due = True
+            if self.credits is not None or ping_at is not None:
+                progressed, pongs = self._read_replies(reader)
+                for payload in pongs:
+                    if ping_at is not None and payload == ping_at[0]:
+                        rtt = (time.perf_counter() - ping_at[1]) * 1000.0
+                        ping_at = None
+                if self.credits is not None:
+                    if progressed or not self.credits.in_flight:
+                        last_credit = time.monotonic()
+                    elif time.monotonic() - last_credit > SERIAL_CREDIT_STALL_S:
+                        self.credits.resync()
+                        last_credit = time.monotonic()
+            if not (batch or held or pending or ping_due):
+                continue
+            budget = total = self._budget()
+            out = b""
+            if pending:
+                out, pending = pending[:budget], pending[budget:]
+                budget -= len(out)
+            moves = held + batch
+            if moves and not pending:
+                data = encode(moves)
+                if len(data) > budget:
+                    merged = coalesce(moves, limit)
+                    data = encode(merged)
+                    stats["coalesced"] += len(moves) - len(merged)
+                    moves = merged
+                k = len(moves)
+                while k and len(data) > budget:
+                    # even merged motion can outgrow the window; send the part that fits
+                    k //= 2
+                    data = encode(moves[:k])
+                if k:
+                    out += data
+                if k == len(moves):
+                    stats["packets"] += held_n + len(batch)
+                    if held:
+                        RECORDER.span("serial.held", held_at)
+                        RECORDER.check_latency("serial.held", (time.perf_counter() - held_at) * 1000.0)
+                    held, held_n = [], 0
+                else:
+                    stats["credit_waits"] += 1
+                    if not held:
+                        held_at = time.perf_counter()
+                    held, held_n = moves[k:], held_n + len(batch)
+            elif batch:
+                merged = coalesce(moves, limit)
+                stats["coalesced"] += len(moves) - len(merged)
+                if not held:
+                    held_at = time.perf_counter()
+                held, held_n = merged, held_n + len(batch)
+            ping = b""
+            if ping_due and not pending:
+                body = (ping_seq & 0xFFFF).to_bytes(2, "little")
+                # firmware counters ride along with the ping and are answered first
+                cmd = stats_cmd + time_cmd + encode_command(OP_PROBE, body)
+                if len(out) + len(cmd) <= total:
+                    out += cmd
+                    ping = body
+            if not out:
+                continue
+            t_write = time.perf_counter()
+            if ping:
+                ping_at = (ping, t_write)
+                if time_cmd:
+                    self._time_sent = t_write
+                ping_last = t_write
+                ping_seq += 1
+                ping_due = False
+            try:
+                n = self.ser.write(out)
+            except Exception:
+                self.close()
+                break
+            n = len(out) if n is None else n
+            RECORDER.span("serial.write", t_write, args=n)
+            if n < len(out):
+                # the remainder is mid-token, so it has to go out before anything new
+                stats["short_writes"] += 1
+                pending = out[n:] + pending
+            stats["bytes"] += n
+            if self.credits is not None:
+                self.credits.on_sent(n)
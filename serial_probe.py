@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import struct
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from constants import (
+    SERIAL_BOOT_BAUD,
+    SERIAL_BAUD_CANDIDATES,
+    SERIAL_PROBE_PACKETS,
+    SERIAL_PROBE_PAYLOAD,
+    SERIAL_PROBE_REVERT_MS,
+)
+from pipeline_stats import LatencyHistogram
+from serial_protocol import (
+    OP_BAUD,
+    OP_PROBE,
+    OP_COMMIT,
+    OP_REVERT,
+    FrameReader,
+    encode_command,
+    reply_op,
+)
+
+class ProbeRun:
+    def __init__(self, baud: int):
+        self.baud = baud
+        self.switched = False
+        self.sent = 0
+        self.ok = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.rtt = LatencyHistogram()
+
+    @property
+    def clean(self) -> bool:
+        return self.switched and self.sent > 0 and self.ok == self.sent and not self.errors
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self.ok * SERIAL_PROBE_PAYLOAD / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "baud": self.baud,
+            "switched": self.switched,
+            "sent": self.sent,
+            "ok": self.ok,
+            "errors": self.errors,
+            "clean": self.clean,
+            "bytes_per_s": round(self.bytes_per_s, 1),
+            "rtt_ms": self.rtt.summary(),
+        }
+
+def _await_reply(ser, reader: FrameReader, op: int, timeout: float) -> Optional[bytes]:
+    want = reply_op(op)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        data = ser.read(ser.in_waiting or 1)
+        for got, payload in reader.feed(data):
+            if got == want:
+                return payload
+    return None
+
+def request(ser, op: int, payload: bytes = b"", timeout: float = 0.3, attempts: int = 3) -> Optional[bytes]:
+    for _ in range(attempts):
+        reader = FrameReader()
+        ser.reset_input_buffer()
+        ser.write(encode_command(op, payload))
+        got = _await_reply(ser, reader, op, timeout / attempts)
+        if got is not None:
+            return got
+    return None
+
+def measure(ser, packets: int = SERIAL_PROBE_PACKETS, window: int = 4, run: Optional[ProbeRun] = None) -> ProbeRun:
+    run = run or ProbeRun(ser.baudrate)
+    reader = FrameReader()
+    ser.reset_input_buffer()
+    pending = {}
+    seq = 0
+    t0 = time.perf_counter()
+    idle_deadline = t0 + 0.5
+    while (seq < packets or pending) and time.perf_counter() < idle_deadline:
+        while seq < packets and len(pending) < window:
+            body = struct.pack("<H", seq) + os.urandom(SERIAL_PROBE_PAYLOAD - 2)
+            pending[seq] = (time.perf_counter(), body)
+            ser.write(encode_command(OP_PROBE, body))
+            run.sent += 1
+            seq += 1
+        data = ser.read(ser.in_waiting or 1)
+        now = time.perf_counter()
+        for op, payload in reader.feed(data):
+            if op != reply_op(OP_PROBE) or len(payload) < 2:
+                run.errors += 1
+                continue
+            key = struct.unpack_from("<H", payload)[0]
+            sent = pending.pop(key, None)
+            if sent is None or sent[1] != payload:
+                run.errors += 1
+                continue
+            run.ok += 1
+            run.rtt.add((now - sent[0]) * 1000.0)
+            idle_deadline = now + 0.5
+        # a lost frame stalls the window; count it and move on
+        for key, (t, _) in list(pending.items()):
+            if now - t > 0.25:
+                pending.pop(key)
+                run.errors += 1
+    run.errors += reader.bad + len(pending)
+    run.seconds = time.perf_counter() - t0
+    return run
+
+def switch_baud(ser, baud: int, verify: int = 16) -> Tuple[bool, ProbeRun]:
+    base = ser.baudrate
+    run = ProbeRun(baud)
+    if request(ser, OP_BAUD, struct.pack("<I", baud)) is None:
+        return False, run
+    ser.baudrate = baud
+    time.sleep(0.01)
+    run.switched = True
+    measure(ser, verify, run=run)
+    if run.clean and request(ser, OP_COMMIT) is not None:
+        return True, run
+    run.errors = max(run.errors, 1)
+    request(ser, OP_REVERT, timeout=0.1, attempts=1)
+    ser.baudrate = base
+    time.sleep(SERIAL_PROBE_REVERT_MS / 1000.0 + 0.1)
+    ser.reset_input_buffer()
+    return False, run
+
+def probe_baud(ser, candidates: Sequence[int] = SERIAL_BAUD_CANDIDATES,
+               packets: int = SERIAL_PROBE_PACKETS) -> Tuple[Optional[int], List[ProbeRun]]:
+    runs: List[ProbeRun] = []
+    base = ser.baudrate
+    for baud in candidates:
+        run = ProbeRun(baud)
+        if baud == ser.baudrate:
+            run.switched = True
+            measure(ser, packets, run=run)
+        else:
+            ok, run = switch_baud(ser, baud)
+            if ok:
+                measure(ser, packets, run=run)
+        runs.append(run)
+        if ser.baudrate != base:
+            ok, _ = switch_baud(ser, base)
+            if not ok:
+                ser.baudrate = base
+    clean = [r for r in runs if r.clean]
+    if not clean:
+        return None, runs
+    best = max(clean, key=lambda r: (round(r.bytes_per_s, -2), -r.rtt.percentile(0.95)))
+    return best.baud, runs
+
+def apply_baud(ser, baud: int) -> bool:
+    if ser.baudrate == baud:
+        return True
+    ok, _ = switch_baud(ser, baud)
+    return ok
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Probe serial link throughput per baud rate against ControlMouse firmware.")
+    ap.add_argument("--port", help="serial port; omit to run against the emulated device")
+    ap.add_argument("--max-baud", type=int, default=1000000, help="emulated device: fastest error-free rate")
+    ap.add_argument("--packets", type=int, default=SERIAL_PROBE_PACKETS)
+    ap.add_argument("--baud", type=int, action="append", help="candidate rate, repeatable")
+    args = ap.parse_args(argv)
+    if args.port:
+        import serial
+        ser = serial.Serial(port=args.port, baudrate=SERIAL_BOOT_BAUD, timeout=0.05, write_timeout=1)
+    else:
+        from serial_emulator import EmulatedSerial
+        ser = EmulatedSerial(max_baud=args.max_baud)
+    try:
+        best, runs = probe_baud(ser, args.baud or SERIAL_BAUD_CANDIDATES, args.packets)
+    finally:
+        ser.close()
+    print(json.dumps({"best": best, "runs": [r.to_dict() for r in runs]}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from typing import List, Tuple
+
+ESC = 0x80
+SYNC = 0xA5
+MAX_PAYLOAD = 64
+
+OP_BAUD = ord("B")
+OP_PROBE = ord("P")
+OP_COMMIT = ord("C")
+OP_REVERT = ord("R")
+OP_ENCODING = ord("E")
+OP_CREDIT = ord("K")
+OP_STATS = ord("S")
+OP_HID = ord("H")
+OP_CAPS = ord("V")
+OP_TIME = ord("T")
+OP_PLAYOUT = ord("L")
+OP_NAK = ord("!")
+
+def checksum(op: int, payload: bytes) -> int:
+    return (op + len(payload) + sum(payload)) & 0xFF
+
+def _frame(lead: int, op: int, payload: bytes) -> bytes:
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"payload too long ({len(payload)} > {MAX_PAYLOAD})")
+    return bytes((lead, op, len(payload))) + payload + bytes((checksum(op, payload),))
+
+def encode_command(op: int, payload: bytes = b"") -> bytes:
+    return _frame(ESC, op, bytes(payload))
+
+def encode_reply(op: int, payload: bytes = b"") -> bytes:
+    return _frame(SYNC, op, bytes(payload))
+
+def reply_op(op: int) -> int:
+    return ord(chr(op).lower())
+
+def clamp_delta(v: int) -> int:
+    # -128 would put ESC on the wire as the first byte of a move
+    return 127 if v > 127 else (-127 if v < -127 else v)
+
+class FrameReader:
+    def __init__(self, lead: int = SYNC):
+        self._lead = lead
+        self._buf = bytearray()
+        self.bad = 0
+
+    def reset(self):
+        self._buf.clear()
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        self._buf += data
+        out: List[Tuple[int, bytes]] = []
+        buf = self._buf
+        while True:
+            start = buf.find(self._lead)
+            if start < 0:
+                buf.clear()
+                break
+            if start:
+                del buf[:start]
+            if len(buf) < 3:
+                break
+            op, n = buf[1], buf[2]
+            if n > MAX_PAYLOAD:
+                self.bad += 1
+                del buf[:1]
+                continue
+            if len(buf) < 4 + n:
+                break
+            payload = bytes(buf[3:3 + n])
+            if buf[3 + n] != checksum(op, payload):
+                self.bad += 1
+                del buf[:1]
+                continue
+            out.append((op, payload))
+            del buf[:4 + n]
+        return out
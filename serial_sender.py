@@ -1,79 +1,61 @@
-import struct
-import threading
-import queue
-import time
-import serial
 from PySide6 import QtCore
-from auth_guard import require_auth
+from constants import SERIAL_BOOT_BAUD, SERIAL_BAUD_CANDIDATES, SERIAL_ENCODING, SERIAL_PLAYOUT_MS, SERIAL_STALE_POLICY
+from serial_link import SerialLink
 
 class SerialSender(QtCore.QObject):
     connectedChanged = QtCore.Signal(bool)
     statsUpdated = QtCore.Signal(int)
+    linkStatsUpdated = QtCore.Signal(object)
+    probeFinished = QtCore.Signal(object)
 
-    def __init__(self):
+    def __init__(self, port_factory=None, link: SerialLink | None = None):
         super().__init__()
-        self.ser = None
-        self._q = queue.Queue(maxsize=4096)
-        self._running = False
-        self._writer = None
+        self.link = link or SerialLink(port_factory)
+        self.link.on_connected = self.connectedChanged.emit
+        self.link.on_stats = self.statsUpdated.emit
+        self.link.on_link_stats = self.linkStatsUpdated.emit
+        self.link.on_probe = self.probeFinished.emit
 
-    def open(self, port: str, baud: int = 1000000):
-        self.close()
-        try:
-            require_auth()
-            self.ser = serial.Serial(port=port, baudrate=baud, timeout=0, write_timeout=0)
-            self._running = True
-            self._writer = threading.Thread(target=self._writer_loop, daemon=True)
-            self._writer.start()
-            self.connectedChanged.emit(True)
-            return True
-        except Exception:
-            self.close()
-            return False
+    @property
+    def ser(self):
+        return self.link.ser
+
+    @property
+    def baud(self) -> int:
+        return self.link.baud
+
+    @property
+    def encoding(self) -> str:
+        return self.link.encoding
+
+    @property
+    def report_step(self) -> int:
+        return self.link.report_step
+
+    @property
+    def caps(self):
+        return self.link.caps
+
+    @property
+    def playout_us(self) -> int:
+        return self.link.playout_us
+
+    @property
+    def credits(self):
+        return self.link.credits
+
+    def open(self, port: str, baud: int = SERIAL_BOOT_BAUD, target_baud: int | None = None,
+             encoding: str = SERIAL_ENCODING, playout_ms: float = SERIAL_PLAYOUT_MS):
+        return self.link.open(port, baud, target_baud, encoding, playout_ms)
 
     def close(self):
-        self._running = False
-        if self._writer and self._writer.is_alive():
-            self._writer.join(timeout=0.2)
-        self._writer = None
-        if self.ser:
-            try:
-                self.ser.close()
-            except Exception:
-                pass
-        self.ser = None
-        self.connectedChanged.emit(False)
+        self.link.close()
 
-    def send_delta(self, dx: int, dy: int):
-        if not self._running or not self.ser:
-            return
-        try:
-            require_auth()
-        except Exception:
-            return
-        dx = 127 if dx > 127 else (-128 if dx < -128 else dx)
-        dy = 127 if dy > 127 else (-128 if dy < -128 else dy)
-        try:
-            self._q.put_nowait(struct.pack('bb', dx, dy))
-        except queue.Full:
-            pass
+    def set_staleness(self, stale_ms: float, policy: str = SERIAL_STALE_POLICY):
+        self.link.set_staleness(stale_ms, policy)
 
-    def _writer_loop(self):
-        sent = 0
-        last = time.time()
-        while self._running and self.ser:
-            try:
-                pkt = self._q.get(timeout=0.01)
-            except queue.Empty:
-                now = time.time()
-                if now - last >= 1.0:
-                    self.statsUpdated.emit(sent)
-                    sent = 0
-                    last = now
-                continue
-            try:
-                self.ser.write(pkt)
-                sent += 1
-            except Exception:
-                self.close()
-                break
+    def start_probe(self, port: str, candidates=SERIAL_BAUD_CANDIDATES) -> bool:
+        return self.link.start_probe(port, candidates)
+
+    def send_delta(self, dx: int, dy: int):
+        self.link.send_delta(dx, dy)
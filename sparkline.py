@@ -0,0 +1,125 @@
+import math
+import os
+import time
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from constants import HISTORY_WINDOWS
+from metrics_history import MetricsHistory
+
+class Sparkline(QtWidgets.QWidget):
+    def __init__(self, history: MetricsHistory, name: str, label: str, fmt: str = "{:.0f}", peak: bool = False, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.name = name
+        self.label = label
+        self.fmt = fmt
+        self.peak = peak
+        self.seconds = 600
+        self.setMinimumHeight(34)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+
+    def _columns(self, width: int):
+        _step, vals = self.history.window(self.name, self.seconds, self.peak)
+        if not vals or width <= 0:
+            return []
+        if len(vals) <= width:
+            return vals
+        # one column per pixel; the max keeps short spikes visible
+        per = len(vals) / width
+        cols = []
+        for i in range(width):
+            chunk = [v for v in vals[int(i * per):int((i + 1) * per)] if v == v]
+            cols.append(max(chunk) if chunk else math.nan)
+        return cols
+
+    def paintEvent(self, event):
+        p = QtGui.QPainter(self)
+        p.setRenderHint(QtGui.QPainter.Antialiasing)
+        r = self.rect().adjusted(0, 0, -1, -1)
+        p.fillRect(r, QtGui.QColor("#0b0d12"))
+        p.setPen(QtGui.QColor("#2a2f3a"))
+        p.drawRect(r)
+        text_w = 150
+        plot = r.adjusted(text_w, 3, -3, -3)
+        cols = self._columns(plot.width())
+        finite = [v for v in cols if v == v]
+        hi = max(finite) if finite else 0.0
+        if finite:
+            scale = (plot.height() - 1) / hi if hi > 0 else 0.0
+            dx = plot.width() / max(1, len(cols) - 1)
+            path = QtGui.QPainterPath()
+            pen_down = False
+            for i, v in enumerate(cols):
+                if v != v:
+                    pen_down = False
+                    continue
+                pt = QtCore.QPointF(plot.left() + i * dx, plot.bottom() - v * scale)
+                if pen_down:
+                    path.lineTo(pt)
+                else:
+                    path.moveTo(pt)
+                    pen_down = True
+            p.setPen(QtGui.QPen(QtGui.QColor("#5aa9ff"), 1.2))
+            p.drawPath(path)
+        last = next((v for v in reversed(cols) if v == v), math.nan)
+        p.setPen(QtGui.QColor("#a9b1c7"))
+        text = f"{self.label}  {self.fmt.format(last) if last == last else '–'}"
+        if finite:
+            text += f"\nmax {self.fmt.format(hi)}"
+        p.drawText(r.adjusted(6, 0, 0, 0), QtCore.Qt.AlignVCenter | QtCore.Qt.AlignLeft, text)
+        p.end()
+
+class HistoryPanel(QtWidgets.QGroupBox):
+    # a stack of sparklines over a shared window with CSV export of the whole history
+    def __init__(self, history: MetricsHistory, lines, title: str = "History", parent=None):
+        super().__init__(title, parent)
+        self.history = history
+        v = QtWidgets.QVBoxLayout(self)
+        v.setSpacing(2)
+        top = QtWidgets.QHBoxLayout()
+        self.windowCombo = QtWidgets.QComboBox()
+        for seconds, label in HISTORY_WINDOWS:
+            self.windowCombo.addItem(label, seconds)
+        self.windowCombo.setCurrentIndex(1)
+        self.exportBtn = QtWidgets.QPushButton("Export CSV…")
+        top.addWidget(QtWidgets.QLabel("Window:"))
+        top.addWidget(self.windowCombo)
+        top.addStretch(1)
+        top.addWidget(self.exportBtn)
+        v.addLayout(top)
+        self.lines = []
+        for spec in lines:
+            line = Sparkline(history, *spec)
+            self.lines.append(line)
+            v.addWidget(line)
+        self.windowCombo.currentIndexChanged.connect(self._on_window_changed)
+        self.exportBtn.clicked.connect(self._export)
+        self._on_window_changed()
+
+    def _on_window_changed(self, _i=None):
+        seconds = int(self.windowCombo.currentData())
+        for line in self.lines:
+            line.seconds = seconds
+            line.setToolTip(f"{line.label} over the last {self.windowCombo.currentText()}")
+            line.update()
+
+    def refresh(self):
+        if self.isVisible():
+            for line in self.lines:
+                line.update()
+
+    def _export(self):
+        seconds = int(self.windowCombo.currentData())
+        name = time.strftime("mousefwd-history-%Y%m%d-%H%M%S.csv")
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export history", os.path.join(os.path.expanduser("~"), name), "CSV (*.csv)")
+        if not path:
+            return
+        try:
+            n = self.history.export_csv(path, seconds)
+        except OSError as e:
+            QtWidgets.QMessageBox.warning(self, "Export failed", str(e))
+            return
+        win = self.window()
+        if isinstance(win, QtWidgets.QMainWindow):
+            win.statusBar().showMessage(f"Wrote {n} rows to {path}", 5000)
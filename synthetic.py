@@ -0,0 +1,250 @@
+import asyncio
+import time
+from fractions import Fraction
+from typing import List, Optional
+
+PATTERNS = ("gradient", "bars", "box", "noise")
+PIX_FMTS = ("rgb24", "bgr24", "yuv420p")
+VIDEO_TIME_BASE = Fraction(1, 90000)
+_CACHE_BUDGET = 64 * 1024 * 1024
+
+def _rgb_to_yuv420p(rgb):
+    import numpy as np  # type: ignore
+    f = rgb.astype(np.float32)
+    r, g, b = f[..., 0], f[..., 1], f[..., 2]
+    y = 16 + 0.257 * r + 0.504 * g + 0.098 * b
+    u = 128 - 0.148 * r - 0.291 * g + 0.439 * b
+    v = 128 + 0.439 * r - 0.368 * g - 0.071 * b
+    h, w = y.shape
+    u = u.reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))
+    v = v.reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))
+    planes = [np.clip(p, 0, 255).astype(np.uint8).reshape(-1) for p in (y, u, v)]
+    return np.concatenate(planes).reshape(h * 3 // 2, w)
+
+def _yuv420p_to_rgb(yuv, w: int, h: int):
+    import numpy as np  # type: ignore
+    flat = yuv.reshape(-1)
+    y = flat[: w * h].reshape(h, w).astype(np.float32) - 16.0
+    u = flat[w * h: w * h * 5 // 4].reshape(h // 2, w // 2).astype(np.float32) - 128.0
+    v = flat[w * h * 5 // 4:].reshape(h // 2, w // 2).astype(np.float32) - 128.0
+    u = u.repeat(2, axis=0).repeat(2, axis=1)
+    v = v.repeat(2, axis=0).repeat(2, axis=1)
+    y *= 1.164
+    out = np.empty((h, w, 3), dtype=np.uint8)
+    out[..., 0] = np.clip(y + 1.596 * v, 0, 255)
+    out[..., 1] = np.clip(y - 0.392 * u - 0.813 * v, 0, 255)
+    out[..., 2] = np.clip(y + 2.017 * u, 0, 255)
+    return out
+
+class SyntheticFrame:
+    def __init__(self, data, width: int, height: int, fmt: str):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.format_name = fmt
+        self.pts: Optional[int] = None
+        self.time_base = VIDEO_TIME_BASE
+
+    def to_ndarray(self, format: Optional[str] = None):
+        fmt = format or self.format_name
+        if fmt == self.format_name:
+            return self.data.copy()
+        if self.format_name == "yuv420p":
+            rgb = _yuv420p_to_rgb(self.data, self.width, self.height)
+        elif self.format_name == "bgr24":
+            rgb = self.data[..., ::-1]
+        else:
+            rgb = self.data
+        if fmt == "rgb24":
+            return rgb.copy() if rgb is self.data else rgb
+        if fmt == "bgr24":
+            return rgb[..., ::-1].copy()
+        if fmt == "yuv420p":
+            return _rgb_to_yuv420p(rgb)
+        raise ValueError(f"Unsupported format: {fmt}")
+
+def render_pattern(pattern: str, w: int, h: int, i: int, n: int):
+    import numpy as np  # type: ignore
+    phase = i / max(1, n)
+    if pattern == "noise":
+        return np.random.default_rng(i).integers(0, 256, (h, w, 3), dtype=np.uint8)
+    if pattern == "bars":
+        colors = np.array([
+            [192, 192, 192], [192, 192, 0], [0, 192, 192], [0, 192, 0],
+            [192, 0, 192], [192, 0, 0], [0, 0, 192], [16, 16, 16],
+        ], dtype=np.uint8)
+        cols = (np.arange(w) * len(colors) // w + int(phase * len(colors) * 8)) % len(colors)
+        return np.broadcast_to(colors[cols][None, :, :], (h, w, 3)).copy()
+    if pattern == "box":
+        img = np.full((h, w, 3), 24, dtype=np.uint8)
+        size = max(8, min(w, h) // 6)
+        x = int((w - size) * (0.5 + 0.5 * np.sin(2 * np.pi * phase)))
+        y = int((h - size) * (0.5 + 0.5 * np.cos(2 * np.pi * phase)))
+        img[y:y + size, x:x + size] = 235
+        return img
+    xs = np.linspace(0.0, 1.0, w, dtype=np.float32)[None, :]
+    ys = np.linspace(0.0, 1.0, h, dtype=np.float32)[:, None]
+    t = (xs + ys) * 0.5 + phase
+    img = np.empty((h, w, 3), dtype=np.uint8)
+    img[..., 0] = (127.5 + 127.5 * np.sin(2 * np.pi * t)).astype(np.uint8)
+    img[..., 1] = (127.5 + 127.5 * np.sin(2 * np.pi * (t + 1 / 3))).astype(np.uint8)
+    img[..., 2] = (127.5 + 127.5 * np.sin(2 * np.pi * (t + 2 / 3))).astype(np.uint8)
+    return img
+
+class SyntheticTrack:
+    kind = "video"
+
+    def __init__(self, width: int = 640, height: int = 360, fps: float = 30.0, pix_fmt: str = "yuv420p",
+                 pattern: str = "gradient", loop_frames: int = 60, use_av: bool = True):
+        if pix_fmt not in PIX_FMTS:
+            raise ValueError(f"Unsupported pixel format: {pix_fmt}")
+        if pattern not in PATTERNS:
+            raise ValueError(f"Unknown pattern: {pattern}")
+        self.width = max(2, int(width) & ~1)
+        self.height = max(2, int(height) & ~1)
+        self.fps = max(0.0, float(fps))
+        self.pix_fmt = pix_fmt
+        self.pattern = pattern
+        self._loop_frames = max(1, int(loop_frames))
+        self._use_av = use_av
+        self._frames: List = []
+        self._n = 0
+        self._t0: Optional[float] = None
+        self._stopped = False
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "SyntheticTrack":
+        return cls(
+            width=cfg.get("width", 640),
+            height=cfg.get("height", 360),
+            fps=cfg.get("fps", 30.0),
+            pix_fmt=cfg.get("pix_fmt", "yuv420p"),
+            pattern=cfg.get("pattern", "gradient"),
+        )
+
+    @property
+    def frames_sent(self) -> int:
+        return self._n
+
+    def prepare(self):
+        if self._frames:
+            return
+        frame_bytes = self.width * self.height * 3
+        n = max(1, min(self._loop_frames, _CACHE_BUDGET // max(1, frame_bytes)))
+        if self.pattern == "noise":
+            n = max(n, 2)
+        av_frame = None
+        if self._use_av:
+            try:
+                from av import VideoFrame as av_frame  # type: ignore
+            except Exception:
+                av_frame = None
+        for i in range(n):
+            rgb = render_pattern(self.pattern, self.width, self.height, i, n)
+            if self.pix_fmt == "yuv420p":
+                data = _rgb_to_yuv420p(rgb)
+            elif self.pix_fmt == "bgr24":
+                data = rgb[..., ::-1].copy()
+            else:
+                data = rgb
+            if av_frame is not None:
+                self._frames.append(av_frame.from_ndarray(data, format=self.pix_fmt))
+            else:
+                self._frames.append(SyntheticFrame(data, self.width, self.height, self.pix_fmt))
+
+    async def recv(self):
+        if self._stopped:
+            raise asyncio.CancelledError()
+        if not self._frames:
+            await asyncio.get_running_loop().run_in_executor(None, self.prepare)
+        now = time.perf_counter()
+        if self._t0 is None:
+            self._t0 = now
+        if self.fps > 0:
+            due = self._t0 + self._n / self.fps
+            if due > now:
+                await asyncio.sleep(due - now)
+            pts = int(self._n * 90000 / self.fps)
+        else:
+            await asyncio.sleep(0)
+            pts = int((time.perf_counter() - self._t0) * 90000)
+        frame = self._frames[self._n % len(self._frames)]
+        frame.pts = pts
+        frame.time_base = VIDEO_TIME_BASE
+        self._n += 1
+        return frame
+
+    def stop(self):
+        self._stopped = True
+        self._frames = []
+
+class _BenchSink:
+    def __init__(self, stats):
+        self._stats = stats
+        self.frames = 0
+
+    def status(self, text: str):
+        pass
+
+    def urls(self, urls):
+        pass
+
+    def sessions(self, snaps):
+        pass
+
+    def transport(self, stats):
+        pass
+
+    def trace(self, events, names):
+        pass
+
+    def frame(self, arr, t_recv: float, t_crop: float):
+        from PySide6 import QtGui
+        h, w, ch = arr.shape
+        QtGui.QImage(arr.data, w, h, ch * w, QtGui.QImage.Format.Format_RGB888).copy()
+        self._stats.record("handoff", (time.perf_counter() - t_crop) * 1000.0)
+        self.frames += 1
+
+async def run_pipeline(track: SyntheticTrack, seconds: float, crop: Optional[tuple] = None) -> dict:
+    from pipeline_stats import PipelineStats
+    from whip_ingest import IngestWorker, WhipSession
+    stats = PipelineStats()
+    sink = _BenchSink(stats)
+    worker = IngestWorker(0, sink, stats)
+    worker.set_demand_async(0.0)
+    if crop:
+        worker.set_crop_config_async(True, 0, 0, crop[0], crop[1], True)
+    sess = WhipSession("bench", None, "synthetic")
+    track.prepare()
+    t0 = time.perf_counter()
+    task = asyncio.ensure_future(worker._consume_video(track, sess))
+    await asyncio.sleep(seconds)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    elapsed = time.perf_counter() - t0
+    return {
+        "frames": sink.frames,
+        "elapsed": round(elapsed, 3),
+        "fps": round(sink.frames / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_ms": stats.summary(),
+    }
+
+def main(argv=None):
+    import argparse
+    import json
+    ap = argparse.ArgumentParser(description="Drive the WHIP frame pipeline with synthetic video.")
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--fps", type=float, default=0.0, help="0 runs unpaced, as fast as the pipeline allows")
+    ap.add_argument("--pix-fmt", choices=PIX_FMTS, default="yuv420p")
+    ap.add_argument("--pattern", choices=PATTERNS, default="gradient")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--crop", help="center crop WxH, e.g. 320x320")
+    args = ap.parse_args(argv)
+    crop = tuple(int(v) for v in args.crop.lower().split("x")) if args.crop else None
+    track = SyntheticTrack(args.width, args.height, args.fps, args.pix_fmt, args.pattern)
+    result = asyncio.run(run_pipeline(track, args.seconds, crop))
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope="session")
+def build_c(tmp_path_factory):
+    # compiles a host driver against the firmware headers in the repo root
+    cc = os.environ.get("CC") or shutil.which("cc") or shutil.which("gcc") or shutil.which("clang")
+    if not cc:
+        pytest.skip("no C compiler found (set CC)")
+
+    def build(name: str, source: str, defines=()):
+        # returns run(lines): feeds one space-separated line per tuple, returns the output lines
+        tmp = tmp_path_factory.mktemp(name)
+        src = tmp / f"{name}.c"
+        exe = tmp / name
+        src.write_text(source)
+        r = subprocess.run([cc, "-std=c99", "-Wall", "-Werror", *(f"-D{d}" for d in defines),
+                            "-I", ROOT, str(src), "-o", str(exe)], capture_output=True, text=True)
+        assert r.returncode == 0, r.stderr
+
+        def run(lines) -> list:
+            feed = "".join(" ".join(str(v) for v in line) + "\n" for line in lines)
+            return subprocess.run([str(exe)], input=feed, capture_output=True, text=True,
+                                  check=True).stdout.splitlines()
+        return run
+    return build
@@ -0,0 +1,135 @@
+import struct
+from concurrent import futures
+from typing import List, Optional, Sequence
+
+import pytest
+
+from arduino_daemon import SERVICE, _STREAMS, ArduinoDaemon, DaemonError, _get, _msg, _parse, _text, parse_address
+
+class StubService:
+    # a local stand-in for the daemon: canned progress for every RPC the client uses,
+    # and a record of the decoded requests
+    def __init__(self, installed: Sequence[str] = ()):
+        self.installed = set(installed)
+        self.calls: List[tuple] = []
+        self._server = None
+        self.address: Optional[str] = None
+
+    def start(self) -> str:
+        import grpc
+        handlers = {"Create": grpc.unary_unary_rpc_method_handler(self._create),
+                    "PlatformSearch": grpc.unary_unary_rpc_method_handler(self._search)}
+        for name in _STREAMS:
+            handlers[name] = grpc.unary_stream_rpc_method_handler(self._streamer(name))
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        self._server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(SERVICE, handlers),))
+        port = self._server.add_insecure_port("127.0.0.1:0")
+        self._server.start()
+        self.address = f"127.0.0.1:{port}"
+        return self.address
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop(None)
+            self._server = None
+
+    def _create(self, request: bytes, context) -> bytes:
+        self.calls.append(("Create",))
+        return _msg((1, _msg((1, 1))))
+
+    def _search(self, request: bytes, context) -> bytes:
+        core = _text(_parse(request), 2)
+        self.calls.append(("PlatformSearch", core))
+        version = "1.0.0" if core in self.installed else ""
+        return _msg((1, _msg((1, _msg((1, core))), (3, version or None))))
+
+    def _streamer(self, name: str):
+        import grpc
+
+        def handler(request: bytes, context):
+            f = _parse(request)
+            self.calls.append((name, {k: [bytes(x) if isinstance(x, bytes) else x for x in v]
+                                      for k, v in f.items() if k != 1}))
+            spec = _STREAMS[name]
+            if name == "PlatformInstall":
+                self.installed.add(f"{_text(f, 2)}:{_text(f, 3)}")
+            if name == "Upload" and _text(_parse(_get(f, 4, b"")), 1) == "missing":
+                context.abort(grpc.StatusCode.NOT_FOUND, "port missing not found")
+            if "download" in spec:
+                yield _msg((spec["download"], _msg((1, _msg((1, "https://x"), (2, f"{name} pkg"))))))
+                yield _msg((spec["download"], _msg((2, _msg((1, 50), (2, 100))))))
+                yield _msg((spec["download"], _msg((3, _msg((1, True))))))
+            if "wrapped" in spec:
+                yield _msg((1, _msg((2, _msg((2, "Loading index"), (4, 50.0))))))
+            if "out" in spec:
+                # split mid-line to exercise the line reassembly
+                yield _msg((spec["out"], b"Sketch uses 1234 bytes\r\nGlobal var"))
+                yield _msg((spec["out"], b"iables use 56 bytes\n"))
+                yield _msg((spec["err"], b"warning: stub"))
+            if "task" in spec:
+                yield _msg((spec["task"], _msg((1, name), (4, 50.0))))
+                yield _msg((spec["task"], _msg((1, name), (3, True))))
+        return handler
+
+def test_parse_address():
+    assert parse_address('{"IP":"127.0.0.1","Port":"50051"}') == 50051
+    assert parse_address("Daemon is now listening on 127.0.0.1:4321") == 4321
+    assert parse_address("starting") is None
+
+def test_wire_round_trip():
+    assert _parse(_msg((1, 300), (2, "ab"), (3, 1.5), (4, -1))) == {
+        1: [300], 2: [b"ab"], 3: [struct.pack("<f", 1.5)], 4: [(1 << 64) - 1]}
+
+@pytest.fixture
+def daemon():
+    pytest.importorskip("grpc")
+    stub = StubService(installed=("arduino:sam",))
+    d = ArduinoDaemon()
+    try:
+        d.connect(stub.start(), timeout=5.0)
+        yield d, stub
+    finally:
+        d.close()
+        stub.stop()
+
+def test_connect_creates_and_loads_instance(daemon):
+    _, stub = daemon
+    assert [c[0] for c in stub.calls] == ["Create", "Init"]
+
+def test_core_install_reloads_instance(daemon):
+    d, stub = daemon
+    assert d.core_installed("arduino:sam")
+    assert not d.core_installed("arduino:avr")
+    events = list(d.core_install("arduino:avr"))
+    assert stub.calls[-1][0] == "Init"
+    assert d.core_installed("arduino:avr")
+    assert events[:3] == [{"kind": "progress", "percent": 0.0, "message": "PlatformInstall pkg"},
+                          {"kind": "progress", "percent": 50.0, "message": "PlatformInstall pkg"},
+                          {"kind": "progress", "percent": 100.0, "message": "PlatformInstall pkg"}]
+
+def test_compile_streams_lines_and_progress(daemon):
+    d, stub = daemon
+    events = list(d.compile("arduino:avr:leonardo", "/s/ControlMouse.ino", "/b", ["compiler.cpp.extra_flags=-DA=1"]))
+    assert [e for e in events if e["kind"] != "progress"] == [
+        {"kind": "out", "text": "Sketch uses 1234 bytes"},
+        {"kind": "out", "text": "Global variables use 56 bytes"},
+        {"kind": "err", "text": "warning: stub"}]
+    assert [e["percent"] for e in events if e["kind"] == "progress"] == [50.0, 100.0]
+    req = stub.calls[-1][1]
+    assert req.get(2) == [b"arduino:avr:leonardo"]
+    assert req.get(7) == [b"/b"]
+    assert req.get(8) == [b"compiler.cpp.extra_flags=-DA=1"]
+
+def test_upload_request_and_error(daemon):
+    d, stub = daemon
+    list(d.upload("arduino:avr:leonardo", "COM5", "/b/ControlMouse.ino.hex"))
+    req = stub.calls[-1][1]
+    assert _text(_parse(req[4][0]), 1) == "COM5"
+    assert req.get(7) == [b"/b/ControlMouse.ino.hex"]
+    with pytest.raises(DaemonError, match="port missing not found"):
+        list(d.upload("arduino:avr:leonardo", "missing", "/b/x.hex"))
+
+def test_start_without_cli_raises_daemon_error():
+    pytest.importorskip("grpc")
+    with pytest.raises(DaemonError):
+        ArduinoDaemon.start("/nonexistent/arduino-cli")
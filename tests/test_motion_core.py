@@ -0,0 +1,133 @@
+import random
+from typing import List, Tuple
+
+import pytest
+
+from motion_core import MOTION_LIMIT, MOTION_STEP, MOTION_STEP_WIDE, MotionAccumulator, Playout
+
+_U32 = 0xFFFFFFFF
+# a small ring so the scripts reach overflow
+_SLOTS = 8
+
+# reads "a dx dy run" / "t step" lines for the accumulator and "s stamped src now dx dy run" /
+# "r now" / "d delay" for the playout ring, and prints the state after each
+_DRIVER = r"""
+#include <stdio.h>
+#include "motion_core.h"
+
+int main(void) {
+  MotionAcc m;
+  static Playout p;
+  char op;
+  motionInit(&m);
+  playoutInit(&p);
+  while (scanf(" %c", &op) == 1) {
+    if (op == 'a') {
+      long dx, dy;
+      unsigned long run;
+      if (scanf("%ld %ld %lu", &dx, &dy, &run) != 3) return 2;
+      motionAdd(&m, (int32_t)dx, (int32_t)dy, (uint32_t)run);
+      printf("%ld %ld\n", (long)m.dx, (long)m.dy);
+    } else if (op == 's') {
+      unsigned stamped;
+      unsigned long src, now, run;
+      long dx, dy;
+      if (scanf("%u %lu %lu %ld %ld %lu", &stamped, &src, &now, &dx, &dy, &run) != 6) return 2;
+      playoutAdd(&p, &m, (uint8_t)stamped, (uint32_t)src, (uint32_t)now, (int32_t)dx, (int32_t)dy, (uint32_t)run);
+      printf("%ld %ld %u\n", (long)m.dx, (long)m.dy, p.count);
+    } else if (op == 'r' || op == 'd') {
+      unsigned long v;
+      if (scanf("%lu", &v) != 1) return 2;
+      if (op == 'r') playoutRelease(&p, &m, (uint32_t)v);
+      else playoutSetDelay(&p, &m, (uint32_t)v);
+      printf("%ld %ld %u\n", (long)m.dx, (long)m.dy, p.count);
+    } else {
+      int step;
+      int16_t sx = 0, sy = 0;
+      if (scanf("%d", &step) != 1) return 2;
+      uint8_t got = motionTake(&m, (int16_t)step, &sx, &sy);
+      printf("%u %d %d\n", got, sx, sy);
+    }
+  }
+  printf("%lu %lu %lu\n", (unsigned long)m.moves, (unsigned long)m.reports, (unsigned long)m.clipped);
+  printf("%lu %lu %lu %lu\n", (unsigned long)p.late, (unsigned long)p.overflow,
+         (unsigned long)jitterUs(&p.in), (unsigned long)jitterUs(&p.out));
+  return 0;
+}
+"""
+
+def _script(seed: int, n: int) -> List[Tuple]:
+    rng = random.Random(seed)
+    ops: List[Tuple] = []
+    # the device clock starts just short of wrapping
+    now = (_U32 - rng.randint(0, 200000)) & _U32
+    src = now
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.35:
+            now = (now + rng.randint(0, 400)) & _U32
+            src = (src + rng.randint(100, 250)) & _U32
+            # bursty arrival: sometimes the source runs ahead of a stale clock estimate
+            stamp = (src + rng.choice((0, -3000, 5000, 50000))) & _U32 if rng.random() < 0.9 else src
+            ops.append(("s", int(rng.random() < 0.85), stamp, now,
+                        rng.randint(-300, 300), rng.randint(-300, 300), rng.randint(1, 3)))
+        elif r < 0.45:
+            now = (now + rng.randint(0, 2000)) & _U32
+            ops.append(("r", now))
+        elif r < 0.47:
+            ops.append(("d", rng.choice((0, 2000, 8000))))
+        elif r < 0.7:
+            ops.append(("t", rng.choice((MOTION_STEP, MOTION_STEP_WIDE))))
+        elif r < 0.8:
+            # runs and deltas big enough to saturate
+            ops.append(("a", rng.randint(-MOTION_LIMIT, MOTION_LIMIT), rng.randint(-MOTION_LIMIT, MOTION_LIMIT),
+                        rng.choice((1, 2, 7, 1000, 2 ** 21))))
+        else:
+            ops.append(("a", rng.randint(-300, 300), rng.randint(-300, 300), rng.randint(1, 4)))
+    return ops
+
+def _expect(ops) -> List[str]:
+    m = MotionAccumulator()
+    p = Playout(_SLOTS)
+    out = []
+    for op in ops:
+        if op[0] == "s":
+            _, stamped, src, now, dx, dy, run = op
+            p.add(m, src if stamped else None, now, dx, dy, run)
+            out.append(f"{m.dx} {m.dy} {len(p.queue)}")
+        elif op[0] in "rd":
+            if op[0] == "r":
+                p.release(m, op[1])
+            else:
+                p.set_delay(m, op[1])
+            out.append(f"{m.dx} {m.dy} {len(p.queue)}")
+        elif op[0] == "a":
+            m.add(*op[1:])
+            out.append(f"{m.dx} {m.dy}")
+        else:
+            got = m.take(op[1])
+            out.append("0 0 0" if got is None else f"1 {got[0]} {got[1]}")
+    out.append("%d %d %d" % m.counters())
+    out.append(f"{p.late} {p.overflow} {p.jitter_in.us} {p.jitter_out.us}")
+    return out
+
+@pytest.fixture(scope="module")
+def driver(build_c):
+    return build_c("motion_driver", _DRIVER, [f"PLAYOUT_SLOTS={_SLOTS}"])
+
+@pytest.mark.parametrize("seed", range(50))
+def test_c_core_matches_model(driver, seed):
+    ops = _script(seed, 400)
+    assert driver(ops) == _expect(ops)
+
+def test_take_splits_into_report_steps():
+    m = MotionAccumulator()
+    m.add(300, -2)
+    assert [m.take(), m.take(), m.take(), m.take()] == [(127, -2), (127, 0), (46, 0), None]
+    assert m.counters() == (1, 3, 0)
+
+def test_add_clips_and_counts():
+    m = MotionAccumulator()
+    m.add(MOTION_LIMIT, 0, 2)
+    assert (m.dx, m.dy) == (MOTION_LIMIT, 0)
+    assert m.clipped == 1
@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from serial_codec import STAMP_MASK, VECTORS, CompactDecoder, _random_trace, encode_compact, encode_compact_timed
+from serial_emulator import firmware_conformance
+from serial_protocol import ESC
+
+# feeds "b <byte>" lines through compactFeed and prints what each byte completed
+_DRIVER = r"""
+#include <stdio.h>
+#include "motion_core.h"
+
+int main(void) {
+  CompactDec d;
+  CompactToken t;
+  char op;
+  unsigned b;
+  compactReset(&d);
+  while (scanf(" %c %u", &op, &b) == 2) {
+    switch (compactFeed(&d, (uint8_t)b, &t)) {
+      case COMPACT_MOVE: printf("m %ld %ld %lu\n", (long)t.dx, (long)t.dy, (unsigned long)t.run); break;
+      case COMPACT_STAMP: printf("s %lu\n", (unsigned long)t.stamp); break;
+      case COMPACT_INVALID: printf("x\n"); break;
+      default: printf("-\n");
+    }
+  }
+  return 0;
+}
+"""
+
+def _reference(wire: bytes) -> list:
+    # the same per-byte events from the Python decoder
+    dec = CompactDecoder()
+    out = []
+    for b in wire:
+        invalid = dec.invalid
+        moves = dec.feed_byte(b)
+        stamp = dec.take_stamp()
+        if moves:
+            out.append(f"m {moves[0][0]} {moves[0][1]} {len(moves)}")
+        elif stamp is not None:
+            out.append(f"s {stamp}")
+        elif dec.invalid != invalid:
+            out.append("x")
+        else:
+            out.append("-")
+    return out
+
+def _esc_outside_token(wire: bytes) -> bool:
+    dec = CompactDecoder()
+    for b in wire:
+        if b == ESC and not dec._flags:
+            return True
+        dec.feed_byte(b)
+    return False
+
+@pytest.fixture(scope="module")
+def c_decoder(build_c):
+    run = build_c("compact_driver", _DRIVER)
+    return lambda wire: run(("b", b) for b in wire)
+
+@pytest.mark.parametrize("deltas, wire", VECTORS)
+def test_vector_encodes_byte_exact(deltas, wire):
+    assert encode_compact(deltas) == wire
+
+@pytest.mark.parametrize("deltas, wire", VECTORS)
+def test_vector_decodes(deltas, wire):
+    assert CompactDecoder().feed(wire) == list(deltas)
+
+@pytest.mark.parametrize("deltas, wire", VECTORS)
+def test_vector_decodes_in_firmware_c(c_decoder, deltas, wire):
+    got = []
+    for line in c_decoder(wire):
+        assert line[0] in "m-", line
+        if line[0] == "m":
+            _, dx, dy, run = line.split()
+            got += [(int(dx), int(dy))] * int(run)
+    assert got == list(deltas)
+
+def test_vectors_in_firmware_model():
+    assert firmware_conformance(VECTORS) == []
+
+@pytest.mark.parametrize("seed", range(200))
+def test_round_trip_in_chunks(seed):
+    trace = _random_trace(64, seed)
+    wire = encode_compact(trace)
+    dec = CompactDecoder()
+    got = []
+    step = 1 + seed % 7
+    for i in range(0, len(wire), step):
+        got += dec.feed(wire[i:i + step])
+    assert got == trace
+    assert not _esc_outside_token(wire)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_c_decoder_matches_reference(c_decoder, seed):
+    rng = random.Random(seed)
+    timed = [(dx, dy, rng.choice((None, rng.randint(0, 1 << 24)))) for dx, dy in _random_trace(64, seed)]
+    wire = encode_compact_timed(timed)
+    # corrupt bytes too: headers, stray continuation bytes and over-long varints must agree
+    noise = bytes(rng.randrange(256) for _ in range(64))
+    for data in (wire, noise, wire[:17] + noise[:9] + wire[17:]):
+        assert c_decoder(data) == _reference(data)
+
+def test_timed_round_trip():
+    # a stamp travels with the motion token right after it; the rest of its group follows untimed
+    timed = [(3, 1, 100), (3, 1, 100), (200, 0, 700), (1, 1, None), (0, 5, STAMP_MASK + 9)]
+    dec = CompactDecoder()
+    got = []
+    for b in encode_compact_timed(timed):
+        for d in dec.feed_byte(b):
+            got.append((d, dec.take_stamp()))
+    assert got == [((3, 1), 100), ((3, 1), None), ((200, 0), 700), ((1, 1), None), ((0, 5), 8)]
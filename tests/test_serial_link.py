@@ -0,0 +1,104 @@
+import pytest
+
+from auth_guard import set_session_token
+from constants import SERIAL_BOOT_BAUD
+from serial_emulator import EmulatedSerial, FirmwareModel
+from serial_flow import CAPS_PAD
+from serial_link import SerialLink
+from serial_protocol import OP_CAPS, encode_command
+
+@pytest.fixture(autouse=True)
+def session():
+    set_session_token("test", "test")
+
+def _link(fw: FirmwareModel) -> SerialLink:
+    # every open gets a fresh port on the same device, like a board that does not reset on open
+    def factory(port, baudrate, timeout, write_timeout):
+        dev = EmulatedSerial(firmware=fw)
+        dev.baudrate = baudrate
+        dev.timeout = timeout
+        return dev
+    return SerialLink(port_factory=factory)
+
+class _OriginalSketch:
+    # the pre-protocol firmware: never answers, reads every byte pair as a signed move
+    def __init__(self, port, baudrate, timeout, write_timeout):
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.in_waiting = 0
+        self.out_waiting = 0
+        self.wire = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.wire += data
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        return b""
+
+    def reset_input_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def _net_motion(wire: bytes):
+    s8 = [b - 256 if b > 127 else b for b in wire]
+    return sum(s8[0::2]), sum(s8[1::2])
+
+def test_caps_query_is_motion_neutral_for_original_sketch():
+    frame = encode_command(OP_CAPS, CAPS_PAD)
+    assert len(frame) % 2 == 0
+    assert _net_motion(frame) == (0, 0)
+
+def test_connect_to_original_sketch_moves_nothing():
+    ports = []
+    link = SerialLink(port_factory=lambda **kw: ports.append(_OriginalSketch(**kw)) or ports[-1])
+    assert link.open("legacy")
+    try:
+        assert not link.protocol and link.encoding == "legacy"
+        wire = bytes(ports[0].wire)
+        assert wire and _net_motion(wire) == (0, 0)
+        assert len(wire) % 2 == 0
+    finally:
+        link.close()
+
+def test_open_negotiates_rate_and_encoding():
+    link = _link(FirmwareModel())
+    assert link.open("emu", target_baud=500000)
+    try:
+        assert link.baud == 500000
+        assert link.encoding == "compact"
+        assert link.protocol and link.caps is not None
+    finally:
+        link.close()
+
+def test_close_returns_firmware_to_boot_state():
+    fw = FirmwareModel()
+    link = _link(fw)
+    assert link.open("emu", target_baud=500000)
+    link.close()
+    assert fw.committed_baud == SERIAL_BOOT_BAUD
+    assert link.open("emu")
+    try:
+        assert link.baud == SERIAL_BOOT_BAUD
+        assert link.encoding == "compact"
+        assert link.caps is not None
+    finally:
+        link.close()
+
+def test_open_finds_firmware_left_at_target_rate():
+    fw = FirmwareModel()
+    # a session that ended without close(), e.g. the app was killed
+    fw.baud = fw.committed_baud = 500000
+    link = _link(fw)
+    assert link.open("emu", target_baud=500000)
+    try:
+        assert link.baud == 500000
+        assert link.protocol and link.caps is not None
+        assert link.encoding == "compact"
+    finally:
+        link.close()
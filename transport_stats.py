@@ -0,0 +1,75 @@
+import time
+from typing import Optional
+
+VIDEO_CLOCK_RATE = 90000
+
+def _count_calls(obj, name: str, counter: dict, key: str):
+    orig = getattr(obj, name, None)
+    if orig is None:
+        return
+
+    async def wrapped(*args, **kwargs):
+        counter[key] += 1
+        return await orig(*args, **kwargs)
+    setattr(obj, name, wrapped)
+
+class TransportStatsSampler:
+    def __init__(self):
+        self._counts = {"nack": 0, "pli": 0}
+        self._instrumented = set()
+        self._prev: Optional[tuple] = None
+        self.latest: dict = {}
+
+    def _instrument(self, pc):
+        try:
+            receivers = pc.getReceivers()
+        except Exception:
+            return
+        for r in receivers:
+            if id(r) in self._instrumented:
+                continue
+            self._instrumented.add(id(r))
+            _count_calls(r, "_send_rtcp_nack", self._counts, "nack")
+            _count_calls(r, "_send_rtcp_pli", self._counts, "pli")
+
+    async def sample(self, pc, frames_decoded: int, frames_dropped: int) -> dict:
+        self._instrument(pc)
+        try:
+            report = await pc.getStats()
+        except Exception:
+            return self.latest
+        received = lost = 0
+        jitter = 0
+        rx_bytes = 0
+        for s in report.values():
+            kind = getattr(s, "type", "")
+            if kind == "inbound-rtp" and getattr(s, "kind", "") == "video":
+                received += s.packetsReceived
+                lost += max(0, s.packetsLost)
+                jitter = max(jitter, s.jitter)
+            elif kind == "transport":
+                rx_bytes += s.bytesReceived
+        now = time.monotonic()
+        bitrate = 0.0
+        loss_pct = 0.0
+        if self._prev is not None:
+            t0, b0, r0, l0 = self._prev
+            dt = now - t0
+            if dt > 0:
+                bitrate = max(0, rx_bytes - b0) * 8 / dt
+            expected = (received - r0) + (lost - l0)
+            if expected > 0:
+                loss_pct = 100.0 * max(0, lost - l0) / expected
+        self._prev = (now, rx_bytes, received, lost)
+        self.latest = {
+            "packets_received": received,
+            "packets_lost": lost,
+            "loss_pct": round(loss_pct, 2),
+            "jitter_ms": round(jitter * 1000.0 / VIDEO_CLOCK_RATE, 2),
+            "nack": self._counts["nack"],
+            "pli": self._counts["pli"],
+            "bitrate_kbps": round(bitrate / 1000.0, 1),
+            "frames_decoded": frames_decoded,
+            "frames_dropped": frames_dropped,
+        }
+        return self.latest
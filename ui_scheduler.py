@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from PySide6 import QtCore, QtGui
+
+from constants import UI_FALLBACK_FPS, UI_LOG_BACKLOG, UI_LOG_LINES_PER_FRAME
+from flight_recorder import RECORDER
+
+class UiScheduler(QtCore.QObject):
+    # collects widget updates from any thread and applies them once per display frame;
+    # keyed updates are latest-wins, log lines are appended in one batch per widget
+    _wake = QtCore.Signal()
+
+    def __init__(self, parent=None, fps: Optional[float] = None,
+                 lines_per_frame: int = UI_LOG_LINES_PER_FRAME, backlog: int = UI_LOG_BACKLOG):
+        super().__init__(parent)
+        self.lines_per_frame = lines_per_frame
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._pending: Dict[object, tuple] = {}
+        self._logs: Dict[object, deque] = {}
+        self._dropped: Dict[object, int] = {}
+        self._armed = False
+        self._last = 0.0
+        self._interval = 1.0 / UI_FALLBACK_FPS
+        self.set_rate(fps)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self.flush)
+        self._wake.connect(self._arm)
+        self.flushes = 0
+        self.posted = 0
+        self.coalesced = 0
+        self.busy_s = 0.0
+
+    def set_rate(self, fps: Optional[float] = None):
+        if not fps:
+            screen = QtGui.QGuiApplication.primaryScreen()
+            fps = screen.refreshRate() if screen is not None else 0.0
+        self._interval = 1.0 / (fps if fps and fps > 1.0 else UI_FALLBACK_FPS)
+
+    def post(self, key, fn: Callable, *args):
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = (fn, args)
+            self.posted += 1
+            wake = not self._armed
+            self._armed = True
+        if wake:
+            self._wake.emit()
+
+    def log(self, widget, line: str):
+        with self._lock:
+            q = self._logs.get(widget)
+            if q is None:
+                q = self._logs[widget] = deque()
+            if len(q) >= self.backlog:
+                q.popleft()
+                self._dropped[widget] = self._dropped.get(widget, 0) + 1
+            q.append(line)
+            wake = not self._armed
+            self._armed = True
+        if wake:
+            self._wake.emit()
+
+    def discard(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def clear(self, widget):
+        with self._lock:
+            self._logs.pop(widget, None)
+            self._dropped.pop(widget, None)
+        widget.clear()
+
+    def _arm(self):
+        if not self._timer.isActive():
+            delay = self._last + self._interval - time.perf_counter()
+            self._timer.start(max(0, int(delay * 1000.0 + 0.999)))
+
+    @QtCore.Slot()
+    def flush(self):
+        self._last = t0 = time.perf_counter()
+        batches = []
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for widget, q in self._logs.items():
+                n = min(len(q), self.lines_per_frame)
+                if n:
+                    lines = [q.popleft() for _ in range(n)]
+                    dropped = self._dropped.pop(widget, 0)
+                    if dropped:
+                        lines.insert(0, f"… {dropped} lines skipped")
+                    batches.append((widget, lines))
+            more = any(self._logs.values())
+            self._armed = more
+        for fn, args in pending.values():
+            try:
+                fn(*args)
+            except Exception:
+                pass
+        for widget, lines in batches:
+            try:
+                widget.appendPlainText("\n".join(lines))
+            except Exception:
+                pass
+        t1 = time.perf_counter()
+        self.flushes += 1
+        self.busy_s += t1 - t0
+        RECORDER.span("ui.flush", t0, t1, (len(pending), sum(len(b[1]) for b in batches)))
+        if more:
+            self._arm()
+
+    def stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "posted": self.posted,
+            "coalesced": self.coalesced,
+            "busy_ms": round(self.busy_s * 1000.0, 1),
+        }
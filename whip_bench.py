@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PySide6 import QtCore, QtGui
+
+from pipeline_stats import LatencyHistogram
+from whip_server import WhipServer
+from flight_recorder import RECORDER
+
+STAMP_BITS = 48
+
+def _stamp_block(width: int) -> int:
+    return max(4, min(16, width // STAMP_BITS))
+
+def _stamp_word(idx: int, t_us: int) -> int:
+    t_us &= 0xFFFFFFFF
+    check = (idx + sum(t_us.to_bytes(4, "little"))) & 0xFF
+    return ((idx & 0xFF) << 40) | (t_us << 8) | check
+
+def stamp_frame(arr, idx: int, t: float):
+    h, w, _ = arr.shape
+    block = _stamp_block(w)
+    word = _stamp_word(idx, int(t * 1e6))
+    for i in range(STAMP_BITS):
+        bit = (word >> (STAMP_BITS - 1 - i)) & 1
+        arr[0:block, i * block:(i + 1) * block] = 255 if bit else 0
+
+def read_stamp(img: QtGui.QImage) -> Optional[Tuple[int, int]]:
+    w = img.width()
+    block = _stamp_block(w)
+    if img.height() < block or w < block * STAMP_BITS:
+        return None
+    word = 0
+    y = block // 2
+    for i in range(STAMP_BITS):
+        c = QtGui.QColor(img.pixel(i * block + block // 2, y))
+        word = (word << 1) | (1 if c.lightness() >= 128 else 0)
+    idx = (word >> 40) & 0xFF
+    t_us = (word >> 8) & 0xFFFFFFFF
+    if (idx + sum(t_us.to_bytes(4, "little"))) & 0xFF != word & 0xFF:
+        return None
+    return idx, t_us
+
+def _proc_cpu_seconds(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return 0.0
+
+async def _publish(idx: int, port: int, width: int, height: int, fps: float, seconds: float, conn) -> int:
+    import aiohttp
+    from aiortc import MediaStreamTrack, RTCPeerConnection, RTCSessionDescription
+    from av import VideoFrame
+    from synthetic import SyntheticTrack
+
+    class StampedTrack(MediaStreamTrack):
+        kind = "video"
+
+        def __init__(self):
+            super().__init__()
+            self._src = SyntheticTrack(width, height, fps, "rgb24", "gradient", use_av=False)
+            self.sent = 0
+
+        async def recv(self):
+            frame = await self._src.recv()
+            arr = frame.data.copy()
+            stamp_frame(arr, idx, time.perf_counter())
+            out = VideoFrame.from_ndarray(arr, format="rgb24")
+            out.pts = frame.pts
+            out.time_base = frame.time_base
+            self.sent += 1
+            return out
+
+    track = StampedTrack()
+    pc = RTCPeerConnection()
+    pc.addTrack(track)
+    await pc.setLocalDescription(await pc.createOffer())
+    t_post = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        async with http.post(f"http://127.0.0.1:{port}/whip", data=pc.localDescription.sdp,
+                             headers={"Content-Type": "application/sdp"}) as r:
+            answer = await r.text()
+            location = r.headers.get("Location")
+            conn.send(("posted", idx, t_post, r.status))
+        if r.status != 201:
+            await pc.close()
+            return 0
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=answer, type="answer"))
+        await asyncio.sleep(seconds)
+        sent = track.sent
+        try:
+            await http.delete(f"http://127.0.0.1:{port}{location}")
+        except Exception:
+            pass
+    await pc.close()
+    return sent
+
+def _publisher_main(port: int, specs: List[Tuple[int, int]], fps: float, seconds: float, conn):
+    async def run():
+        results = await asyncio.gather(*(
+            _publish(i, port, w, h, fps, seconds, conn) for i, (w, h) in enumerate(specs)
+        ), return_exceptions=True)
+        conn.send(("done", [r if isinstance(r, int) else 0 for r in results]))
+    try:
+        asyncio.run(run())
+    finally:
+        conn.close()
+
+class LoopbackBench(QtCore.QObject):
+    def __init__(self, args):
+        super().__init__()
+        self.args = args
+        self.specs = [args.resolution[i % len(args.resolution)] for i in range(args.publishers)]
+        self.server = WhipServer(self)
+        self.server.set_isolated(args.isolated)
+        self.server.set_session_limits(args.publishers, 30.0)
+        self.server.set_feedback_config({"max_kbps": args.max_kbps, "adaptive": True})
+        self.server.set_low_latency(args.low_latency)
+        self.server.set_host_only_ice(args.host_only)
+        self.server.subscribe("bench")
+        self.server.urlsUpdated.connect(self._on_ready)
+        self.server.frameReady.connect(self._on_frame)
+        self.first: Dict[int, float] = {}
+        self.last: Dict[int, float] = {}
+        self.count: Dict[int, int] = {}
+        self.latency: Dict[int, LatencyHistogram] = {}
+        self.posted: Dict[int, Tuple[float, int]] = {}
+        self.sent: List[int] = []
+        self._proc = None
+        self._conn = None
+        self._cpu0 = 0.0
+        self._wall0 = 0.0
+        self._poll = QtCore.QTimer(self)
+        self._poll.setInterval(20)
+        self._poll.timeout.connect(self._poll_publishers)
+        self._deadline = QtCore.QTimer(self)
+        self._deadline.setSingleShot(True)
+        self._deadline.timeout.connect(self._finish)
+        self.report: Optional[dict] = None
+
+    def start(self):
+        self.server.start(self.args.port)
+        self._deadline.start(int((self.args.seconds + 30) * 1000))
+
+    def _on_ready(self, _urls):
+        if self._proc is not None:
+            return
+        import multiprocessing as mp
+        ctx = mp.get_context("spawn")
+        self._conn, child = ctx.Pipe(duplex=False)
+        self._proc = ctx.Process(target=_publisher_main,
+                                 args=(self.args.port, self.specs, self.args.fps, self.args.seconds, child),
+                                 daemon=True)
+        self._cpu0 = time.process_time()
+        self._wall0 = time.perf_counter()
+        self._proc.start()
+        child.close()
+        self._poll.start()
+
+    def _on_frame(self, img: QtGui.QImage):
+        now = time.perf_counter()
+        st = read_stamp(img)
+        if st is None:
+            return
+        idx, t_us = st
+        lat_ms = ((int(now * 1e6) - t_us) & 0xFFFFFFFF) / 1000.0
+        self.first.setdefault(idx, now)
+        self.last[idx] = now
+        self.count[idx] = self.count.get(idx, 0) + 1
+        self.latency.setdefault(idx, LatencyHistogram()).add(lat_ms)
+        self.server.record_paint(img)
+
+    def _poll_publishers(self):
+        while self._conn is not None and self._conn.poll():
+            try:
+                msg = self._conn.recv()
+            except EOFError:
+                self._conn = None
+                break
+            if msg[0] == "posted":
+                self.posted[msg[1]] = (msg[2], msg[3])
+            elif msg[0] == "done":
+                self.sent = msg[1]
+                self._finish()
+                return
+
+    def _finish(self):
+        self._deadline.stop()
+        self._poll.stop()
+        wall = time.perf_counter() - self._wall0
+        cpu = time.process_time() - self._cpu0
+        worker = getattr(self.server, "_worker", None)
+        proc = getattr(worker, "_proc", None)
+        if proc is not None and proc.pid:
+            cpu += _proc_cpu_seconds(proc.pid)
+        self.report = self._report(wall, cpu)
+        if self.args.trace:
+            self.report["trace"] = RECORDER.dump(self.args.trace)
+        self.server.stop()
+        if self._proc is not None:
+            self._proc.join(5.0)
+        QtCore.QCoreApplication.quit()
+
+    def _report(self, wall: float, cpu: float) -> dict:
+        sessions = []
+        for idx, (w, h) in enumerate(self.specs):
+            n = self.count.get(idx, 0)
+            sent = self.sent[idx] if idx < len(self.sent) else 0
+            t_post, status = self.posted.get(idx, (None, None))
+            first = self.first.get(idx)
+            span = self.last.get(idx, 0.0) - first if first is not None else 0.0
+            hist = self.latency.get(idx, LatencyHistogram())
+            sessions.append({
+                "publisher": idx,
+                "resolution": f"{w}x{h}",
+                "status": status,
+                "time_to_first_frame_ms": round((first - t_post) * 1000.0, 1) if first and t_post else None,
+                "sent": sent,
+                "received": n,
+                "dropped": max(0, sent - n),
+                "fps": round((n - 1) / span, 1) if span > 0 else 0.0,
+                "latency_ms": hist.summary(),
+            })
+        accepted = sum(1 for s in sessions if s["status"] == 201) or 1
+        return {
+            "isolated": bool(self.args.isolated),
+            "seconds": round(wall, 2),
+            "cpu_seconds": round(cpu, 2),
+            "cpu_percent_per_session": round(100.0 * cpu / wall / accepted, 1) if wall > 0 else 0.0,
+            "pipeline_ms": self.server.stats.summary(),
+            "sessions": sessions,
+        }
+
+def _resolution(text: str) -> Tuple[int, int]:
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Publish synthetic video into a local WhipServer and report ingest capacity.")
+    ap.add_argument("-n", "--publishers", type=int, default=1)
+    ap.add_argument("-r", "--resolution", type=_resolution, action="append",
+                    help="WxH, repeat to cycle across publishers (default 1280x720)")
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--port", type=int, default=18080)
+    ap.add_argument("--max-kbps", type=int, default=0, help="receiver bitrate cap, 0 adapts to decode speed")
+    ap.add_argument("--low-latency", action="store_true", help="skip to the newest decoded frame when behind")
+    ap.add_argument("--host-only", action="store_true", help="answer with host ICE candidates only")
+    ap.add_argument("--isolated", action="store_true", help="run ingest in a separate process")
+    ap.add_argument("--trace", metavar="PATH", help="write the flight recorder as a Chrome trace when done")
+    ap.add_argument("--json", action="store_true", help="print the raw JSON report")
+    args = ap.parse_args(argv)
+    if not args.resolution:
+        args.resolution = [(1280, 720)]
+
+    app = QtCore.QCoreApplication(sys.argv[:1])
+    bench = LoopbackBench(args)
+    QtCore.QTimer.singleShot(0, bench.start)
+    app.exec()
+    report = bench.report or {}
+    del bench
+    del app
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{len(report.get('sessions', []))} publisher(s), {report.get('seconds')} s, "
+          f"cpu {report.get('cpu_seconds')} s (~{report.get('cpu_percent_per_session')}% per session)")
+    for s in report.get("sessions", []):
+        lat = s["latency_ms"]
+        print(f"  #{s['publisher']} {s['resolution']:>9}  http {s['status']}  ttff {s['time_to_first_frame_ms']} ms  "
+              f"{s['fps']:.1f} fps  sent {s['sent']} recv {s['received']} dropped {s['dropped']}  "
+              f"latency p50 {lat['p50']:.1f} p95 {lat['p95']:.1f} max {lat['max']:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import pickle
+import socket
+import subprocess
+import sys
+from multiprocessing.connection import Client, Connection, answer_challenge, deliver_challenge
+
+from whip_ingest import _ingest_process_main
+
+# Entry point of the isolated WHIP ingest process. It runs as its own script rather than through
+# multiprocessing's spawn, which would re-import the GUI's __main__ (Qt, the guards) in the child.
+# The parent hands over a loopback port, an auth key and the worker arguments on stdin; the child
+# dials back twice for the command and event connections.
+
+def launch(args: tuple, timeout: float = 10.0):
+    key = os.urandom(32)
+    srv = socket.create_server(("127.0.0.1", 0))
+    srv.settimeout(timeout)
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__)], stdin=subprocess.PIPE)
+    try:
+        with srv:
+            proc.stdin.write(pickle.dumps((srv.getsockname()[1], key, args)))
+            proc.stdin.close()
+            cmd = _accept(srv, key)
+            evt = _accept(srv, key)
+    except Exception:
+        proc.kill()
+        proc.wait()
+        raise
+    return proc, cmd, evt
+
+def _accept(srv: socket.socket, key: bytes) -> Connection:
+    sock, _ = srv.accept()
+    sock.setblocking(True)
+    conn = Connection(sock.detach())
+    try:
+        deliver_challenge(conn, key)
+        answer_challenge(conn, key)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+def main():
+    port, key, args = pickle.load(sys.stdin.buffer)
+    cmd = Client(("127.0.0.1", port), authkey=key)
+    evt = Client(("127.0.0.1", port), authkey=key)
+    # the parent owns the process lifetime: when it goes away the command connection hits EOF
+    # and the worker stops
+    _ingest_process_main(args[0], cmd, evt, *args[1:])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,904 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+from constants import (
+    WHIP_MAX_SESSIONS,
+    WHIP_IDLE_TIMEOUT,
+    WHIP_MAX_BITRATE_KBPS,
+    WHIP_LOW_LATENCY,
+    WHIP_HOST_ONLY_ICE,
+    WHIP_PC_POOL_SIZE,
+    WHIP_IFACE_CACHE_TTL,
+)
+from pipeline_stats import PipelineStats, MediaClock
+from frame_ring import SharedFrameRing
+from sdp_policy import NegotiationPolicy
+from transport_stats import TransportStatsSampler
+from rtc_feedback import ReceiverFeedback
+from flight_recorder import RECORDER
+
+FRAME_TS_KEY = "mf_handoff_ts"
+WORKER_STAGES = ("receive", "decode", "convert", "crop", "handoff")
+
+SETUP_STAGES = ("answer", "first_frame")
+
+_iface_cache: Optional[tuple] = None
+
+def _local_addrs() -> List[str]:
+    global _iface_cache
+    now = time.monotonic()
+    if _iface_cache is not None and now - _iface_cache[0] < WHIP_IFACE_CACHE_TTL:
+        return _iface_cache[1]
+    addrs: List[str] = ["127.0.0.1"]
+    try:
+        hn = socket.gethostname()
+        _, _, ips = socket.gethostbyname_ex(hn)
+        for ip in ips:
+            if ip.startswith("127."):
+                continue
+            if ":" in ip:
+                continue
+            addrs.append(ip)
+    except Exception:
+        pass
+    addrs = sorted(set(addrs))
+    _iface_cache = (now, addrs)
+    return addrs
+
+def _preimport():
+    try:
+        import numpy  # noqa: F401
+        from aiortc.contrib.media import MediaBlackhole  # noqa: F401
+        from aiortc.codecs import get_decoder
+        from aiortc.rtcrtpparameters import RTCRtpCodecParameters
+        for mime in ("video/H264", "video/VP8"):
+            get_decoder(RTCRtpCodecParameters(mimeType=mime, clockRate=90000, payloadType=96))
+    except Exception:
+        pass
+
+# low-latency mode drains RemoteStreamTrack's decoded-frame queue, which is private to aiortc;
+# only releases known to keep it there as an asyncio.Queue get that fast path
+_QUEUE_AIORTC_MAJOR = (1,)
+
+def _frame_queue_check():
+    # (track class whose queue may be drained, None) or (None, why plain recv() is used instead)
+    try:
+        import aiortc
+        from aiortc.rtcrtpreceiver import RemoteStreamTrack
+    except Exception as e:
+        return None, f"aiortc receive track unavailable: {e}"
+    version = str(getattr(aiortc, "__version__", "?"))
+    if not version.split(".")[0].isdigit() or int(version.split(".")[0]) not in _QUEUE_AIORTC_MAJOR:
+        return None, f"untested aiortc {version}"
+    try:
+        q = RemoteStreamTrack(kind="video")._queue
+    except Exception:
+        q = None
+    if not isinstance(q, asyncio.Queue):
+        return None, f"aiortc {version} no longer queues frames on its receive track"
+    return RemoteStreamTrack, None
+
+def _newest_frame(track, frame):
+    q = track._queue
+    skipped = 0
+    while not q.empty():
+        nxt = q.get_nowait()
+        if nxt is None:
+            q.put_nowait(None)
+            break
+        frame = nxt
+        skipped += 1
+    return frame, skipped
+
+def crop_frame(arr, x: int, y: int, w: int, h: int, center: bool):
+    fh, fw = arr.shape[:2]
+    cw = int(min(max(1, w), fw))
+    chh = int(min(max(1, h), fh))
+    if center:
+        x = max(0, (fw - cw) // 2)
+        y = max(0, (fh - chh) // 2)
+    else:
+        x = max(0, min(x, fw - cw))
+        y = max(0, min(y, fh - chh))
+    return arr[y:y+chh, x:x+cw, :].copy()
+
+class WhipSession:
+    def __init__(self, sid: str, pc, remote: str = ""):
+        self.id = sid
+        self.pc = pc
+        self.remote = remote
+        self.created = time.monotonic()
+        self.last_activity = self.created
+        self.frames = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.converted = 0
+        self.decode_errors = 0
+        self.width = 0
+        self.height = 0
+        self.fps = 0.0
+        self.first_frame: Optional[float] = None
+        self.answer_ms: Optional[float] = None
+        self.video_task: Optional[asyncio.Task] = None
+        self.source = None
+        self.tasks = set()
+        self.transport = TransportStatsSampler()
+        self.feedback: Optional[ReceiverFeedback] = None
+        self._rate_frames = 0
+        self._rate_t = self.created
+
+    def on_frame(self, w: int, h: int):
+        if self.first_frame is None:
+            self.first_frame = time.monotonic()
+        self.frames += 1
+        self.width = w
+        self.height = h
+        self.last_activity = time.monotonic()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        dt = now - self._rate_t
+        if dt >= 0.5:
+            self.fps = (self.frames - self._rate_frames) / dt
+            self._rate_frames = self.frames
+            self._rate_t = now
+        snap = {
+            "id": self.id,
+            "remote": self.remote,
+            "state": getattr(self.pc, "connectionState", "new") if self.pc is not None else "synthetic",
+            "age": round(now - self.created, 1),
+            "idle": round(now - self.last_activity, 1),
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "converted": self.converted,
+            "decode_errors": self.decode_errors,
+            "width": self.width,
+            "height": self.height,
+            "fps": round(self.fps, 1),
+            "ttff": round(self.first_frame - self.created, 3) if self.first_frame is not None else None,
+            "setup_ms": round(self.answer_ms, 1) if self.answer_ms is not None else None,
+        }
+        if self.feedback is not None:
+            snap.update(self.feedback.snapshot())
+        return snap
+
+class IngestWorker:
+    def __init__(self, port: int, sink, stats: PipelineStats):
+        self._port = port
+        self._sink = sink
+        self._stats = stats
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._runner = None
+        self._site = None
+        self._pcs = set()
+        self._tasks = set()
+        self._sessions: Dict[str, WhipSession] = {}
+        self._max_sessions = WHIP_MAX_SESSIONS
+        # POSTs that passed the admission check but are still reading their offer
+        self._admitting = 0
+        self._idle_timeout = WHIP_IDLE_TIMEOUT
+        self._aiohttp_ok = False
+        self._aiortc_ok = False
+        try:
+            import aiohttp  # noqa: F401
+            from aiohttp import web  # noqa: F401
+            self._aiohttp_ok = True
+        except Exception:
+            self._aiohttp_ok = False
+        try:
+            from aiortc import RTCPeerConnection  # noqa: F401
+            self._aiortc_ok = True
+        except Exception:
+            self._aiortc_ok = False
+        self._drain_cls, self._drain_issue = _frame_queue_check() if self._aiortc_ok else (None, None)
+
+        self._crop_enabled = False
+        self._crop_x = 0
+        self._crop_y = 0
+        self._crop_w = 320
+        self._crop_h = 320
+        self._crop_center = True
+        self._reject_audio = True
+        self._policy = NegotiationPolicy()
+        self._synthetic_cfg: dict = {"enabled": False}
+        self._synthetic_sid: Optional[str] = None
+        self._feedback_cfg: dict = {"max_kbps": WHIP_MAX_BITRATE_KBPS, "adaptive": True}
+        self._low_latency = WHIP_LOW_LATENCY
+        self._demand = -1.0
+        self._host_only = WHIP_HOST_ONLY_ICE
+        self._pc_pool: list = []
+        self._pool_filling = False
+        self.setup_stats = PipelineStats(SETUP_STAGES)
+        self._stop_requested = False
+
+    def stop_async(self):
+        self._stop_requested = True
+        if self._loop and self._stop_event:
+            def _set():
+                if not self._stop_event.is_set():
+                    self._stop_event.set()
+            self._loop.call_soon_threadsafe(_set)
+
+    def set_crop_config_async(self, enabled: bool, x: int, y: int, w: int, h: int, center: bool):
+        def _apply():
+            self._crop_enabled = bool(enabled)
+            self._crop_x = max(0, int(x))
+            self._crop_y = max(0, int(y))
+            self._crop_w = max(1, int(w))
+            self._crop_h = max(1, int(h))
+            self._crop_center = bool(center)
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            _apply()
+
+    def set_session_limits_async(self, max_sessions: int, idle_timeout: float):
+        def _apply():
+            self._max_sessions = max(1, int(max_sessions))
+            self._idle_timeout = max(1.0, float(idle_timeout))
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            _apply()
+
+    def set_policy_async(self, cfg: dict):
+        policy = NegotiationPolicy.from_dict(cfg)
+
+        def _apply():
+            self._policy = policy
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            _apply()
+
+    def set_feedback_async(self, cfg: dict):
+        cfg = {"max_kbps": int(cfg.get("max_kbps", WHIP_MAX_BITRATE_KBPS)), "adaptive": bool(cfg.get("adaptive", True))}
+
+        def _apply():
+            self._feedback_cfg = cfg
+            for sess in self._sessions.values():
+                if sess.feedback is not None:
+                    sess.feedback.configure(cfg["max_kbps"], cfg["adaptive"])
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            _apply()
+
+    def set_low_latency_async(self, enabled: bool):
+        def _apply():
+            self._low_latency = bool(enabled)
+            if self._low_latency and self._drain_issue and self._task is not None:
+                self._sink.status(self._drain_status())
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            _apply()
+
+    def set_host_only_async(self, enabled: bool):
+        def _apply():
+            if bool(enabled) == self._host_only:
+                return
+            self._host_only = bool(enabled)
+            if self._task is not None:
+                self._drain_pc_pool()
+                self._schedule_pool_fill()
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            self._host_only = bool(enabled)
+
+    def _drain_status(self) -> str:
+        return f"Low-latency receive unavailable ({self._drain_issue}); using plain recv()."
+
+    def set_demand_async(self, fps: float):
+        def _apply():
+            self._demand = float(fps)
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            _apply()
+
+    def trace_async(self, seconds: Optional[float] = None):
+        def _apply():
+            self._sink.trace(RECORDER.export(seconds), RECORDER.thread_names())
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            _apply()
+
+    def set_synthetic_async(self, cfg: dict):
+        cfg = dict(cfg or {})
+
+        def _apply():
+            self._synthetic_cfg = cfg
+            if self._task is not None:
+                self._restart_synthetic()
+        if self._loop:
+            try:
+                self._loop.call_soon_threadsafe(_apply)
+            except Exception:
+                _apply()
+        else:
+            self._synthetic_cfg = cfg
+
+    def _restart_synthetic(self):
+        if self._synthetic_sid is not None:
+            self._loop.create_task(self._close_session(self._synthetic_sid))
+            self._synthetic_sid = None
+        if not self._synthetic_cfg.get("enabled"):
+            return
+        try:
+            from synthetic import SyntheticTrack
+            track = SyntheticTrack.from_config(self._synthetic_cfg)
+        except Exception as e:
+            self._sink.status(f"Test source unavailable: {e}")
+            return
+        import uuid
+        sid = f"synthetic-{uuid.uuid4()}"
+        sess = WhipSession(sid, None, "synthetic")
+        sess.source = track
+        self._sessions[sid] = sess
+        self._synthetic_sid = sid
+        t = self._loop.create_task(self._consume_video(track, sess))
+        self._tasks.add(t)
+        sess.tasks.add(t)
+        t.add_done_callback(self._tasks.discard)
+        t.add_done_callback(sess.tasks.discard)
+        sess.video_task = t
+
+    async def _local_urls(self) -> List[str]:
+        addrs = await self._loop.run_in_executor(None, _local_addrs)
+        return [f"http://{ip}:{self._port}/whip" for ip in addrs]
+
+    def _new_pc(self):
+        from aiortc import RTCPeerConnection, RTCConfiguration
+        if self._host_only:
+            return RTCPeerConnection(RTCConfiguration(iceServers=[]))
+        return RTCPeerConnection()
+
+    def _take_pc(self):
+        pc = self._pc_pool.pop() if self._pc_pool else self._new_pc()
+        self._schedule_pool_fill()
+        return pc
+
+    def _schedule_pool_fill(self):
+        if self._pool_filling or not self._aiortc_ok:
+            return
+        self._pool_filling = True
+        t = self._loop.create_task(self._fill_pc_pool())
+        self._tasks.add(t)
+        t.add_done_callback(self._tasks.discard)
+
+    async def _fill_pc_pool(self):
+        try:
+            while len(self._pc_pool) < WHIP_PC_POOL_SIZE and not self._stop_event.is_set():
+                await asyncio.sleep(0)
+                self._pc_pool.append(self._new_pc())
+        except Exception:
+            pass
+        finally:
+            self._pool_filling = False
+
+    def _drain_pc_pool(self):
+        pool, self._pc_pool = self._pc_pool, []
+        for pc in pool:
+            self._loop.create_task(pc.close())
+
+    def loop(self):
+        RECORDER.name_thread("whip-ingest")
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._stop_event = asyncio.Event()
+        if self._stop_requested:
+            self._stop_event.set()
+        self._task = self._loop.create_task(self._main())
+        try:
+            self._loop.run_until_complete(self._task)
+        finally:
+            try:
+                if self._runner:
+                    self._loop.run_until_complete(self._runner.cleanup())
+            except Exception:
+                pass
+            for pc in list(self._pcs) + self._pc_pool:
+                try:
+                    self._loop.run_until_complete(pc.close())
+                except Exception:
+                    pass
+            try:
+                async def _cancel_pending():
+                    current = asyncio.current_task()
+                    tasks = [t for t in asyncio.all_tasks() if t is not current]
+                    for t in tasks:
+                        t.cancel()
+                    if tasks:
+                        await asyncio.gather(*tasks, return_exceptions=True)
+                self._loop.run_until_complete(_cancel_pending())
+            except Exception:
+                pass
+            try:
+                self._loop.stop()
+            except Exception:
+                pass
+            try:
+                self._loop.close()
+            except Exception:
+                pass
+
+    async def _main(self):
+        monitor = self._loop.create_task(self._session_monitor())
+        self._tasks.add(monitor)
+        monitor.add_done_callback(lambda _t: self._tasks.discard(_t))
+        self._restart_synthetic()
+
+        if not self._aiohttp_ok:
+            self._sink.status("aiohttp not installed. Install: pip install aiohttp")
+            self._sink.urls(await self._local_urls())
+            await self._stop_event.wait()
+            return
+
+        from aiohttp import web
+
+        if self._aiortc_ok:
+            warm = self._loop.run_in_executor(None, _preimport)
+            self._schedule_pool_fill()
+
+        app = web.Application()
+        app.add_routes([
+            web.get('/health', self._handle_health),
+            web.get('/sessions', self._handle_sessions),
+            web.get('/transport', self._handle_transport),
+            web.get('/stats', self._handle_stats),
+        ])
+
+        if self._aiortc_ok:
+            app.router.add_post('/whip', self._handle_whip)
+            app.router.add_delete('/resource/{sid}', self._handle_resource_delete)
+            if self._low_latency and self._drain_issue:
+                self._sink.status("WHIP server ready. " + self._drain_status())
+            else:
+                self._sink.status("WHIP server ready.")
+        else:
+            app.router.add_post('/whip', self._handle_whip_unavailable)
+            self._sink.status("aiortc/av not installed. Install: pip install aiortc av numpy")
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        self._site = web.TCPSite(self._runner, '0.0.0.0', self._port)
+        await self._site.start()
+
+        self._sink.urls(await self._local_urls())
+        if self._aiortc_ok:
+            await warm
+
+        assert self._stop_event is not None
+        await self._stop_event.wait()
+
+    async def _session_monitor(self):
+        had_sessions = False
+        while not self._stop_event.is_set():
+            await asyncio.sleep(1.0)
+            now = time.monotonic()
+            for sid, sess in list(self._sessions.items()):
+                if now - sess.last_activity > self._idle_timeout:
+                    await self._close_session(sid)
+                    self._sink.status(f"WHIP session {sid[:8]} timed out.")
+            if self._sessions or had_sessions:
+                self._sink.transport(await self._sample_transport())
+                self._sink.sessions(self._session_snapshots())
+            had_sessions = bool(self._sessions)
+
+    async def _sample_transport(self) -> Dict[str, dict]:
+        out: Dict[str, dict] = {}
+        for sid, sess in list(self._sessions.items()):
+            if sess.pc is None:
+                continue
+            out[sid] = await sess.transport.sample(sess.pc, sess.frames, sess.dropped)
+        return out
+
+    def _session_snapshots(self) -> List[dict]:
+        return [s.snapshot() for s in self._sessions.values()]
+
+    async def _close_session(self, sid: str):
+        sess = self._sessions.pop(sid, None)
+        if sess is None:
+            return
+        for t in list(sess.tasks):
+            t.cancel()
+        if sess.source is not None:
+            sess.source.stop()
+        if sess.pc is not None:
+            try:
+                await sess.pc.close()
+            except Exception:
+                pass
+            self._pcs.discard(sess.pc)
+
+    async def _handle_health(self, request):
+        from aiohttp import web
+        return web.Response(text="ok")
+
+    async def _handle_sessions(self, request):
+        from aiohttp import web
+        return web.json_response({
+            "max_sessions": self._max_sessions,
+            "idle_timeout": self._idle_timeout,
+            "sessions": self._session_snapshots(),
+        })
+
+    async def _handle_transport(self, request):
+        from aiohttp import web
+        return web.json_response({
+            sid: sess.transport.latest for sid, sess in self._sessions.items() if sess.pc is not None
+        })
+
+    async def _handle_stats(self, request):
+        from aiohttp import web
+        return web.json_response({
+            "latency_ms": self._stats.summary(with_buckets=True),
+            "session_setup_ms": self.setup_stats.summary(),
+            "sessions": self._session_snapshots(),
+        })
+
+    async def _handle_resource_delete(self, request):
+        from aiohttp import web
+        sid = request.match_info.get('sid', '')
+        if sid not in self._sessions:
+            return web.Response(status=404, text='Unknown resource')
+        await self._close_session(sid)
+        self._sink.sessions(self._session_snapshots())
+        return web.Response(status=200)
+
+    async def _handle_whip_unavailable(self, request):
+        from aiohttp import web
+        return web.Response(status=503, text="Server missing aiortc/av dependencies.")
+
+    async def _handle_whip(self, request):
+        from aiohttp import web
+        import uuid
+        from aiortc import RTCSessionDescription
+        from aiortc.contrib.media import MediaBlackhole
+
+        t_post = time.monotonic()
+        if request.content_type != 'application/sdp':
+            return web.Response(status=415, text='Expected application/sdp')
+
+        if len(self._sessions) + self._admitting >= self._max_sessions:
+            return web.Response(
+                status=503,
+                headers={'Retry-After': str(int(self._idle_timeout))},
+                text=f'Session limit reached ({self._max_sessions})',
+            )
+
+        # hold the slot across the await; from here to the session insert nothing yields
+        self._admitting += 1
+        try:
+            offer = await request.text()
+        finally:
+            self._admitting -= 1
+
+        sid = str(uuid.uuid4())
+        pc = self._take_pc()
+        sess = WhipSession(sid, pc, request.remote or "")
+        sess.created = t_post
+        sess.feedback = ReceiverFeedback(self._feedback_cfg["max_kbps"], self._feedback_cfg["adaptive"])
+        self._pcs.add(pc)
+        self._sessions[sid] = sess
+
+        @pc.on("connectionstatechange")
+        async def on_state_change():
+            if pc.connectionState in ("failed", "closed", "disconnected"):
+                await self._close_session(sid)
+
+        audio_sink = MediaBlackhole()
+
+        def _track_task(coro):
+            t = self._loop.create_task(coro)
+            self._tasks.add(t)
+            sess.tasks.add(t)
+            t.add_done_callback(self._tasks.discard)
+            t.add_done_callback(sess.tasks.discard)
+            return t
+
+        @pc.on("track")
+        def on_track(track):
+            if track.kind == "video":
+                if sess.video_task is not None and not sess.video_task.done():
+                    _track_task(self._drain_track(track))
+                else:
+                    sess.video_task = _track_task(self._consume_video(track, sess))
+            elif track.kind == "audio":
+                _track_task(self._consume_audio(track, audio_sink))
+
+        policy = self._policy
+        try:
+            policy.apply_codec_preferences(pc.addTransceiver("video", direction="recvonly"))
+        except Exception:
+            pass
+        try:
+            await pc.setRemoteDescription(RTCSessionDescription(sdp=offer, type="offer"))
+        except Exception as e:
+            await self._close_session(sid)
+            return web.Response(status=400, text=f'Invalid offer: {e}')
+        if getattr(self, "_reject_audio", False):
+            try:
+                for tr in getattr(pc, "getTransceivers", lambda: [])():
+                    if getattr(tr, "kind", None) == "audio":
+                        try:
+                            tr.stop()
+                        except Exception:
+                            try:
+                                tr.direction = "inactive"  # type: ignore[attr-defined]
+                            except Exception:
+                                pass
+            except Exception:
+                pass
+        try:
+            answer = await pc.createAnswer()
+            await pc.setLocalDescription(answer)
+        except Exception as e:
+            await self._close_session(sid)
+            return web.Response(status=400, text=f'Invalid offer: {e}')
+        _track_task(self._feedback_loop(sess))
+        sess.answer_ms = (time.monotonic() - t_post) * 1000.0
+        self.setup_stats.record("answer", sess.answer_ms)
+
+        location = f"/resource/{sid}"
+        headers = {
+            'Content-Type': 'application/sdp',
+            'Location': location,
+        }
+        return web.Response(status=201, headers=headers, text=policy.munge_answer(pc.localDescription.sdp))
+
+    async def _feedback_loop(self, sess: WhipSession):
+        fb = sess.feedback
+        last_remb = 0.0
+        try:
+            while True:
+                await asyncio.sleep(0.25)
+                if sess.pc.connectionState != "connected":
+                    continue
+                fb.clamp_remb(sess.pc)
+                now = time.monotonic()
+                last_frame = sess.last_activity if sess.first_frame is not None else None
+                if fb.keyframe_due(now, last_frame):
+                    await fb.send_pli(sess.pc)
+                if now - last_remb >= 1.0:
+                    last_remb = now
+                    fb.update_cap(sess.transport.latest.get("bitrate_kbps", 0.0))
+                    await fb.send_remb(sess.pc)
+        except asyncio.CancelledError:
+            return
+
+    async def _consume_audio(self, track, sink):
+        import asyncio as _asyncio
+        try:
+            while True:
+                frame = await track.recv()
+                sink.write(frame)
+        except _asyncio.CancelledError:
+            return
+        except Exception:
+            return
+
+    async def _drain_track(self, track):
+        try:
+            while True:
+                await track.recv()
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            return
+
+    async def _consume_video(self, track, sess: WhipSession):
+        stats = self._stats
+        clock = MediaClock()
+        fb = sess.feedback
+        last_pts = None
+        next_due = 0.0
+        idle = False
+        try:
+            while True:
+                t_wait = time.perf_counter()
+                try:
+                    frame = await track.recv()
+                except Exception:
+                    # a track that is still live failed to deliver a decoded frame; an ended one is done
+                    if getattr(track, "readyState", "ended") != "live":
+                        return
+                    sess.decode_errors += 1
+                    if fb is not None:
+                        fb.request_keyframe("decode error")
+                    continue
+                t_recv = time.perf_counter()
+                stats.record("receive", (t_recv - t_wait) * 1000.0)
+                RECORDER.mark("frame.receive")
+                low_latency = self._low_latency
+                if low_latency:
+                    if isinstance(track, self._drain_cls or ()):
+                        frame, skipped = _newest_frame(track, frame)
+                        sess.skipped += skipped
+                    pts = getattr(frame, "pts", None)
+                    if pts is not None and last_pts is not None and pts <= last_pts:
+                        sess.skipped += 1
+                        continue
+                    last_pts = pts
+                delay = clock.delay_ms(getattr(frame, "pts", None), getattr(frame, "time_base", None), t_recv)
+                if delay is not None:
+                    stats.record("decode", delay)
+                    RECORDER.span("frame.decode", t_recv - delay / 1000.0, t_recv)
+                    if fb is not None:
+                        fb.on_delay(delay)
+                if sess.first_frame is None and sess.pc is not None:
+                    self.setup_stats.record("first_frame", (time.monotonic() - sess.created) * 1000.0)
+                demand = self._demand
+                if demand < 0:
+                    idle = True
+                elif idle:
+                    # nothing was converted while nobody watched, so a decode failure in that time
+                    # went unnoticed; give the first subscriber a clean picture
+                    idle = False
+                    if fb is not None:
+                        fb.request_keyframe("subscriber")
+                if demand < 0 or (demand > 0 and t_recv < next_due):
+                    sess.on_frame(frame.width, frame.height)
+                    if fb is not None:
+                        fb.on_frame(time.monotonic())
+                    continue
+                if demand > 0:
+                    next_due = max(next_due + 1.0 / demand, t_recv + 0.5 / demand)
+                try:
+                    arr = frame.to_ndarray(format="rgb24")
+                except Exception:
+                    sess.dropped += 1
+                    sess.decode_errors += 1
+                    if fb is not None:
+                        fb.request_keyframe("decode error")
+                    continue
+                sess.converted += 1
+                if fb is not None:
+                    fb.on_frame(time.monotonic())
+                t_conv = time.perf_counter()
+                stats.record("convert", (t_conv - t_recv) * 1000.0)
+                RECORDER.span("frame.convert", t_recv, t_conv)
+                sess.on_frame(arr.shape[1], arr.shape[0])
+                if self._crop_enabled:
+                    arr = crop_frame(arr, self._crop_x, self._crop_y, self._crop_w, self._crop_h, self._crop_center)
+                t_crop = time.perf_counter()
+                stats.record("crop", (t_crop - t_conv) * 1000.0)
+                RECORDER.span("frame.crop", t_conv, t_crop)
+                self._sink.frame(arr, t_recv, t_crop)
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            return
+
+class _PipeSink:
+    def __init__(self, conn, ring: SharedFrameRing, stats: PipelineStats):
+        self._conn = conn
+        self._ring = ring
+        self._stats = stats
+        self._last_stats = 0.0
+
+    def _send(self, msg: tuple):
+        try:
+            self._conn.send(msg)
+        except Exception:
+            pass
+
+    def status(self, text: str):
+        self._send(("status", text))
+
+    def urls(self, urls: List[str]):
+        self._send(("urls", list(urls)))
+
+    def sessions(self, snaps: List[dict]):
+        self._send(("sessions", snaps))
+        self._send_stats(time.perf_counter())
+
+    def transport(self, stats: Dict[str, dict]):
+        self._send(("transport", stats))
+
+    def trace(self, events: list, names: dict):
+        self._send(("trace", os.getpid(), events, names))
+
+    def _send_stats(self, now: float):
+        self._last_stats = now
+        self._send(("stats", self._stats.export_raw(WORKER_STAGES)))
+
+    def frame(self, arr, t_recv: float, t_crop: float):
+        slot = self._ring.write(arr)
+        t_handoff = time.perf_counter()
+        self._stats.record("handoff", (t_handoff - t_crop) * 1000.0)
+        RECORDER.span("frame.emit", t_crop, t_handoff)
+        if slot is not None:
+            self._send(("frame", slot[0], slot[1], t_handoff, t_recv))
+        if t_handoff - self._last_stats >= 1.0:
+            self._send_stats(t_handoff)
+
+def _ingest_process_main(port: int, cmd_conn, evt_conn, ring_name: str, slots: int, slot_bytes: int,
+                         crop_cfg: dict, session_cfg: dict, policy_cfg: dict, synthetic_cfg: dict,
+                         feedback_cfg: dict, low_latency: bool, demand: float, host_only: bool):
+    ring = SharedFrameRing(slots, slot_bytes, name=ring_name)
+    stats = PipelineStats()
+    worker = IngestWorker(port, _PipeSink(evt_conn, ring, stats), stats)
+    worker.set_crop_config_async(crop_cfg["enabled"], crop_cfg["x"], crop_cfg["y"],
+                                 crop_cfg["w"], crop_cfg["h"], crop_cfg["center"])
+    worker.set_session_limits_async(session_cfg["max_sessions"], session_cfg["idle_timeout"])
+    worker.set_policy_async(policy_cfg)
+    worker.set_synthetic_async(synthetic_cfg)
+    worker.set_feedback_async(feedback_cfg)
+    worker.set_low_latency_async(low_latency)
+    worker.set_demand_async(demand)
+    worker.set_host_only_async(host_only)
+
+    def _commands():
+        while True:
+            try:
+                msg = cmd_conn.recv()
+            except (EOFError, OSError):
+                worker.stop_async()
+                return
+            kind = msg[0]
+            if kind == "stop":
+                worker.stop_async()
+                return
+            if kind == "crop":
+                worker.set_crop_config_async(*msg[1:])
+            elif kind == "limits":
+                worker.set_session_limits_async(*msg[1:])
+            elif kind == "policy":
+                worker.set_policy_async(msg[1])
+            elif kind == "synthetic":
+                worker.set_synthetic_async(msg[1])
+            elif kind == "feedback":
+                worker.set_feedback_async(msg[1])
+            elif kind == "low_latency":
+                worker.set_low_latency_async(msg[1])
+            elif kind == "demand":
+                worker.set_demand_async(msg[1])
+            elif kind == "host_only":
+                worker.set_host_only_async(msg[1])
+            elif kind == "trace":
+                worker.trace_async(msg[1])
+
+    threading.Thread(target=_commands, daemon=True).start()
+    try:
+        worker.loop()
+    finally:
+        try:
+            evt_conn.close()
+        except Exception:
+            pass
+        ring.close()
@@ -1,21 +1,46 @@
-import asyncio
-import socket
+import subprocess
+import threading
 import time
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from PySide6 import QtCore, QtGui
 
+from constants import (
+    WHIP_MAX_SESSIONS,
+    WHIP_IDLE_TIMEOUT,
+    WHIP_SHM_SLOTS,
+    WHIP_SHM_SLOT_BYTES,
+    WHIP_MAX_BITRATE_KBPS,
+    WHIP_LOW_LATENCY,
+    WHIP_HOST_ONLY_ICE,
+)
+from pipeline_stats import PipelineStats
+from frame_ring import SharedFrameRing
+from sdp_policy import NegotiationPolicy
+from flight_recorder import RECORDER
+# the ingest side is Qt-free so the isolated child process never loads the GUI stack
+from whip_ingest import FRAME_TS_KEY, IngestWorker
+import whip_child
+
+def frame_to_qimage(arr) -> QtGui.QImage:
+    h, w, ch = arr.shape
+    return QtGui.QImage(arr.data, w, h, ch * w, QtGui.QImage.Format.Format_RGB888).copy()
+
 class WhipServer(QtCore.QObject):
     startedChanged = QtCore.Signal(bool)
     urlsUpdated = QtCore.Signal(object)
     statusChanged = QtCore.Signal(str)
     frameReady = QtCore.Signal(QtGui.QImage)
+    sessionsUpdated = QtCore.Signal(object)
+    transportStatsUpdated = QtCore.Signal(object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self._thread: Optional[QtCore.QThread] = None
-        self._worker: Optional[QtCore.QObject] = None
+        self._worker = None
+        self._host: Optional[QtCore.QObject] = None
         self._running = False
+        self._isolated = False
         self._port = 8080
         self._crop_cfg = {
             "enabled": False,
@@ -25,6 +50,21 @@ class WhipServer(QtCore.QObject):
             "h": 320,
             "center": True,
         }
+        self._session_cfg = {
+            "max_sessions": WHIP_MAX_SESSIONS,
+            "idle_timeout": WHIP_IDLE_TIMEOUT,
+        }
+        self._policy_cfg = NegotiationPolicy().to_dict()
+        self._synthetic_cfg: dict = {"enabled": False}
+        self._feedback_cfg: dict = {"max_kbps": WHIP_MAX_BITRATE_KBPS, "adaptive": True}
+        self._low_latency = WHIP_LOW_LATENCY
+        self._subscribers: Dict[str, float] = {}
+        self._host_only = WHIP_HOST_ONLY_ICE
+        self.stats = PipelineStats()
+
+    @QtCore.Slot(bool)
+    def set_isolated(self, isolated: bool):
+        self._isolated = bool(isolated)
 
     @QtCore.Slot(int)
     def start(self, port: int = 8080):
@@ -32,6 +72,7 @@ class WhipServer(QtCore.QObject):
             return
         self._running = True
         self._port = int(port or 8080)
+        self.stats.reset()
         self._start_worker()
         self.startedChanged.emit(True)
 
@@ -50,6 +91,7 @@ class WhipServer(QtCore.QObject):
             self._thread.wait(2000)
         self._thread = None
         self._worker = None
+        self._host = None
         self.startedChanged.emit(False)
 
     @QtCore.Slot(bool, int, int, int, int, bool)
@@ -75,300 +117,307 @@ class WhipServer(QtCore.QObject):
         except Exception:
             pass
 
+    def set_negotiation_policy(self, cfg: dict):
+        self._policy_cfg = NegotiationPolicy.from_dict(cfg).to_dict()
+        try:
+            if self._worker is not None and hasattr(self._worker, 'set_policy_async'):
+                self._worker.set_policy_async(dict(self._policy_cfg))
+        except Exception:
+            pass
+
+    def set_synthetic_source(self, cfg: dict):
+        self._synthetic_cfg = dict(cfg or {})
+        try:
+            if self._worker is not None and hasattr(self._worker, 'set_synthetic_async'):
+                self._worker.set_synthetic_async(dict(self._synthetic_cfg))
+        except Exception:
+            pass
+
+    def set_feedback_config(self, cfg: dict):
+        self._feedback_cfg = {
+            "max_kbps": int(max(0, cfg.get("max_kbps", WHIP_MAX_BITRATE_KBPS))),
+            "adaptive": bool(cfg.get("adaptive", True)),
+        }
+        try:
+            if self._worker is not None and hasattr(self._worker, 'set_feedback_async'):
+                self._worker.set_feedback_async(dict(self._feedback_cfg))
+        except Exception:
+            pass
+
+    @QtCore.Slot(bool)
+    def set_low_latency(self, enabled: bool):
+        self._low_latency = bool(enabled)
+        try:
+            if self._worker is not None and hasattr(self._worker, 'set_low_latency_async'):
+                self._worker.set_low_latency_async(self._low_latency)
+        except Exception:
+            pass
+
+    @QtCore.Slot(bool)
+    def set_host_only_ice(self, enabled: bool):
+        self._host_only = bool(enabled)
+        try:
+            if self._worker is not None and hasattr(self._worker, 'set_host_only_async'):
+                self._worker.set_host_only_async(self._host_only)
+        except Exception:
+            pass
+
+    def subscribe(self, key: str, fps: float = 0.0):
+        self._subscribers[key] = max(0.0, float(fps))
+        self._push_demand()
+
+    def unsubscribe(self, key: str):
+        if self._subscribers.pop(key, None) is not None:
+            self._push_demand()
+
+    def frame_demand(self) -> float:
+        if not self._subscribers:
+            return -1.0
+        rates = list(self._subscribers.values())
+        return 0.0 if 0.0 in rates else max(rates)
+
+    def _push_demand(self):
+        try:
+            if self._worker is not None and hasattr(self._worker, 'set_demand_async'):
+                self._worker.set_demand_async(self.frame_demand())
+        except Exception:
+            pass
+
+    def record_paint(self, img: QtGui.QImage):
+        try:
+            ts = img.text(FRAME_TS_KEY)
+        except Exception:
+            return
+        if not ts:
+            return
+        try:
+            t_handoff, t_recv = (float(v) for v in ts.split(","))
+        except ValueError:
+            return
+        now = time.perf_counter()
+        self.stats.record("paint", (now - t_handoff) * 1000.0)
+        self.stats.record("total", (now - t_recv) * 1000.0)
+        RECORDER.span("frame.paint", t_handoff, now)
+        RECORDER.check_latency("whip.total", (now - t_recv) * 1000.0)
+
+    @QtCore.Slot(int, float)
+    def set_session_limits(self, max_sessions: int, idle_timeout: float):
+        self._session_cfg.update({
+            "max_sessions": int(max(1, max_sessions)),
+            "idle_timeout": float(max(1.0, idle_timeout)),
+        })
+        try:
+            if self._worker is not None and hasattr(self._worker, 'set_session_limits_async'):
+                self._worker.set_session_limits_async(
+                    self._session_cfg["max_sessions"],
+                    self._session_cfg["idle_timeout"],
+                )
+        except Exception:
+            pass
+
+    def _apply_worker_config(self, worker):
+        worker.set_crop_config_async(
+            self._crop_cfg["enabled"],
+            self._crop_cfg["x"],
+            self._crop_cfg["y"],
+            self._crop_cfg["w"],
+            self._crop_cfg["h"],
+            self._crop_cfg["center"],
+        )
+        worker.set_session_limits_async(
+            self._session_cfg["max_sessions"],
+            self._session_cfg["idle_timeout"],
+        )
+        worker.set_policy_async(dict(self._policy_cfg))
+        worker.set_synthetic_async(dict(self._synthetic_cfg))
+        worker.set_feedback_async(dict(self._feedback_cfg))
+        worker.set_low_latency_async(self._low_latency)
+        worker.set_demand_async(self.frame_demand())
+        worker.set_host_only_async(self._host_only)
+
     def _start_worker(self):
-        parent = self
-
-        class ServerWorker(QtCore.QObject):
-            def __init__(self, port: int):
-                super().__init__()
-                self._port = port
-                self._loop: Optional[asyncio.AbstractEventLoop] = None
-                self._task: Optional[asyncio.Task] = None
-                self._stop_event: Optional[asyncio.Event] = None
-                self._runner = None
-                self._site = None
-                self._pcs = set()
-                self._tasks = set()
-                self._aiohttp_ok = False
-                self._aiortc_ok = False
-                try:
-                    import aiohttp  # noqa: F401
-                    from aiohttp import web  # noqa: F401
-                    self._aiohttp_ok = True
-                except Exception:
-                    self._aiohttp_ok = False
-                try:
-                    from aiortc import RTCPeerConnection  # noqa: F401
-                    self._aiortc_ok = True
-                except Exception:
-                    self._aiortc_ok = False
-
-                self._crop_enabled = False
-                self._crop_x = 0
-                self._crop_y = 0
-                self._crop_w = 320
-                self._crop_h = 320
-                self._crop_center = True
-                self._reject_audio = True
-
-            def stop_async(self):
-                if self._loop and self._stop_event:
-                    def _set():
-                        if not self._stop_event.is_set():
-                            self._stop_event.set()
-                    self._loop.call_soon_threadsafe(_set)
-
-            def set_crop_config_async(self, enabled: bool, x: int, y: int, w: int, h: int, center: bool):
-                def _apply():
-                    self._crop_enabled = bool(enabled)
-                    self._crop_x = max(0, int(x))
-                    self._crop_y = max(0, int(y))
-                    self._crop_w = max(1, int(w))
-                    self._crop_h = max(1, int(h))
-                    self._crop_center = bool(center)
-                if self._loop:
-                    try:
-                        self._loop.call_soon_threadsafe(_apply)
-                    except Exception:
-                        _apply()
-                else:
-                    _apply()
-
-            def _local_urls(self) -> List[str]:
-                addrs: List[str] = ["127.0.0.1"]
-                try:
-                    hn = socket.gethostname()
-                    _, _, ips = socket.gethostbyname_ex(hn)
-                    for ip in ips:
-                        if ip.startswith("127."):
-                            continue
-                        if ":" in ip:
-                            continue
-                        addrs.append(ip)
-                except Exception:
-                    pass
-                urls = [f"http://{ip}:{self._port}/whip" for ip in sorted(set(addrs))]
-                return urls
-
-            @QtCore.Slot()
-            def loop(self):
-                self._loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(self._loop)
-                self._stop_event = asyncio.Event()
-                self._task = self._loop.create_task(self._main())
-                try:
-                    self._loop.run_until_complete(self._task)
-                finally:
-                    try:
-                        if self._runner:
-                            self._loop.run_until_complete(self._runner.cleanup())
-                    except Exception:
-                        pass
-                    for pc in list(self._pcs):
-                        try:
-                            self._loop.run_until_complete(pc.close())
-                        except Exception:
-                            pass
-                    try:
-                        async def _cancel_pending():
-                            current = asyncio.current_task()
-                            tasks = [t for t in asyncio.all_tasks() if t is not current]
-                            for t in tasks:
-                                t.cancel()
-                            if tasks:
-                                await asyncio.gather(*tasks, return_exceptions=True)
-                        self._loop.run_until_complete(_cancel_pending())
-                    except Exception:
-                        pass
-                    try:
-                        self._loop.stop()
-                    except Exception:
-                        pass
-                    try:
-                        self._loop.close()
-                    except Exception:
-                        pass
-
-            async def _main(self):
-                if not self._aiohttp_ok:
-                    parent.statusChanged.emit("aiohttp not installed. Install: pip install aiohttp")
-                    parent.urlsUpdated.emit(self._local_urls())
-                    await self._dummy_frames()
-                    return
-
-                from aiohttp import web
-
-                app = web.Application()
-                app.add_routes([
-                    web.get('/health', self._handle_health),
-                ])
-
-                if self._aiortc_ok:
-                    app.router.add_post('/whip', self._handle_whip)
-                    parent.statusChanged.emit("WHIP server ready.")
-                else:
-                    app.router.add_post('/whip', self._handle_whip_unavailable)
-                    parent.statusChanged.emit("aiortc/av not installed. Install: pip install aiortc av numpy")
-
-                self._runner = web.AppRunner(app)
-                await self._runner.setup()
-                self._site = web.TCPSite(self._runner, '0.0.0.0', self._port)
-                await self._site.start()
-
-                parent.urlsUpdated.emit(self._local_urls())
-
-                assert self._stop_event is not None
-                await self._stop_event.wait()
-
-            async def _handle_health(self, request):
-                from aiohttp import web
-                return web.Response(text="ok")
-
-            async def _handle_whip_unavailable(self, request):
-                from aiohttp import web
-                return web.Response(status=503, text="Server missing aiortc/av dependencies.")
-
-            async def _handle_whip(self, request):
-                from aiohttp import web
-                import uuid
-                from aiortc import RTCPeerConnection, RTCSessionDescription
-                from aiortc.contrib.media import MediaBlackhole
-
-                if request.content_type != 'application/sdp':
-                    return web.Response(status=415, text='Expected application/sdp')
-
-                offer = await request.text()
-
-                pc = RTCPeerConnection()
-                self._pcs.add(pc)
-
-                @pc.on("connectionstatechange")
-                async def on_state_change():
-                    if pc.connectionState in ("failed", "closed", "disconnected"):
-                        await pc.close()
-                        self._pcs.discard(pc)
-
-                audio_sink = MediaBlackhole()
-
-                @pc.on("track")
-                def on_track(track):
-                    if track.kind == "video":
-                        t = self._loop.create_task(self._consume_video(track))
-                        self._tasks.add(t)
-                        t.add_done_callback(lambda _t: self._tasks.discard(_t))
-                    elif track.kind == "audio":
-                        t = self._loop.create_task(self._consume_audio(track, audio_sink))
-                        self._tasks.add(t)
-                        t.add_done_callback(lambda _t: self._tasks.discard(_t))
-
-                await pc.setRemoteDescription(RTCSessionDescription(sdp=offer, type="offer"))
-                if getattr(self, "_reject_audio", False):
-                    try:
-                        for tr in getattr(pc, "getTransceivers", lambda: [])():
-                            if getattr(tr, "kind", None) == "audio":
-                                try:
-                                    tr.stop()
-                                except Exception:
-                                    try:
-                                        tr.direction = "inactive"  # type: ignore[attr-defined]
-                                    except Exception:
-                                        pass
-                    except Exception:
-                        pass
-                answer = await pc.createAnswer()
-                await pc.setLocalDescription(answer)
-
-                location = f"/resource/{uuid.uuid4()}"
-                headers = {
-                    'Content-Type': 'application/sdp',
-                    'Location': location,
-                }
-                return web.Response(status=201, headers=headers, text=pc.localDescription.sdp)
-
-            async def _consume_audio(self, track, sink):
-                import asyncio as _asyncio
-                try:
-                    while True:
-                        frame = await track.recv()
-                        sink.write(frame)
-                except _asyncio.CancelledError:
-                    return
-                except Exception:
-                    return
-
-            async def _consume_video(self, track):
-                import numpy as np  # type: ignore
-                try:
-                    while True:
-                        frame = await track.recv()
-                        arr = frame.to_ndarray(format="rgb24")
-                        h, w, ch = arr.shape
-                        if self._crop_enabled:
-                            cw = int(min(max(1, self._crop_w), w))
-                            chh = int(min(max(1, self._crop_h), h))
-                            if self._crop_center:
-                                x = max(0, (w - cw) // 2)
-                                y = max(0, (h - chh) // 2)
-                            else:
-                                x = max(0, min(self._crop_x, w - cw))
-                                y = max(0, min(self._crop_y, h - chh))
-                            arr = arr[y:y+chh, x:x+cw, :].copy()
-                            h, w, ch = arr.shape
-                        bytes_per_line = ch * w
-                        qimg = QtGui.QImage(arr.data, w, h, bytes_per_line, QtGui.QImage.Format.Format_RGB888)
-                        parent.frameReady.emit(qimg.copy())
-                except asyncio.CancelledError:
-                    return
-                except Exception:
-                    return
-
-            async def _dummy_frames(self):
-                hue = 0
-                while not self._stop_event.is_set():
-                    w, h = 640, 360
-                    img = QtGui.QImage(w, h, QtGui.QImage.Format.Format_RGB32)
-                    painter = QtGui.QPainter(img)
-                    c1 = QtGui.QColor.fromHsv(hue % 360, 180, 255)
-                    c2 = QtGui.QColor.fromHsv((hue + 120) % 360, 180, 255)
-                    grad = QtGui.QLinearGradient(0, 0, w, h)
-                    grad.setColorAt(0.0, c1)
-                    grad.setColorAt(1.0, c2)
-                    painter.fillRect(0, 0, w, h, QtGui.QBrush(grad))
-                    painter.setPen(QtGui.QColor("white"))
-                    painter.setFont(QtGui.QFont("Segoe UI", 18))
-                    ts = time.strftime("%H:%M:%S")
-                    painter.drawText(12, 28, f"WHIP server inactive — {ts}")
-                    painter.end()
-                    if self._crop_enabled:
-                        cw = int(min(max(1, self._crop_w), w))
-                        chh = int(min(max(1, self._crop_h), h))
-                        if self._crop_center:
-                            x = max(0, (w - cw) // 2)
-                            y = max(0, (h - chh) // 2)
-                        else:
-                            x = max(0, min(self._crop_x, w - cw))
-                            y = max(0, min(self._crop_y, h - chh))
-                        parent.frameReady.emit(img.copy(x, y, cw, chh))
-                    else:
-                        parent.frameReady.emit(img)
-                    hue = (hue + 2) % 360
-                    await asyncio.sleep(1/30)
-
-        worker = ServerWorker(self._port)
+        if self._isolated:
+            try:
+                self._worker = _ProcessHost(self)
+                return
+            except Exception as e:
+                self._worker = None
+                self.statusChanged.emit(f"Isolated ingest unavailable ({e}); running in-process.")
+        worker = IngestWorker(self._port, _SignalSink(self), self.stats)
+        self._apply_worker_config(worker)
+        host = _ThreadHost(worker.loop)
         th = QtCore.QThread(self)
-        worker.moveToThread(th)
-        th.started.connect(worker.loop)
+        host.moveToThread(th)
+        th.started.connect(host.run)
         self._worker = worker
+        self._host = host
         self._thread = th
         th.start()
+
+class _ThreadHost(QtCore.QObject):
+    def __init__(self, target):
+        super().__init__()
+        self._target = target
+
+    @QtCore.Slot()
+    def run(self):
+        self._target()
+
+class _SignalSink:
+    def __init__(self, server: WhipServer):
+        self._server = server
+
+    def status(self, text: str):
+        self._server.statusChanged.emit(text)
+
+    def urls(self, urls: List[str]):
+        self._server.urlsUpdated.emit(urls)
+
+    def sessions(self, snaps: List[dict]):
+        self._server.sessionsUpdated.emit(snaps)
+
+    def transport(self, stats: Dict[str, dict]):
+        self._server.transportStatsUpdated.emit(stats)
+
+    def frame(self, arr, t_recv: float, t_crop: float):
+        qimg = frame_to_qimage(arr)
+        t_handoff = time.perf_counter()
+        qimg.setText(FRAME_TS_KEY, f"{t_handoff},{t_recv}")
+        self._server.stats.record("handoff", (t_handoff - t_crop) * 1000.0)
+        RECORDER.span("frame.emit", t_crop, t_handoff)
+        self._server.frameReady.emit(qimg)
+
+    def trace(self, events: list, names: dict):
+        pass
+
+class _ProcessHost:
+    def __init__(self, server: WhipServer):
+        self._server = server
+        self._stopping = False
+        self._ring = SharedFrameRing(WHIP_SHM_SLOTS, WHIP_SHM_SLOT_BYTES)
         try:
-            worker.set_crop_config_async(
-                self._crop_cfg["enabled"],
-                self._crop_cfg["x"],
-                self._crop_cfg["y"],
-                self._crop_cfg["w"],
-                self._crop_cfg["h"],
-                self._crop_cfg["center"],
-            )
+            self._proc, self._cmd, self._evt = whip_child.launch(
+                (server._port, self._ring.name, WHIP_SHM_SLOTS, WHIP_SHM_SLOT_BYTES,
+                 dict(server._crop_cfg), dict(server._session_cfg), dict(server._policy_cfg),
+                 dict(server._synthetic_cfg), dict(server._feedback_cfg),
+                 server._low_latency, server.frame_demand(), server._host_only))
+        except Exception:
+            self._ring.close()
+            raise
+        # the reader thread may answer a trace request as soon as it runs
+        self._trace_reply: Optional[list] = None
+        self._trace_ready = threading.Event()
+        self._reader_host = _ThreadHost(self._read_events)
+        self._reader = QtCore.QThread()
+        self._reader_host.moveToThread(self._reader)
+        self._reader.started.connect(self._reader_host.run)
+        self._reader.start()
+        RECORDER.add_source(self._collect_trace)
+
+    def _collect_trace(self) -> list:
+        self._trace_ready.clear()
+        self._send(("trace", None))
+        if not self._trace_ready.wait(0.5):
+            return []
+        return [self._trace_reply]
+
+    def _send(self, msg: tuple):
+        try:
+            self._cmd.send(msg)
         except Exception:
             pass
+
+    def stop_async(self):
+        self._stopping = True
+        RECORDER.remove_source(self._collect_trace)
+        self._send(("stop",))
+        try:
+            self._proc.wait(2.0)
+        except subprocess.TimeoutExpired:
+            self._proc.terminate()
+            try:
+                self._proc.wait(1.0)
+            except subprocess.TimeoutExpired:
+                pass
+        self._reader.quit()
+        self._reader.wait(1000)
+        try:
+            self._cmd.close()
+        except Exception:
+            pass
+        self._ring.close()
+
+    def set_crop_config_async(self, enabled: bool, x: int, y: int, w: int, h: int, center: bool):
+        self._send(("crop", enabled, x, y, w, h, center))
+
+    def set_session_limits_async(self, max_sessions: int, idle_timeout: float):
+        self._send(("limits", max_sessions, idle_timeout))
+
+    def set_policy_async(self, cfg: dict):
+        self._send(("policy", cfg))
+
+    def set_synthetic_async(self, cfg: dict):
+        self._send(("synthetic", cfg))
+
+    def set_feedback_async(self, cfg: dict):
+        self._send(("feedback", cfg))
+
+    def set_low_latency_async(self, enabled: bool):
+        self._send(("low_latency", enabled))
+
+    def set_demand_async(self, fps: float):
+        self._send(("demand", fps))
+
+    def set_host_only_async(self, enabled: bool):
+        self._send(("host_only", enabled))
+
+    def _read_events(self):
+        server = self._server
+        while True:
+            try:
+                msg = self._evt.recv()
+            except (EOFError, OSError):
+                break
+            kind = msg[0]
+            if self._stopping:
+                continue
+            if kind == "frame":
+                _, slot, seq, t_handoff, t_recv = msg
+                img = self._frame_from_ring(slot, seq)
+                if img is not None:
+                    img.setText(FRAME_TS_KEY, f"{t_handoff},{t_recv}")
+                    server.frameReady.emit(img)
+            elif kind == "status":
+                server.statusChanged.emit(msg[1])
+            elif kind == "urls":
+                server.urlsUpdated.emit(msg[1])
+            elif kind == "sessions":
+                server.sessionsUpdated.emit(msg[1])
+            elif kind == "transport":
+                server.transportStatsUpdated.emit(msg[1])
+            elif kind == "stats":
+                server.stats.load_raw(msg[1])
+            elif kind == "trace":
+                self._trace_reply = tuple(msg[1:])
+                self._trace_ready.set()
+        try:
+            self._evt.close()
+        except Exception:
+            pass
+
+    def _frame_from_ring(self, slot: int, seq: int) -> Optional[QtGui.QImage]:
+        try:
+            view = self._ring.view(slot, seq)
+        except Exception:
+            return None
+        if view is None:
+            return None
+        import numpy as np  # type: ignore
+        h, w, ch = view.shape
+        img = QtGui.QImage(w, h, QtGui.QImage.Format.Format_RGB888)
+        dst = np.frombuffer(img.bits(), dtype=np.uint8).reshape(h, img.bytesPerLine())
+        dst[:, :w * ch] = view.reshape(h, w * ch)
+        del dst, view
+        if not self._ring.still_valid(slot, seq):
+            return None
+        return img